@@ -5,7 +5,23 @@
 #   from aws_lib.core import SessionManager
 # We can just type:
 #   from aws_lib import SessionManager
+#
+# The tools are loaded lazily: 'import aws_lib' by itself is instant, and a
+# tool's module (and boto3) is only imported the first time you use it.
+import importlib
+
+_LAZY_EXPORTS = {
+    'SessionManager': '.core',     # The Authentication tool
+    'StackManager': '.stacks',     # The Infrastructure Builder tool
+    'CostAuditor': '.audit',       # The Cost Inspector tool
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        module = importlib.import_module(_LAZY_EXPORTS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-from .core import SessionManager    # Import the Authentication tool
-from .stacks import StackManager    # Import the Infrastructure Builder tool
-from .audit import CostAuditor      # Import the Cost Inspector tool
+__all__ = list(_LAZY_EXPORTS)
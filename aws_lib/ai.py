@@ -4,15 +4,21 @@ This module acts as the "Brain".
 1. It reads the database schema from Glue.
 2. It sends your question + schema to Amazon Bedrock (Claude).
 3. It gets a SQL query back.
-4. It executes the SQL on Athena.
+4. It checks what the SQL would cost (athena_guard.py) and executes it on Athena.
+5. Pre-aggregated summary tables (summaries.py) are pointed out to the model,
+   so frequent questions read a few KB instead of the whole orders table.
 """
 import boto3
 import time
 import json
 
+from aws_lib.results import QueryResult
+
 class DataAgent:
-    def __init__(self, session):
+    def __init__(self, session, max_scan_bytes=None):
         self.session = session
+        # Budget per query for the cost guard (None = $AWS_PLAYGROUND_ATHENA_MAX_SCAN_MB or 1 GB)
+        self.max_scan_bytes = max_scan_bytes
         self.glue = session.client('glue')
         self.athena = session.client('athena')
         # We use the 'bedrock-runtime' client to invoke models
@@ -34,24 +40,38 @@ class DataAgent:
             schema_text = f"Error fetching schema: {e}"
         return schema_text
 
-    def generate_sql(self, question, schema):
+    def generate_sql(self, question, schema, summaries=''):
         """
         Asks Claude to convert English to Athena SQL.
+        summaries: SummaryManager.describe_for_prompt(), the pre-aggregated tables to prefer.
         """
         print("   🧠 Thinking (Calling Bedrock)...")
-        
+
+        summary_section, summary_rule = "", ""
+        if summaries:
+            summary_section = f"""
+        These summary tables are pre-aggregated and tiny. If one has every column the
+        question needs, query it instead of the table it was built from:
+
+        {summaries}
+        """
+            summary_rule = """3. With a summary table, aggregate its columns again: SUM(x) -> SUM(sum_x), COUNT(x) -> SUM(count_x),
+           AVG(x) -> SUM(sum_x) / CAST(SUM(count_x) AS double), MIN(x) -> MIN(min_x), MAX(x) -> MAX(max_x),
+           COUNT(*) -> SUM(row_count). Group by fewer of its columns if the question needs less detail.
+        """
+
         prompt = f"""
         You are a Data Analyst Agent. 
         You have access to an AWS Athena database with the following schema:
         
         {schema}
-        
+        {summary_section}
         Write a standard SQL query to answer this user question: "{question}"
         
         Rules:
         1. Return ONLY the SQL query. No explanation, no markdown.
         2. Use the database name 'edu_etl_db' if needed, e.g. "FROM edu_etl_db.tablename"
-        """
+        {summary_rule}"""
 
         body = json.dumps({
             "anthropic_version": "bedrock-2023-05-31",
@@ -82,16 +102,27 @@ class DataAgent:
             print(f"❌ Bedrock Error: {e}")
             return None
 
-    def run_query(self, sql, output_location):
+    def run_query(self, sql, output_location, database='edu_etl_db'):
         """
-        Executes the SQL on Athena.
+        Executes the SQL on Athena, after the cost guard approved (or trimmed) it.
         """
-        print(f"   ⚡ Executing Query: {sql}")
+        from aws_lib.athena_guard import AthenaCostGuard
+
         try:
-            # 1. Start execution
+            # 0. Estimate the scan first: broken or too expensive queries stop here
+            print(f"   🛡️  Checking query cost: {sql}")
+            guard = AthenaCostGuard(self.session, database, output_location, max_scan_bytes=self.max_scan_bytes)
+            sql = guard.check(sql)
+            if sql is None:
+                return None
+
+            print(f"   ⚡ Executing Query: {sql}")
+            # 1. Start execution (in the workgroup whose cutoff cancels runaway scans)
             response = self.athena.start_query_execution(
                 QueryString=sql,
-                ResultConfiguration={'OutputLocation': output_location}
+                QueryExecutionContext={'Database': database},
+                ResultConfiguration={'OutputLocation': output_location},
+                WorkGroup=guard.workgroup,
             )
             query_id = response['QueryExecutionId']
             
@@ -107,23 +138,20 @@ class DataAgent:
                     return None
                 time.sleep(1)
             
-            # 3. Fetch results
-            results = self.athena.get_query_results(QueryExecutionId=query_id)
-            return results
+            # 3. Results are fetched (and typed) page by page when they are used
+            return QueryResult(self.session, query_id)
             
         except Exception as e:
             print(f"❌ Athena Error: {e}")
             return None
 
-    def print_results(self, results):
+    def print_results(self, results, output='table', output_file=None):
         """
-        Pretty prints Athena results.
+        Shows the results as a table, or exports them (csv, json, parquet) for other tools.
         """
         if not results: return
-        
-        rows = results['ResultSet']['Rows']
-        print("\n--- 📊 Results ---")
-        for row in rows:
-            data = [d.get('VarCharValue', 'NULL') for d in row['Data']]
-            print(" | ".join(data))
-        print("------------------\n")
+
+        if output == 'table':
+            results.show()
+        else:
+            results.export(output, output_file)
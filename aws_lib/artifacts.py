@@ -0,0 +1,171 @@
+"""
+Glue Job Artifacts (versioned scripts and dependency bundles)
+A Glue job runs whatever file its 'ScriptLocation' points at. When that is a
+fixed key ('scripts/process_job.py') that every upload overwrites, a run can't be
+reproduced, and every deploy re-uploads the same bytes. Instead:
+
+1. Each script is stored under its content hash: 'scripts/process_job.3f2a9c1d7e4b.py'.
+   A key is never overwritten, so a run always used exactly the code its job pointed at.
+2. Extra Python modules and packages the script imports are zipped into one
+   bundle ('scripts/lib/deps.<hash>.zip') for Glue's '--extra-py-files'. The zip is
+   built reproducibly (sorted entries, fixed timestamps), so the same code gives
+   the same hash. Bundles are kept in ~/.aws_playground/artifacts/ and only
+   rebuilt when a source file changed.
+3. Nothing is uploaded when that hash is already in the bucket.
+4. The job is switched to the new script and bundle in one 'update_job' call,
+   so a run never starts with the new script and the old dependencies.
+
+Usage:
+    artifacts = GlueArtifacts(session, 'my-datalake')
+    script_uri = artifacts.publish_script('glue_jobs/process_job.py')
+    bundle_uri = artifacts.publish_bundle(['glue_jobs/helpers.py', 'glue_jobs/transforms/'])
+"""
+import hashlib
+import json
+import os
+import zipfile
+
+from botocore.exceptions import ClientError
+
+from aws_lib.core import get_cache_dir
+
+SCRIPT_PREFIX = 'scripts/'
+BUNDLE_PREFIX = 'scripts/lib/'
+HASH_LENGTH = 12
+
+ZIP_TIMESTAMP = (1980, 1, 1, 0, 0, 0)  # The earliest date a zip can hold: same files, same bytes
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _bundle_files(paths):
+    """
+    [(path on disk, name in the zip)] for modules and package folders, sorted.
+    """
+    files = []
+    for path in paths:
+        path = os.path.normpath(path)
+        if os.path.isdir(path):
+            parent = os.path.dirname(os.path.abspath(path))
+            for root, dirs, names in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if d != '__pycache__' and not d.startswith('.'))
+                for name in names:
+                    if not name.endswith(('.pyc', '.pyo')) and not name.startswith('.'):
+                        full = os.path.join(root, name)
+                        files.append((full, os.path.relpath(os.path.abspath(full), parent).replace(os.sep, '/')))
+        else:
+            files.append((path, os.path.basename(path)))
+    return sorted(files, key=lambda item: item[1])
+
+
+class GlueArtifacts:
+    """
+    Uploads Glue job code under content-hash keys.
+    """
+
+    def __init__(self, session, bucket_name):
+        self.session = session
+        self.bucket_name = bucket_name
+        self.s3 = session.client('s3')
+        self.glue = session.client('glue')
+        self.cache_dir = get_cache_dir('artifacts')
+
+    def _upload_once(self, local_path, key):
+        """
+        Uploads the file unless the key already exists. Returns its s3:// URI.
+        """
+        try:
+            self.s3.head_object(Bucket=self.bucket_name, Key=key)
+            print(f"✅ Unchanged: s3://{self.bucket_name}/{key}")
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+            print(f"Uploading {local_path} -> s3://{self.bucket_name}/{key}")
+            self.s3.upload_file(local_path, self.bucket_name, key)
+        return f"s3://{self.bucket_name}/{key}"
+
+    def publish_script(self, local_path):
+        """
+        Uploads the job script as '<name>.<hash>.py'. Returns its s3:// URI.
+        """
+        stem, ext = os.path.splitext(os.path.basename(local_path))
+        key = f"{SCRIPT_PREFIX}{stem}.{file_hash(local_path)[:HASH_LENGTH]}{ext}"
+        return self._upload_once(local_path, key)
+
+    def build_bundle(self, paths):
+        """
+        Zips modules/packages reproducibly. Returns the local zip path (reused
+        from the cache when no source file changed).
+        """
+        files = _bundle_files(paths)
+        # The sources' hashes name the zip: an unchanged set of files is never zipped twice
+        sources = hashlib.sha256(json.dumps([(name, file_hash(path)) for path, name in files]).encode()).hexdigest()
+        bundle_path = os.path.join(self.cache_dir, f"deps.{sources[:HASH_LENGTH]}.zip")
+        if os.path.exists(bundle_path):
+            return bundle_path
+
+        temp_path = f"{bundle_path}.{os.getpid()}.tmp"
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as bundle:
+            for path, name in files:
+                info = zipfile.ZipInfo(name, date_time=ZIP_TIMESTAMP)
+                info.external_attr = 0o644 << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(path, 'rb') as f:
+                    bundle.writestr(info, f.read())
+        os.replace(temp_path, bundle_path)
+        return bundle_path
+
+    def publish_bundle(self, paths):
+        """
+        Uploads the dependency zip as 'lib/deps.<hash>.zip'. Returns its s3:// URI (None without paths).
+        """
+        if not paths:
+            return None
+        bundle_path = self.build_bundle(paths)
+        return self._upload_once(bundle_path, f"{BUNDLE_PREFIX}deps.{file_hash(bundle_path)[:HASH_LENGTH]}.zip")
+
+    def point_job(self, job_name, script_uri, bundle_uri=None, arguments=None, role=None, workers=None,
+                  replace_arguments=False):
+        """
+        Switches an existing job to this script (and bundle, and job arguments)
+        in one update_job call, keeping the rest of its settings.
+        role / workers: also change the job's role (ARN) and number of workers.
+        replace_arguments: 'arguments' is the job's full set (an argument that
+        isn't in it is removed) instead of being added to the current ones.
+        Returns True if the job changed.
+        """
+        job = self.glue.get_job(JobName=job_name)['Job']
+        current = job.get('DefaultArguments', {})
+        arguments = dict(arguments or {}) if replace_arguments else dict(current, **(arguments or {}))
+        if bundle_uri:
+            arguments['--extra-py-files'] = bundle_uri
+        else:
+            arguments.pop('--extra-py-files', None)
+        settings = {}
+        if role and job.get('Role') != role:
+            settings['Role'] = role
+        if workers and job.get('NumberOfWorkers') != workers:
+            settings['NumberOfWorkers'] = workers
+        if job['Command'].get('ScriptLocation') == script_uri and arguments == current and not settings:
+            print(f"✅ Job {job_name} already runs {script_uri}")
+            return False
+
+        # update_job replaces the whole definition: send back every field it accepts
+        accepted = self.glue.meta.service_model.shape_for('JobUpdate').members
+        update = {k: v for k, v in job.items() if k in accepted and k != 'AllocatedCapacity'}
+        update.update(settings)
+        if 'NumberOfWorkers' in settings:
+            update.setdefault('WorkerType', 'G.1X')
+        if 'WorkerType' in update:
+            update.pop('MaxCapacity', None)  # Glue refuses both at once
+        update['Command'] = dict(job['Command'], ScriptLocation=script_uri)
+        update['DefaultArguments'] = arguments
+        self.glue.update_job(JobName=job_name, JobUpdate=update)
+        print(f"✅ Job {job_name} now runs {script_uri}" + (f" with {bundle_uri}" if bundle_uri else ""))
+        return True
@@ -0,0 +1,421 @@
+"""
+Athena Cost Guard
+Athena charges for every byte a query reads. The AI agent writes its own SQL,
+so one careless 'SELECT *' over the whole data lake could read terabytes.
+Before a query runs, this guard:
+
+1. Asks Athena for an 'EXPLAIN' of it. That reads no data, fails right away
+   for broken SQL, and tells us which tables, columns and partitions the query
+   really needs.
+2. Estimates the bytes scanned from the Glue statistics of those tables and
+   partitions (the sizes the crawler recorded, or an S3 listing when missing).
+   Parquet/ORC only read the columns used, so those count proportionally.
+3. If the estimate is over the budget, it tries to rewrite the query: keep only
+   the newest partitions that fit, and add a LIMIT to plain row listings.
+   If that's not enough, the query is rejected.
+4. Runs what passes in a workgroup whose 'bytes scanned cutoff' is the budget,
+   so Athena itself cancels a query that reads more than expected. Each budget
+   has its own workgroup ('playground-guarded-1024mb'), so users with different
+   budgets never change each other's cutoff.
+A table whose statistics can't be read counts as over the budget: a query we
+can't estimate is not waved through.
+
+Usage:
+    guard = AthenaCostGuard(session, 'edu_etl_db', 's3://bucket/athena-results/', max_scan_bytes=1024 ** 3)
+    sql = guard.check(sql)      # None = rejected (reason printed)
+"""
+import os
+import re
+import time
+from collections import defaultdict
+
+from botocore.exceptions import ClientError
+
+DEFAULT_MAX_SCAN_MB = 1024
+MIN_CUTOFF_BYTES = 10 * 1024 ** 2   # Smallest cutoff Athena accepts
+GUARD_WORKGROUP = 'playground-guarded'
+DEFAULT_LIMIT = 1000
+
+# Formats that only read the columns a query uses
+COLUMNAR_FORMATS = ('parquet', 'orc')
+
+# EXPLAIN output (Trino text plan)
+_PLAN_TABLE = re.compile(r'table = (?:\w+:)?(\w+):(\w+)')
+_PLAN_COLUMN = re.compile(r'^\s*"?(\w+)"? := "?(\w+)"?:[^:]+:(REGULAR|PARTITION_KEY)')
+_PLAN_DOMAIN = re.compile(r'^\s*:: (\[.*\]|\(.*\))\s*$')
+_PLAN_RANGE = re.compile(r'([\[(])([^\])]*)([\])])')
+
+_SQL_TABLE = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)"?(?:\s*\.\s*"?(\w+)"?)?', re.IGNORECASE)
+_AGGREGATE = re.compile(r'\b(GROUP\s+BY|COUNT|SUM|AVG|MIN|MAX|DISTINCT)\b', re.IGNORECASE)
+_CLAUSE_END = re.compile(r'\b(GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT)\b', re.IGNORECASE)
+
+
+def default_max_scan_bytes():
+    return int(float(os.environ.get('AWS_PLAYGROUND_ATHENA_MAX_SCAN_MB', DEFAULT_MAX_SCAN_MB)) * 1024 ** 2)
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024 or unit == 'TB':
+            return f"{size:,.1f} {unit}" if unit != 'B' else f"{size:,} B"
+        size /= 1024
+
+
+def _parse_domain(text):
+    """
+    '[[2024-01-01], [2024-02-01, <max>)]' -> [('2024-01-01', '2024-01-01'), ('2024-02-01', None)]
+    (None = open end).
+    """
+    ranges = []
+    for _, inside, _ in _PLAN_RANGE.findall(text[1:-1]):
+        parts = [p.strip() for p in inside.split(', ')]
+        low = parts[0]
+        high = parts[-1]
+        ranges.append((None if low == '<min>' else low, None if high == '<max>' else high))
+    return ranges
+
+
+def _in_domain(value, ranges):
+    def less_equal(a, b):
+        try:
+            return float(a) <= float(b)
+        except ValueError:
+            return a <= b
+    return any((low is None or less_equal(low, value)) and (high is None or less_equal(value, high))
+               for low, high in ranges)
+
+
+def parse_plan(lines):
+    """
+    Reads an EXPLAIN plan. Returns {(database, table): {'columns': set, 'domains': {partition key: ranges}}}.
+    """
+    tables = {}
+    current = None
+    last_partition_key = None
+    for line in lines:
+        match = _PLAN_TABLE.search(line)
+        if match:
+            current = tables.setdefault((match.group(1), match.group(2)), {'columns': set(), 'domains': {}})
+            last_partition_key = None
+            continue
+        if current is None:
+            continue
+        match = _PLAN_COLUMN.match(line)
+        if match:
+            current['columns'].add(match.group(2))
+            last_partition_key = match.group(2) if match.group(3) == 'PARTITION_KEY' else None
+            continue
+        match = _PLAN_DOMAIN.match(line)
+        if match and last_partition_key:
+            current['domains'][last_partition_key] = _parse_domain(match.group(1))
+    return tables
+
+
+def _column_fraction(stats, used):
+    """
+    Share of the table's bytes a query reads: Parquet/ORC only read the columns used.
+    """
+    if not stats.columnar or used['columns'] is None or not stats.columns:
+        return 1.0
+    read = len([c for c in stats.columns if c in used['columns']])
+    return max(read, 1) / len(stats.columns)
+
+
+class TableStats:
+    """
+    What Glue knows about one table: columns, format, and bytes per partition.
+    """
+
+    def __init__(self, columns, partition_keys, columnar, partitions, total_bytes):
+        self.columns = columns                # Data columns (not partition keys)
+        self.partition_keys = partition_keys
+        self.columnar = columnar
+        self.partitions = partitions          # [(values, bytes)]
+        self.total_bytes = total_bytes
+
+
+class ScanEstimate:
+    def __init__(self):
+        self.tables = []  # (name, estimated bytes, total bytes, note)
+        self.unknown = []  # Tables we have no statistics for (their size is unknown, not 0)
+
+    @property
+    def total(self):
+        return sum(estimated for _, estimated, _, _ in self.tables)
+
+    def print_summary(self, budget):
+        unknown = {f"{database}.{table}" for database, table in self.unknown}
+        for name, estimated, total, note in self.tables:
+            if name in unknown:
+                print(f"      {name}: {note}")
+            else:
+                print(f"      {name}: ~{format_bytes(estimated)} of {format_bytes(total)}{f' ({note})' if note else ''}")
+        more = f" + {len(unknown)} table(s) of unknown size" if unknown else ""
+        print(f"   Estimated scan: ~{format_bytes(self.total)}{more} (budget {format_bytes(budget)})")
+
+
+class AthenaCostGuard:
+    """
+    Usage:
+        guard = AthenaCostGuard(session, 'edu_etl_db', 's3://bucket/athena-results/')
+        sql = guard.check(sql)
+        athena.start_query_execution(QueryString=sql, WorkGroup=guard.workgroup, ...)
+    """
+
+    def __init__(self, session, database, output_location, max_scan_bytes=None, workgroup=None):
+        self.session = session
+        self.database = database
+        self.output_location = output_location
+        self.max_scan_bytes = max_scan_bytes or default_max_scan_bytes()
+        # One workgroup per budget: its cutoff is never changed under another user's queries
+        cutoff_mb = -(-max(self.max_scan_bytes, MIN_CUTOFF_BYTES) // 1024 ** 2)  # Whole MB, rounded up
+        self.cutoff_bytes = cutoff_mb * 1024 ** 2
+        self.workgroup = workgroup or f"{GUARD_WORKGROUP}-{cutoff_mb}mb"
+        self.athena = session.client('athena')
+        self.glue = session.client('glue')
+        self.s3 = session.client('s3')
+        self._stats = {}
+        self._workgroup_ready = False
+
+    # --- Workgroup with a bytes-scanned cutoff ---
+
+    def ensure_workgroup(self):
+        """
+        Creates the guarded workgroup for this budget (or fixes its cutoff if it was edited by hand).
+        """
+        if self._workgroup_ready:
+            return
+        cutoff = self.cutoff_bytes
+        try:
+            workgroup = self.athena.get_work_group(WorkGroup=self.workgroup).get('WorkGroup')
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'InvalidRequestException':
+                raise
+            workgroup = None  # Doesn't exist yet
+
+        if workgroup:
+            if workgroup.get('Configuration', {}).get('BytesScannedCutoffPerQuery') != cutoff:
+                self.athena.update_work_group(WorkGroup=self.workgroup,
+                                              ConfigurationUpdates={'BytesScannedCutoffPerQuery': cutoff})
+        else:
+            print(f"   Creating Athena workgroup {self.workgroup} (cutoff {format_bytes(cutoff)} per query)")
+            self.athena.create_work_group(
+                Name=self.workgroup,
+                Description='AWS Playground: queries with a bytes-scanned limit',
+                Configuration={
+                    'ResultConfiguration': {'OutputLocation': self.output_location},
+                    'BytesScannedCutoffPerQuery': cutoff,
+                    'PublishCloudWatchMetricsEnabled': True,
+                })
+        self._workgroup_ready = True
+
+    # --- EXPLAIN ---
+
+    def _explain(self, sql):
+        """
+        Returns (plan lines, None) or (None, error message). EXPLAIN reads no data.
+        """
+        self.ensure_workgroup()
+        query_id = self.athena.start_query_execution(
+            QueryString=f"EXPLAIN {sql}",
+            QueryExecutionContext={'Database': self.database},
+            ResultConfiguration={'OutputLocation': self.output_location},
+            WorkGroup=self.workgroup,
+        )['QueryExecutionId']
+
+        interval = 0.2
+        while True:
+            status = self.athena.get_query_execution(QueryExecutionId=query_id)['QueryExecution']['Status']
+            if status['State'] == 'SUCCEEDED':
+                break
+            if status['State'] in ('FAILED', 'CANCELLED'):
+                return None, status.get('StateChangeReason', status['State'])
+            time.sleep(interval)
+            interval = min(interval * 1.5, 2.0)
+
+        lines = []
+        paginator = self.athena.get_paginator('get_query_results')
+        for page in paginator.paginate(QueryExecutionId=query_id):
+            for row in page['ResultSet']['Rows']:
+                lines += [d.get('VarCharValue', '') for d in row['Data']]
+        return lines, None
+
+    # --- Glue statistics ---
+
+    def _s3_sizes(self, location):
+        """
+        Bytes per object under an S3 location: {key: size}.
+        """
+        bucket, _, prefix = location.replace('s3://', '', 1).partition('/')
+        sizes = {}
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix.rstrip('/') + '/' if prefix else ''):
+            for obj in page.get('Contents', []):
+                sizes[f"s3://{bucket}/{obj['Key']}"] = obj['Size']
+        return sizes
+
+    def table_stats(self, database, table):
+        key = (database, table)
+        if key in self._stats:
+            return self._stats[key]
+
+        info = self.glue.get_table(DatabaseName=database, Name=table)['Table']
+        descriptor = info.get('StorageDescriptor', {})
+        columns = [c['Name'] for c in descriptor.get('Columns', [])]
+        partition_keys = [k['Name'] for k in info.get('PartitionKeys', [])]
+        classification = (info.get('Parameters', {}).get('classification') or '').lower()
+        serde = (descriptor.get('SerdeInfo', {}).get('SerializationLibrary') or '').lower()
+        columnar = any(f in classification or f in serde for f in COLUMNAR_FORMATS)
+
+        partitions = []
+        listing = None
+        if partition_keys:
+            paginator = self.glue.get_paginator('get_partitions')
+            for page in paginator.paginate(DatabaseName=database, TableName=table):
+                for p in page['Partitions']:
+                    size = p.get('Parameters', {}).get('sizeKey')
+                    if size is None:
+                        # The crawler didn't record a size: add up the files (one listing for the whole table)
+                        if listing is None:
+                            listing = self._s3_sizes(descriptor.get('Location', ''))
+                        prefix = p['StorageDescriptor']['Location'].rstrip('/') + '/'
+                        size = sum(s for k, s in listing.items() if k.startswith(prefix))
+                    partitions.append((p['Values'], int(size)))
+            total = sum(size for _, size in partitions)
+        else:
+            size = info.get('Parameters', {}).get('sizeKey')
+            total = int(size) if size is not None else sum(self._s3_sizes(descriptor.get('Location', '')).values())
+
+        stats = TableStats(columns, partition_keys, columnar, partitions, total)
+        self._stats[key] = stats
+        return stats
+
+    # --- Estimating ---
+
+    def estimate(self, sql, plan_tables=None):
+        """
+        Estimated bytes scanned, per table.
+        plan_tables: the parse_plan() result; without it, every referenced table is read in full.
+        """
+        if not plan_tables:
+            plan_tables = {}
+            for database, table in _SQL_TABLE.findall(sql):
+                if table:
+                    plan_tables[(database, table)] = {'columns': None, 'domains': {}}
+                else:
+                    plan_tables[(self.database, database)] = {'columns': None, 'domains': {}}
+
+        estimate = ScanEstimate()
+        for (database, table), used in plan_tables.items():
+            try:
+                stats = self.table_stats(database, table)
+            except ClientError as e:
+                estimate.tables.append((f"{database}.{table}", 0, 0, f"size unknown: {e.response['Error']['Code']}"))
+                estimate.unknown.append((database, table))
+                continue
+            notes = []
+
+            # Partition pruning: only the partitions the filters allow
+            scanned = stats.total_bytes
+            if stats.partitions and used['domains']:
+                kept = [size for values, size in stats.partitions
+                        if all(_in_domain(values[i], used['domains'][k])
+                               for i, k in enumerate(stats.partition_keys) if k in used['domains'])]
+                scanned = sum(kept)
+                notes.append(f"{len(kept)} of {len(stats.partitions)} partitions")
+            elif stats.partitions:
+                notes.append(f"all {len(stats.partitions)} partitions")
+
+            # Column pruning for Parquet/ORC
+            fraction = _column_fraction(stats, used)
+            if fraction < 1:
+                scanned = scanned * fraction
+                notes.append(f"{round(fraction * len(stats.columns))} of {len(stats.columns)} columns")
+            estimate.tables.append((f"{database}.{table}", int(scanned), stats.total_bytes, ", ".join(notes)))
+        return estimate
+
+    # --- Rewriting ---
+
+    @staticmethod
+    def _add_filter(sql, condition):
+        """
+        Adds 'condition' to the query's WHERE clause (or adds one).
+        """
+        where = re.search(r'\bWHERE\b', sql, re.IGNORECASE)
+        if where:
+            rest = sql[where.end():]
+            end = _CLAUSE_END.search(rest)
+            body, tail = (rest[:end.start()], rest[end.start():]) if end else (rest, '')
+            return f"{sql[:where.start()]}WHERE {condition} AND ({body.strip()}) {tail}".strip()
+        end = _CLAUSE_END.search(sql)
+        if end:
+            return f"{sql[:end.start()].rstrip()} WHERE {condition} {sql[end.start():]}"
+        return f"{sql} WHERE {condition}"
+
+    def _newest_partitions_filter(self, stats, used):
+        """
+        A filter on the first partition key that keeps the newest partitions
+        fitting in the budget, or None.
+        """
+        if not stats.partitions or stats.partition_keys[0] in used['domains']:
+            return None
+        fraction = _column_fraction(stats, used)
+        sizes = defaultdict(int)
+        for values, size in stats.partitions:
+            sizes[values[0]] += size * fraction
+        kept, cutoff = 0, None
+        for value in sorted(sizes, reverse=True):
+            if kept + sizes[value] > self.max_scan_bytes:
+                break
+            kept += sizes[value]
+            cutoff = value
+        if cutoff is None:
+            return None
+        value = cutoff.replace("'", "''")
+        return f"\"{stats.partition_keys[0]}\" >= '{value}'"
+
+    def check(self, sql):
+        """
+        Returns the SQL to run (maybe rewritten), or None if it must not run.
+        """
+        sql = sql.strip().rstrip(';').strip()
+        lines, error = self._explain(sql)
+        if error:
+            print(f"   ❌ Rejected before running: {error}")
+            return None
+        plan_tables = parse_plan(lines)
+        estimate = self.estimate(sql, plan_tables)
+        estimate.print_summary(self.max_scan_bytes)
+        if estimate.total <= self.max_scan_bytes and not estimate.unknown:
+            return sql
+
+        # 1. Only the newest partitions (single-table queries only: the rewrite must be unambiguous)
+        if (len(plan_tables) == 1 and not estimate.unknown
+                and len(re.findall(r'\bSELECT\b', sql, re.IGNORECASE)) == 1):
+            (database, table), used = next(iter(plan_tables.items()))
+            condition = self._newest_partitions_filter(self.table_stats(database, table), used)
+            if condition:
+                rewritten = self._add_filter(sql, condition)
+                lines, error = self._explain(rewritten)
+                if not error:
+                    new_estimate = self.estimate(rewritten, parse_plan(lines))
+                    if new_estimate.total <= self.max_scan_bytes:
+                        print(f"   ✂️  Over budget: limited to the newest partitions ({condition}).")
+                        new_estimate.print_summary(self.max_scan_bytes)
+                        return rewritten
+
+        # 2. A plain row listing can stop as soon as it has enough rows
+        plain = not _AGGREGATE.search(sql) and not re.search(r'\b(ORDER\s+BY|JOIN|UNION)\b', sql, re.IGNORECASE)
+        if plain and not re.search(r'\bLIMIT\s+\d+\s*$', sql, re.IGNORECASE):
+            print(f"   ✂️  Over budget: added LIMIT {DEFAULT_LIMIT}. "
+                  f"(The workgroup cutoff stops it at {format_bytes(self.cutoff_bytes)}.)")
+            return f"{sql} LIMIT {DEFAULT_LIMIT}"
+
+        if estimate.unknown:
+            names = ", ".join(f"{d}.{t}" for d, t in estimate.unknown)
+            print(f"   ❌ Rejected: can't estimate the scan of {names} (no Glue statistics). "
+                  f"Check that the table is cataloged and readable.")
+            return None
+        print(f"   ❌ Rejected: would scan ~{format_bytes(estimate.total)}, "
+              f"over the {format_bytes(self.max_scan_bytes)} budget. Add filters on the partition columns, or raise --max-scan-mb.")
+        return None
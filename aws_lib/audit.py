@@ -1,6 +1,8 @@
 from datetime import datetime, timezone
 import botocore
 from botocore.exceptions import ClientError
+from aws_lib.inventory import INSTANCE, VOLUME, NAT_GATEWAY, DB_INSTANCE, LAMBDA_FUNCTION
+from aws_lib.pricing import PriceCatalog, format_cost
 
 class CostAuditor:
     """
@@ -17,6 +19,23 @@ class CostAuditor:
         self.lambda_client = session.client('lambda') # For Serverless Functions
         self.bedrock = session.client('bedrock') # For AI Models
         self.ce = session.client('ce')          # For Cost Explorer ($$$)
+        self.prices = PriceCatalog()            # Local price list, for $/month per finding
+        self.flagged_cost = 0.0
+
+    def _cost(self, resource_type, region=None, **details):
+        """
+        ' (~$70.08/month)' for a finding, from the local price catalog (no API call).
+        """
+        monthly = self.prices.monthly_cost({'type': resource_type, 'details': details,
+                                            'region': region or self.session.region_name})
+        self.flagged_cost += monthly or 0.0
+        return format_cost(monthly)
+
+    def _print_cost_footer(self):
+        if self.prices.is_empty:
+            print("\nTip: run 'python cli.py audit pricing' to see what each finding costs per month.")
+        else:
+            print(f"\nEstimated cost of the flagged resources: ${self.flagged_cost:,.2f}/month")
 
     def audit_resources(self):
         """
@@ -30,6 +49,61 @@ class CostAuditor:
         self._check_rds()
         self._check_lambda()
         self._check_bedrock()
+        self._print_cost_footer()
+
+    def audit_inventory(self, inventory):
+        """
+        The same report as audit_resources(), but read from the local inventory
+        index (aws_lib/inventory.py) instead of one describe call per service.
+        Covers every region the inventory was built for.
+        """
+        print(f"\nAudit Report for Profile: {self.session.profile_name}")
+        print(f"Timestamp: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}")
+        print(f"Source: local inventory (last refreshed {inventory.last_synced() or 'never'})")
+
+        print("\n--- Checking EC2 Instances ---")
+        instances = inventory.query(type=INSTANCE, state='running')
+        if not instances:
+            print("OK: No running EC2 instances found.")
+        for i in instances:
+            print(f"WARNING: Instance {i['resource_id']} is RUNNING ({i['details'].get('instance_type')}) [{i['region']}]"
+                  f"{self._cost(INSTANCE, i['region'], **i['details'])}")
+
+        print("\n--- Checking EBS Volumes ---")
+        volumes = inventory.query(type=VOLUME, state='available')
+        if not volumes:
+            print("OK: No unattached EBS volumes found.")
+        for v in volumes:
+            print(f"WARNING: Volume {v['resource_id']} is AVAILABLE ({v['details'].get('size_gb')} GB) [{v['region']}]"
+                  f"{self._cost(VOLUME, v['region'], **v['details'])}")
+
+        print("\n--- Checking NAT Gateways ---")
+        nats = inventory.query(type=NAT_GATEWAY, state='available')
+        if not nats:
+            print("OK: No active NAT Gateways found.")
+        for nat in nats:
+            print(f"WARNING: NAT Gateway {nat['resource_id']} is AVAILABLE. [{nat['region']}]{self._cost(NAT_GATEWAY, nat['region'])}")
+
+        print("\n--- Checking RDS Databases ---")
+        dbs = inventory.query(type=DB_INSTANCE)
+        if not dbs:
+            print("OK: No RDS instances found.")
+        for db in dbs:
+            print(f"WARNING: DB Instance {db['resource_id']} is {db['state']} ({db['details'].get('db_class')}) [{db['region']}]"
+                  f"{self._cost(DB_INSTANCE, db['region'], **db['details'])}")
+
+        print("\n--- Checking Lambda Functions ---")
+        funcs = inventory.query(type=LAMBDA_FUNCTION)
+        if not funcs:
+            print("OK: No Lambda functions found.")
+        else:
+            print(f"Found {len(funcs)} Lambda functions:")
+            for f in funcs:
+                print(f" - {f['resource_id']} ({f['details'].get('runtime')}) [{f['region']}]")
+
+        # Bedrock throughput is not in AWS Config / Resource Explorer: ask directly
+        self._check_bedrock()
+        self._print_cost_footer()
 
     def _check_ec2(self):
         print("\n--- Checking EC2 Instances ---")
@@ -40,7 +114,7 @@ class CostAuditor:
             print("OK: No running EC2 instances found.")
         else:
             for i in instances:
-                print(f"WARNING: Instance {i.id} is RUNNING ({i.instance_type})")
+                print(f"WARNING: Instance {i.id} is RUNNING ({i.instance_type}){self._cost(INSTANCE, instance_type=i.instance_type)}")
 
     def _check_volumes(self):
         print("\n--- Checking EBS Volumes ---")
@@ -52,7 +126,7 @@ class CostAuditor:
             print("OK: No unattached EBS volumes found.")
         else:
             for v in volumes:
-                print(f"WARNING: Volume {v.id} is AVAILABLE ({v.size} GB)")
+                print(f"WARNING: Volume {v.id} is AVAILABLE ({v.size} GB){self._cost(VOLUME, size_gb=v.size, volume_type=v.volume_type)}")
 
     def _check_nat_gateways(self):
         print("\n--- Checking NAT Gateways ---")
@@ -64,7 +138,7 @@ class CostAuditor:
                 print("OK: No active NAT Gateways found.")
             else:
                 for nat in nats:
-                    print(f"WARNING: NAT Gateway {nat['NatGatewayId']} is AVAILABLE.")
+                    print(f"WARNING: NAT Gateway {nat['NatGatewayId']} is AVAILABLE.{self._cost(NAT_GATEWAY)}")
         except ClientError as e:
             print(f"Error checking NAT Gateways: {e}")
 
@@ -78,7 +152,8 @@ class CostAuditor:
                 print("OK: No RDS instances found.")
             else:
                 for db in dbs:
-                    print(f"WARNING: DB Instance {db['DBInstanceIdentifier']} is {db['DBInstanceStatus']} ({db['DBInstanceClass']})")
+                    print(f"WARNING: DB Instance {db['DBInstanceIdentifier']} is {db['DBInstanceStatus']} ({db['DBInstanceClass']})"
+                          f"{self._cost(DB_INSTANCE, db_class=db['DBInstanceClass'], engine=db.get('Engine'))}")
         except ClientError as e:
             print(f"Error checking RDS: {e}")
 
@@ -1,7 +1,27 @@
-import boto3  # The Main AWS Library for Python
 import os     # Library to read Environment Variables (like AWS_PROFILE)
 import sys
-from botocore.exceptions import ProfileNotFound, ClientError
+
+# NOTE: boto3 is imported inside get_session(), not here.
+# Importing boto3 takes a few hundred milliseconds, and cli.py imports this
+# file even for commands that never reach AWS.
+
+def get_cache_dir(*parts):
+    """
+    Returns (and creates) a private folder for our local caches and state:
+    ~/.aws_playground by default, or $AWS_PLAYGROUND_HOME if that is set.
+
+    Example: get_cache_dir('daemon') -> ~/.aws_playground/daemon
+    """
+    base = os.environ.get('AWS_PLAYGROUND_HOME') or os.path.join(os.path.expanduser('~'), '.aws_playground')
+    # 0o700 = only the current user can read it (caches may hold account details).
+    # Each level is created on its own: makedirs() only applies 'mode' to the last one.
+    path = base
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    for part in parts:
+        path = os.path.join(path, part)
+        os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
 
 class SessionManager:
     """
@@ -11,26 +31,42 @@ class SessionManager:
     """
     
     @staticmethod
-    def get_session(profile_name=None):
+    def resolve_profile_name(profile_name=None):
+        """
+        If the user didn't specify a profile, we look for the 'AWS_PROFILE' setting
+        in the computer's environment. If that's missing, we default to 'study'.
+        """
+        return profile_name or os.environ.get('AWS_PROFILE', 'study')
+
+    @staticmethod
+    def get_session(profile_name=None, background_refresh=False):
         """
         Creates and returns a logical login session to AWS.
         
         Args:
             profile_name: The specific name of the user profile in ~/.aws/config.
                           If None, it tries to find a default from your environment.
+            background_refresh: Keep role credentials fresh in a background thread
+                                (only for long-running processes like the daemon).
         """
         # 1. Determine which Profile to use
-        # If the user didn't specify one, we look for the 'AWS_PROFILE' setting
-        # in the computer's environment. If that's missing, we default to 'study'.
-        if not profile_name:
-            profile_name = os.environ.get('AWS_PROFILE', 'study')
-            
+        profile_name = SessionManager.resolve_profile_name(profile_name)
+
+        import boto3  # The Main AWS Library for Python
+        from botocore.exceptions import ProfileNotFound
+
         try:
             # 2. Try to Create the Session
             # boto3 will look at your ~/.aws/credentials file.
             # If your profile needs MFA, it might pause here and wait for you 
             # to handle that (though usually that's handled by the 'env_setter' script beforehand).
-            return boto3.Session(profile_name=profile_name)
+            session = boto3.Session(profile_name=profile_name)
+
+            # 3. Role profiles: reuse the temporary credentials from the last run
+            # (see aws_lib/credcache.py), so we don't call STS / ask for MFA every time.
+            from aws_lib.credcache import CredentialCache
+            CredentialCache(session, profile_name).install(background_refresh)
+            return session
             
         except ProfileNotFound:
             print(f"Error: Profile '{profile_name}' not found.")
@@ -39,3 +75,35 @@ class SessionManager:
         except Exception as e:
             print(f"Error creating session: {e}")
             sys.exit(1)
+
+
+class LazySession:
+    """
+    A stand-in for a boto3 Session that only logs in when it is first used.
+
+    Example:
+        session = LazySession(lambda: SessionManager.get_session('study'))
+        # ... no AWS work has happened yet ...
+        session.client('s3')  # <- the real session is created here
+    """
+
+    def __init__(self, factory):
+        self._factory = factory  # A function that returns the real session
+        self._session = None
+
+    @property
+    def is_created(self):
+        return self._session is not None
+
+    def get(self):
+        """
+        Returns the real boto3 Session (creating it the first time).
+        """
+        if self._session is None:
+            self._session = self._factory()
+        return self._session
+
+    def __getattr__(self, name):
+        # Anything we don't define ourselves (client, resource, profile_name...)
+        # is forwarded to the real session.
+        return getattr(self.get(), name)
@@ -0,0 +1,213 @@
+"""
+Credential Cache
+Profiles that 'assume a role' (often with MFA) normally call STS, and maybe ask
+for an MFA code, every time a new Python process starts. The temporary
+credentials STS hands out are valid for an hour, so we keep them on disk and
+reuse them:
+
+- Encrypted: the files are written with Fernet (from the 'cryptography'
+  package), with a key that only this user can read.
+- Scoped: one folder per profile; inside it, one file per role/MFA/session
+  (botocore picks the file name from the role settings).
+- Shared: processes take a file lock before logging in, so two commands started
+  at the same time don't both call STS (or both ask for an MFA code).
+- Refreshed: the CLI daemon (the only long-running process) renews the
+  credentials in the background a few minutes before they expire. One-shot
+  commands don't start that thread: they exit long before it would run.
+
+Back-to-back commands then skip STS entirely.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # Optional: without it we don't cache credentials on disk
+    Fernet = None
+
+from aws_lib.core import get_cache_dir
+
+# botocore renews assume-role credentials once less than 15 minutes are left,
+# so the background refresher wakes up just inside that window.
+REFRESH_BEFORE_EXPIRY_SECONDS = 14 * 60
+
+
+def is_available():
+    return Fernet is not None
+
+
+def _print_tip_once():
+    """
+    The 'install cryptography' hint, shown once per cache folder (not on every command).
+    """
+    marker = os.path.join(get_cache_dir('credentials'), '.cryptography-tip-shown')
+    if os.path.exists(marker):
+        return
+    print("Tip: pip install cryptography to cache assume-role credentials between commands.")
+    open(marker, 'a').close()
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Holds an exclusive lock on 'path' (created if missing) across processes.
+    """
+    with open(path, 'a+') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # Retries for ~10s, then raises
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _load_key():
+    """
+    The encryption key: $AWS_PLAYGROUND_CACHE_KEY, or a key file that is
+    created on first use and readable only by the current user.
+    """
+    key = os.environ.get('AWS_PLAYGROUND_CACHE_KEY')
+    if key:
+        return key.encode()
+    folder = get_cache_dir('credentials')
+    path = os.path.join(folder, 'cache.key')
+    with file_lock(os.path.join(folder, 'cache.key.lock')):
+        if not os.path.exists(path):
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(Fernet.generate_key())
+        with open(path, 'rb') as f:
+            return f.read().strip()
+
+
+def _to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Can't cache {type(value).__name__}")
+
+
+class EncryptedFileCache:
+    """
+    A dictionary-like object stored as encrypted files in one folder.
+    botocore's assume-role provider reads and writes it like a dict:
+        cache[key] = response   /   key in cache   /   cache[key]
+    """
+
+    def __init__(self, folder, key):
+        self.folder = folder
+        self._fernet = Fernet(key)
+
+    def _path(self, cache_key):
+        return os.path.join(self.folder, cache_key + '.bin')
+
+    def __contains__(self, cache_key):
+        return os.path.isfile(self._path(cache_key))
+
+    def __getitem__(self, cache_key):
+        try:
+            with open(self._path(cache_key), 'rb') as f:
+                return json.loads(self._fernet.decrypt(f.read()))
+        except (OSError, ValueError, InvalidToken):
+            # Missing, corrupted, or written with another key: treat as 'not cached'
+            raise KeyError(cache_key)
+
+    def __setitem__(self, cache_key, value):
+        data = self._fernet.encrypt(json.dumps(value, default=_to_json).encode())
+        # Write to a temporary file first, then swap it in, so readers never see half a file
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, self._path(cache_key))
+
+    def __delitem__(self, cache_key):
+        try:
+            os.remove(self._path(cache_key))
+        except FileNotFoundError:
+            raise KeyError(cache_key)
+
+
+class CredentialCache:
+    """
+    Plugs an EncryptedFileCache into a boto3 Session's assume-role provider.
+
+    Usage:
+        session = boto3.Session(profile_name='admin')
+        CredentialCache(session, 'admin').install()
+    """
+
+    def __init__(self, session, profile_name):
+        self.session = session
+        self.profile_name = profile_name
+        self.folder = get_cache_dir('credentials', profile_name)
+        self.lock_path = os.path.join(self.folder, '.lock')
+        self._refresher = None
+
+    def uses_assume_role(self):
+        config = self.session._session.get_scoped_config()
+        return bool(config.get('role_arn'))
+
+    def install(self, background_refresh=False):
+        """
+        Returns True if the cache is active for this profile.
+        background_refresh: renew the credentials before they expire (long-running processes only).
+        """
+        if not self.uses_assume_role():
+            return False  # Plain keys / SSO: nothing to cache here
+        if not is_available():
+            _print_tip_once()
+            return False
+
+        provider = self.session._session.get_component('credential_provider').get_provider('assume-role')
+        provider.cache = EncryptedFileCache(self.folder, _load_key())
+
+        # Log in now, while holding the lock: a second process waits here and
+        # then finds our credentials in the cache instead of calling STS again.
+        credentials = self.session.get_credentials()
+        if credentials is None:
+            return False
+        with file_lock(self.lock_path):
+            credentials.get_frozen_credentials()
+
+        if background_refresh:
+            self._start_refresher(credentials)
+        return True
+
+    def _start_refresher(self, credentials):
+        def refresh_forever():
+            while True:
+                expiry = getattr(credentials, '_expiry_time', None)
+                if expiry is None:
+                    return
+                wait = (expiry - datetime.now(timezone.utc)).total_seconds() - REFRESH_BEFORE_EXPIRY_SECONDS
+                time.sleep(max(wait, 30))
+                try:
+                    with file_lock(self.lock_path):
+                        # Inside the expiry window botocore renews them (from the cache if
+                        # another process already did, otherwise from STS)
+                        credentials.get_frozen_credentials()
+                except Exception as e:
+                    print(f"Warning: could not refresh the credentials for '{self.profile_name}': {e}")
+
+        # daemon=True: the thread never keeps the program alive on its own
+        self._refresher = threading.Thread(target=refresh_forever, name=f"refresh-{self.profile_name}", daemon=True)
+        self._refresher.start()
@@ -0,0 +1,348 @@
+"""
+CLI Daemon (Optional Speed-Up)
+Every 'python cli.py ...' normally pays the same startup costs: importing boto3,
+loading service models, reading credentials (maybe an MFA prompt) and opening
+new TLS connections. When a script calls the CLI hundreds of times an hour,
+that adds up.
+
+The daemon is a background process that keeps those things warm:
+- one logged-in session per profile,
+- a pool of already-built clients (with their open connections).
+
+'cli.py' checks for the daemon's socket first. If the daemon is running, the
+command is sent to it and the output streamed back. If not, the command simply
+runs in-process like before.
+
+Usage:
+    python cli.py daemon start     # start in the background
+    python cli.py daemon status
+    python cli.py daemon stop
+    python cli.py daemon serve     # run in the foreground (for debugging)
+
+Notes:
+- Needs Unix domain sockets (Linux/macOS, or a recent Windows with AF_UNIX).
+- Commands run one at a time inside the daemon (they share stdout and the
+  working directory), but they skip the whole startup cost.
+- Commands are non-interactive in the daemon: input() answers "no".
+- The client's AWS_* variables (profile, region, credentials, config files and
+  every AWS_PLAYGROUND_* setting) are sent with each command and replace the
+  daemon's own while it runs. Warm sessions are kept per profile and settings.
+"""
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import redirect_stdout, redirect_stderr
+
+from aws_lib.core import get_cache_dir
+
+
+ENV_PREFIXES = ('AWS_',)  # Forwarded from the client to the daemon with every command
+
+
+def get_socket_path():
+    return os.environ.get('AWS_PLAYGROUND_SOCKET') or os.path.join(get_cache_dir('daemon'), 'cli.sock')
+
+
+def is_supported():
+    return hasattr(socket, 'AF_UNIX')
+
+
+# --- The Client Side (used by cli.py) ---
+
+def _connect(timeout=0.5, path=None):
+    """
+    Returns a connected socket, or None if the daemon isn't running.
+    """
+    path = path or get_socket_path()
+    if not is_supported() or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)  # Commands may run for minutes; don't time out while waiting
+    return sock
+
+
+def _send(sock, message):
+    sock.sendall((json.dumps(message) + "\n").encode('utf-8'))
+
+
+def _aws_environment():
+    """
+    The environment variables that change what a command does: AWS_PROFILE,
+    AWS_REGION, credentials, config file paths and our AWS_PLAYGROUND_* settings.
+    """
+    return {k: v for k, v in os.environ.items() if k.startswith(ENV_PREFIXES)}
+
+
+def forward_to_daemon(argv):
+    """
+    Sends a CLI command to the daemon and prints its output as it arrives.
+    Returns the command's exit code, or None if no daemon is running
+    (the caller should then run the command itself).
+    """
+    sock = _connect()
+    if sock is None:
+        return None
+    try:
+        _send(sock, {
+            'argv': argv,
+            'cwd': os.getcwd(),
+            'env': _aws_environment(),
+        })
+        for line in sock.makefile('r', encoding='utf-8'):
+            message = json.loads(line)
+            if 'out' in message:
+                sys.stdout.write(message['out'])
+                sys.stdout.flush()
+            elif 'exit' in message:
+                return message['exit']
+        # The daemon hung up without an exit code
+        print("Error: the CLI daemon closed the connection unexpectedly.")
+        return 1
+    finally:
+        sock.close()
+
+
+def _control(action):
+    sock = _connect()
+    if sock is None:
+        return None
+    try:
+        _send(sock, {'control': action})
+        line = sock.makefile('r', encoding='utf-8').readline()
+        return json.loads(line) if line else {}
+    finally:
+        sock.close()
+
+
+# --- The Server Side ---
+
+class PooledSession:
+    """
+    Wraps a real boto3 Session and hands out the SAME client every time
+    a service is asked for (boto3 clients are safe to share between threads).
+    Reusing clients means reusing their service models and open connections.
+    """
+
+    def __init__(self, session):
+        self._session = session
+        self._clients = {}
+        self._resources = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, cache, factory, service_name, args, kwargs):
+        key = (service_name, args, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+        with self._lock:
+            if key not in cache:
+                cache[key] = factory(service_name, *args, **kwargs)
+            return cache[key]
+
+    def client(self, service_name, *args, **kwargs):
+        return self._cached(self._clients, self._session.client, service_name, args, kwargs)
+
+    def resource(self, service_name, *args, **kwargs):
+        return self._cached(self._resources, self._session.resource, service_name, args, kwargs)
+
+    @property
+    def pool_size(self):
+        return len(self._clients) + len(self._resources)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class _SocketWriter(io.TextIOBase):
+    """
+    A file-like object: everything printed to it is sent to the client.
+    """
+
+    def __init__(self, sock):
+        self._sock = sock
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text:
+            _send(self._sock, {'out': text})
+        return len(text)
+
+
+class CliDaemon:
+    """
+    Listens on a Unix socket and runs cli.py commands with warm sessions.
+    """
+
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path or get_socket_path()
+        self.sessions = {}           # (profile name, client's AWS_* variables) -> PooledSession
+        self.started = time.time()
+        self.requests = 0
+        self._run_lock = threading.Lock()      # One command at a time (shared stdout / cwd)
+        self._session_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def get_session(self, profile_name):
+        """
+        Returns the warm session for a profile (logging in only the first time).
+        A client with another region or other credentials gets its own session.
+        """
+        from aws_lib.core import SessionManager
+        profile_name = SessionManager.resolve_profile_name(profile_name)
+        key = (profile_name, tuple(sorted(_aws_environment().items())))
+        with self._session_lock:
+            if key not in self.sessions:
+                session = SessionManager.get_session(profile_name, background_refresh=True)  # Lives as long as we do
+                self.sessions[key] = PooledSession(session)
+            return self.sessions[key]
+
+    def serve(self):
+        if not is_supported():
+            print("Error: this system does not support Unix sockets; the daemon can't run here.")
+            return 1
+        if os.path.exists(self.socket_path):
+            if _connect(path=self.socket_path) is not None:
+                print(f"A daemon is already running on {self.socket_path}")
+                return 1
+            os.remove(self.socket_path)  # Left over from a crash
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)  # Only our user may send commands
+        server.listen()
+        server.settimeout(0.5)  # Wake up regularly to check for 'stop'
+        print(f"CLI daemon listening on {self.socket_path} (pid {os.getpid()})")
+        try:
+            while not self._stopping.is_set():
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            print("CLI daemon stopped.")
+        return 0
+
+    def _handle(self, conn):
+        try:
+            line = conn.makefile('r', encoding='utf-8').readline()
+            if not line:
+                return
+            request = json.loads(line)
+            if 'control' in request:
+                _send(conn, self._handle_control(request['control']))
+            else:
+                _send(conn, {'exit': self._run_command(conn, request)})
+        except (OSError, ValueError) as e:
+            print(f"Daemon: dropped a request ({e})")
+        finally:
+            conn.close()
+
+    def _handle_control(self, action):
+        if action == 'stop':
+            self._stopping.set()
+        profiles = {}
+        for (name, _), session in list(self.sessions.items()):
+            profiles[name] = profiles.get(name, 0) + session.pool_size
+        return {
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self.started),
+            'requests': self.requests,
+            'profiles': profiles,
+        }
+
+    @staticmethod
+    def _use_environment(env):
+        """
+        Replaces the daemon's AWS_* variables with the client's.
+        Returns the daemon's own, for _use_environment() to put back afterwards.
+        """
+        previous = _aws_environment()
+        for name in previous:
+            del os.environ[name]
+        os.environ.update(env)
+        return previous
+
+    def _run_command(self, conn, request):
+        import cli  # The project's cli.py (the daemon is started from the project root)
+
+        def session_factory(profile_name):
+            return self.get_session(profile_name)
+
+        with self._run_lock:
+            self.requests += 1
+            writer = _SocketWriter(conn)
+            previous_cwd, previous_stdin = os.getcwd(), sys.stdin
+            previous_env = self._use_environment(request.get('env') or {})
+            try:
+                os.chdir(request.get('cwd') or previous_cwd)
+                sys.stdin = io.StringIO('')  # No keyboard here: input() gets "no answer"
+                with redirect_stdout(writer), redirect_stderr(writer):
+                    return cli.run(request['argv'], session_factory=session_factory)
+            except SystemExit as e:
+                return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except Exception as e:
+                writer.write(f"Daemon error: {e}\n")
+                return 1
+            finally:
+                os.chdir(previous_cwd)
+                sys.stdin = previous_stdin
+                self._use_environment(previous_env)
+
+
+# --- Commands behind 'cli.py daemon ...' ---
+
+def start():
+    if not is_supported():
+        print("Error: this system does not support Unix sockets; the daemon can't run here.")
+        return
+    if _control('status') is not None:
+        print("CLI daemon is already running.")
+        return
+    log_path = os.path.join(get_cache_dir('daemon'), 'daemon.log')
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(log_path, 'a') as log:
+        # start_new_session=True detaches it from this terminal
+        subprocess.Popen([sys.executable, '-m', 'aws_lib.daemon'], cwd=project_root,
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True)
+    # Wait (briefly) until it answers
+    for _ in range(50):
+        time.sleep(0.1)
+        if _control('status') is not None:
+            print(f"✅ CLI daemon started. Socket: {get_socket_path()}  Log: {log_path}")
+            return
+    print(f"❌ The daemon did not start. Check {log_path}")
+
+
+def stop():
+    if _control('stop') is None:
+        print("CLI daemon is not running.")
+    else:
+        print("✅ CLI daemon stopping.")
+
+
+def status():
+    info = _control('status')
+    if info is None:
+        print("CLI daemon is not running (commands run in-process).")
+        return
+    print(f"CLI daemon running (pid {info['pid']}), up {info['uptime_seconds']}s, {info['requests']} commands served.")
+    for profile, clients in info['profiles'].items():
+        print(f"   - profile '{profile}': {clients} warm clients")
+
+
+if __name__ == "__main__":
+    sys.exit(CliDaemon().serve())
@@ -0,0 +1,216 @@
+"""
+Pipeline Status Dashboard ('pipeline status')
+Shows, for every dataset in the registry (datasets.yaml), on one screen:
+job (last run, start, duration), crawler (state, last crawl), table
+(partitions) and processed files (count, total size, newest object).
+
+1. Datasets are checked at the same time: first the last job run of every
+   job (in parallel) and all crawlers (one 'batch_get_crawlers' call), then
+   one thread per dataset for its partitions and S3 listing.
+2. With --watch N the screen is redrawn in place every N seconds.
+3. Listings are incremental, so watching a big lake stays cheap:
+   - A full listing only happens the first time, when the dataset's job
+     finished a new run (it rewrites the output), or every --full-every refreshes.
+   - In between, only keys after the last one we saw are listed ('StartAfter').
+     New date partitions sort last, so they show up within one refresh.
+   - Partitions are counted again only when the table or its last crawl changed.
+   Results are kept in ~/.aws_playground/pipeline/listings.json, with a running
+   count of refreshes, so one-shot 'pipeline status' runs also reach
+   --full-every and notice deleted files.
+
+Usage:
+    python cli.py pipeline status
+    python cli.py pipeline status --watch 30 --dataset orders
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from aws_lib.core import get_cache_dir
+
+FULL_EVERY = 20     # Refreshes between full listings (catches deleted files)
+MAX_THREADS = 16
+
+
+def _size(num_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if num_bytes < 1024 or unit == 'TB':
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def _ago(timestamp):
+    if not timestamp:
+        return '-'
+    seconds = (datetime.now(timezone.utc) - datetime.fromisoformat(timestamp)).total_seconds()
+    for unit, length in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= length:
+            return f"{int(seconds // length)}{unit} ago"
+    return f"{int(max(seconds, 0))}s ago"
+
+
+class PipelineDashboard:
+    """
+    Usage:
+        dashboard = PipelineDashboard(manager, load_datasets())
+        dashboard.show()          # once
+        dashboard.watch(30)       # until Ctrl+C
+    """
+
+    def __init__(self, manager, datasets, full_every=FULL_EVERY):
+        self.manager = manager
+        self.datasets = datasets
+        self.full_every = full_every
+        self.s3 = manager.session.client('s3')
+        self.glue = manager.glue
+        self.cache_path = os.path.join(get_cache_dir('pipeline'), 'listings.json')
+        self.refreshes, self.cache = self._load_cache()  # Refreshes so far (in every run), cached results
+        self.calls = 0  # list_objects_v2 pages fetched during the last refresh
+        self._lock = threading.Lock()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            return int(data.get('refreshes', 0)), data.get('entries', {})
+        except (OSError, ValueError, AttributeError):
+            return 0, {}
+
+    def _save_cache(self):
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.cache_path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'refreshes': self.refreshes, 'entries': self.cache}, f)
+        os.replace(temp_path, self.cache_path)
+
+    # --- Processed files ---
+
+    def _list(self, bucket, prefix, start_after=None):
+        """
+        (count, bytes, newest, last key) for the keys under prefix (after start_after).
+        """
+        count, size, newest, last_key = 0, 0, None, start_after
+        kwargs = {'Bucket': bucket, 'Prefix': prefix}
+        if start_after:
+            kwargs['StartAfter'] = start_after
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(**kwargs):
+            with self._lock:
+                self.calls += 1
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith('/'):
+                    continue  # Folder markers
+                count += 1
+                size += obj['Size']
+                modified = obj['LastModified'].astimezone(timezone.utc).isoformat()
+                newest = max(newest or modified, modified)
+                last_key = max(last_key or obj['Key'], obj['Key'])
+        return count, size, newest, last_key
+
+    def prefix_stats(self, dataset, job_marker):
+        """
+        Stats of the dataset's output folder, listing as little as possible.
+        job_marker: changes whenever the job starts or ends a run (its state + start time).
+        """
+        bucket, prefix = dataset['bucket'], dataset['output']
+        key = f"s3://{bucket}/{prefix}"
+        cached = self.cache.get(key)
+        full = (cached is None or cached.get('job') != job_marker
+                or self.refreshes - cached.get('refresh', 0) >= self.full_every)
+        if full:
+            count, size, newest, last_key = self._list(bucket, prefix)
+            cached = {'count': count, 'bytes': size, 'newest': newest, 'last_key': last_key,
+                      'job': job_marker, 'refresh': self.refreshes}
+        else:
+            count, size, newest, last_key = self._list(bucket, prefix, cached['last_key'])
+            cached = dict(cached, count=cached['count'] + count, bytes=cached['bytes'] + size,
+                          newest=max(filter(None, (cached['newest'], newest)), default=None), last_key=last_key)
+        self.cache[key] = cached
+        return cached
+
+    # --- Table partitions ---
+
+    def partition_count(self, dataset, crawl_marker):
+        """
+        Partitions of the dataset's table ('-' if it isn't cataloged yet).
+        Counted again only when the table or its last crawl changed.
+        """
+        key = f"glue:{dataset['database']}.{dataset['table']}"
+        try:
+            table = self.glue.get_table(DatabaseName=dataset['database'], Name=dataset['table'])['Table']
+        except self.glue.exceptions.EntityNotFoundException:
+            return '-'
+        marker = f"{table.get('UpdateTime')}|{crawl_marker}"
+        cached = self.cache.get(key)
+        if cached and cached['marker'] == marker:
+            return cached['partitions']
+        if not table.get('PartitionKeys'):
+            partitions = 'none'
+        else:
+            partitions = 0
+            paginator = self.glue.get_paginator('get_partitions')
+            for page in paginator.paginate(DatabaseName=dataset['database'], TableName=dataset['table'],
+                                           ExcludeColumnSchema=True):
+                partitions += len(page['Partitions'])
+        self.cache[key] = {'marker': marker, 'partitions': partitions}
+        return partitions
+
+    # --- One refresh ---
+
+    def collect(self):
+        """
+        Returns one row (dict) per dataset.
+        """
+        self.calls = 0
+        rows = self.manager.dataset_status(self.datasets)  # Job runs + one batch call for crawlers
+
+        def details(item):
+            dataset, row = item
+            job_marker = f"{row['job']}|{row['started']}"
+            stats = self.prefix_stats(dataset, job_marker)
+            partitions = self.partition_count(dataset, f"{row['last crawl']}|{row['crawled']}")
+            return {
+                'dataset': row['dataset'],
+                'job': row['job'],
+                'started': row['started'],
+                'seconds': row['seconds'],
+                'crawler': row['crawler'],
+                'last crawl': row['last crawl'],
+                'crawled': row['crawled'],
+                'partitions': partitions,
+                'files': f"{stats['count']:,}",
+                'size': _size(stats['bytes']),
+                'newest': _ago(stats['newest']),
+            }
+
+        with ThreadPoolExecutor(max_workers=min(MAX_THREADS, max(len(rows), 1))) as pool:
+            result = list(pool.map(details, zip(self.datasets, rows)))
+        self.refreshes += 1
+        self._save_cache()
+        return result
+
+    def show(self):
+        start = time.monotonic()
+        rows = self.collect()
+        self.manager.print_table(rows)
+        print(f"\n{len(rows)} dataset(s), refreshed {datetime.now().strftime('%H:%M:%S')} "
+              f"in {time.monotonic() - start:.1f}s ({self.calls} S3 listing page(s)).")
+
+    def watch(self, interval):
+        """
+        Redraws the dashboard every 'interval' seconds until Ctrl+C.
+        """
+        redraw = sys.stdout.isatty()
+        try:
+            while True:
+                if redraw:
+                    print("\033[H\033[J", end='')  # Cursor to the top, clear the screen
+                self.show()
+                print(f"Refreshing every {interval}s. Ctrl+C to stop.")
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print()
@@ -0,0 +1,84 @@
+"""
+Synthetic Data Generator
+Creates realistic-looking 'orders' for the Data Lake.
+
+The Glue job (process_job.py) expects a file at raw/orders.json with
+'category', 'price' and 'quantity' fields. This module fakes that data
+so we can test (and benchmark) the pipeline without any real customers.
+
+We use NumPy so that a million rows take seconds instead of minutes:
+every column is built in ONE vectorized call instead of a Python loop.
+"""
+import json
+import numpy as np
+
+# Default base prices per category index (cycled if there are more categories)
+BASE_PRICES = [19.99, 249.00, 12.50, 89.90, 4.99, 599.00, 35.00, 1200.00]
+
+
+def generate_orders(rows=10000, categories=8, skew=1.2, seed=42, start_date='2024-01-01', days=365):
+    """
+    Builds a dictionary of NumPy columns (one array per field).
+
+    Args:
+        rows: How many orders to create.
+        categories: How many distinct product categories (the 'cardinality').
+        skew: Zipf-style exponent. 0 = every category equally popular,
+              higher = a few categories get most of the orders.
+        seed: Random seed, so the same settings always give the same data.
+        start_date / days: Orders are spread over this date range.
+    """
+    rng = np.random.default_rng(seed)
+
+    # 1. Category popularity: weight of rank k is 1 / k^skew
+    ranks = np.arange(1, categories + 1, dtype=np.float64)
+    weights = 1.0 / np.power(ranks, skew)
+    weights /= weights.sum()
+    category_idx = rng.choice(categories, size=rows, p=weights)
+
+    # 2. Prices wobble around a per-category base price (log-normal, always positive)
+    base = np.resize(np.array(BASE_PRICES), categories)
+    price = np.round(base[category_idx] * rng.lognormal(0.0, 0.25, size=rows), 2)
+
+    # 3. Quantities: most orders are small, a few are big
+    quantity = rng.geometric(0.45, size=rows).astype(np.int64)
+
+    # 4. Dates spread evenly over the range
+    order_date = np.datetime64(start_date) + rng.integers(0, days, size=rows).astype('timedelta64[D]')
+
+    return {
+        'order_id': np.arange(1, rows + 1, dtype=np.int64),
+        'customer_id': rng.integers(1, max(rows // 10, 2), size=rows, dtype=np.int64),
+        'category': np.array([f"category_{i:03d}" for i in range(categories)])[category_idx],
+        'price': price,
+        'quantity': quantity,
+        'order_date': order_date.astype(str),
+    }
+
+
+def to_records(columns):
+    """
+    Turns the column dictionary into a list of plain Python dicts (one per order).
+    """
+    names = list(columns.keys())
+    # .tolist() converts NumPy types to normal Python types (needed for json)
+    values = [columns[n].tolist() for n in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def to_json_bytes(columns):
+    """
+    Encodes the orders as a single JSON array.
+    This is the format process_job.py reads (spark.read.option("multiLine", True).json).
+    """
+    return json.dumps(to_records(columns)).encode('utf-8')
+
+
+def write_orders_json(path, **kwargs):
+    """
+    Generates orders and saves them to a local file. Returns the number of bytes written.
+    """
+    data = to_json_bytes(generate_orders(**kwargs))
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
@@ -1,32 +1,207 @@
+import csv
+import hashlib
+import io
+import json
+import time
+from datetime import datetime, timezone
 import yaml
 import os
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
+from aws_lib.ratelimit import TokenBucket
+from aws_lib.mailer import SesBulkMailer, SmtpMailer
+
+# IAM is a global service with a low, account-wide request rate.
+# We stay well below it when we run lookups in parallel.
+IAM_CALLS_PER_SECOND = 10
+IAM_LOOKUP_THREADS = 8
+
+# CloudFormation template limits
+MAX_TEMPLATE_RESOURCES = 500
+MAX_TEMPLATE_OUTPUTS = 200
+
+# Welcome email (stored once as an SES template; {{...}} are filled in per user)
+DEFAULT_SENDER = "sean.girgis@gmail.com" # Must be verified in SES
+WELCOME_TEMPLATE = 'EasyIAMWelcome'
+WELCOME_SUBJECT = "Welcome to AWS - Your Credentials"
+WELCOME_TEXT = """
+Hello {{user_name}},
+
+Your AWS account has been created.
+
+Login URL: {{login_url}}
+Username: {{user_name}}
+Password: {{password}}
+
+Please change this password immediately upon login.
+"""
+
+
+class IAMSnapshot:
+    """
+    An in-memory picture of the account's IAM state:
+    who exists, which groups they are in, which policies are attached,
+    and who already has a console password (login profile).
+
+    Built with a handful of paginated calls instead of one call per user.
+    """
+
+    def __init__(self):
+        self.users = {}   # user name -> {'groups': [...], 'policies': [...], 'created': datetime,
+                          #               'has_login_profile': True/False/None}
+        self.groups = {}  # group name -> {'policies': [...]}
+
+    def has_user(self, user_name):
+        return user_name in self.users
+
+    def has_login_profile(self, user_name):
+        """
+        True / False, or None if we don't know yet.
+        """
+        return self.users.get(user_name, {}).get('has_login_profile')
+
+
+def _hash(data):
+    """
+    A short, stable fingerprint of any JSON-friendly data.
+    """
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def _same_second(report_time, create_date):
+    """
+    Does the credential report's 'user_creation_time' (ISO text) match IAM's CreateDate?
+    """
+    if not report_time or create_date is None:
+        return False
+    try:
+        reported = datetime.fromisoformat(report_time.replace('Z', '+00:00'))
+    except ValueError:
+        return False
+    if isinstance(create_date, str):
+        create_date = datetime.fromisoformat(create_date.replace('Z', '+00:00'))
+    return abs((reported - create_date).total_seconds()) < 1
+
+
+class SpecPlan:
+    """
+    The difference between the spec file and what we applied last time.
+    """
+
+    def __init__(self):
+        self.added_groups, self.removed_groups, self.changed_groups = [], [], []
+        self.added_users, self.removed_users, self.changed_users = [], [], []
+        self.changes = {}               # name -> "old -> new" description for changed items
+        self.template_changed = True    # Does CloudFormation need an update?
+        self.base_stack = None
+        self.changed_stacks = []        # Stacks whose template changed
+        self.removed_stacks = []        # Shard stacks that are no longer needed
+        self.moved_users = {}           # user -> new stack (group changed with shard_by: group, or --force)
+        self.moved_from = {}            # user -> the stack that held them until now
+
+    @property
+    def is_empty(self):
+        return not (self.added_groups or self.removed_groups or self.changed_groups or
+                    self.added_users or self.removed_users or self.changed_users)
+
+    def print_report(self, stack_name):
+        print(f"\n--- PLAN: {stack_name} ---")
+        if self.is_empty and not self.template_changed:
+            print("No changes. The account matches the spec.")
+            return
+        for name in self.added_groups:
+            print(f"  + group {name}")
+        for name in self.changed_groups:
+            print(f"  ~ group {name} ({self.changes[name]})")
+        for name in self.removed_groups:
+            print(f"  - group {name}")
+        for name in self.added_users:
+            print(f"  + user  {name}")
+        for name in self.changed_users:
+            print(f"  ~ user  {name} ({self.changes[name]})")
+        for name in self.removed_users:
+            print(f"  - user  {name}")
+        added = len(self.added_groups) + len(self.added_users)
+        changed = len(self.changed_groups) + len(self.changed_users)
+        removed = len(self.removed_groups) + len(self.removed_users)
+        print(f"Summary: {added} to add, {changed} to change, {removed} to remove.")
+        print(f"CloudFormation update: {'needed' if self.template_changed else 'not needed'}")
+        for name in self.changed_stacks:
+            print(f"  ~ stack {name}")
+        for name in self.removed_stacks:
+            print(f"  - stack {name}")
+        for name, target in sorted(self.moved_users.items()):
+            print(f"  > user  {name} ({self.moved_from[name]} -> {target})")
+        if self.moved_users:
+            print(f"WARNING: {len(self.moved_users)} users move to another stack. CloudFormation will "
+                  f"delete and re-create them: they lose their password, access keys and MFA device. "
+                  f"'apply' only does this with --force.")
+
 
 class EasyIAMManager:
     def __init__(self, session, spec_path):
         self.session = session
         self.spec_path = spec_path
         self.iam = session.client('iam')
+        self.snapshot = None  # Filled by load_snapshot()
+        self._templates = {}  # stack name -> generated templates (built once)
+        self.placements = {}  # user name -> stack it was deployed in (kept by plan())
         with open(spec_path, 'r') as f:
             self.spec = yaml.safe_load(f)
 
     # --- PART 1: The Generator (Simplifies CloudFormation) ---
-    def generate_cloudformation(self, output_path):
+    def _shard_settings(self):
         """
-        Reads the Simple Spec and writes a complex CloudFormation file.
+        How users are split into stacks. Set in the spec's 'config' section:
+            shards: 4          # number of user stacks (1 = everything in one stack)
+            shard_by: hash     # 'hash' (even split by user name) or 'group' (one stack per group)
+        Changing 'shards' only places NEW users differently: a user that already
+        exists stays in its stack (moving it would re-create it, see plan()).
         """
-        print(f"Generating CloudFormation from {self.spec_path}...")
-        
-        # 1. Start the Template
-        template = {
-            "AWSTemplateFormatVersion": "2010-09-09",
-            "Description": "Generated by AWS Easy Manager",
-            "Resources": {},
-            "Outputs": {}
-        }
+        config = self.spec.get('config') or {}
+        return int(config.get('shards', 1)), config.get('shard_by', 'hash')
+
+    def _user_stack(self, stack_name, user):
+        """
+        Decides which stack a user belongs to. A user that was already deployed
+        keeps its stack ('placements'); new users are placed by the settings.
+        """
+        shards, shard_by = self._shard_settings()
+        if shard_by != 'group' and user['name'] in self.placements:
+            return self.placements[user['name']]
+        if shards <= 1 and shard_by != 'group':
+            return stack_name
+        if shard_by == 'group':
+            # Stack names may only contain letters, digits and '-'
+            safe = ''.join(c if c.isalnum() else '-' for c in user['group']).strip('-').lower()
+            return f"{stack_name}-{safe}"
+        bucket = int(hashlib.sha256(user['name'].encode('utf-8')).hexdigest()[:8], 16) % shards
+        return f"{stack_name}-users-{bucket:02d}"
+
+    def build_templates(self, stack_name):
+        """
+        Turns the Simple Spec into CloudFormation templates.
+        Returns {stack name: template}.
 
-        # 2. Add Groups
+        With one shard (the default) there is a single stack holding groups and
+        users, exactly like before. With more shards, the groups live in
+        'stack_name' and users are split into sibling stacks, so that:
+        - no template hits CloudFormation's 500 resources / 200 outputs limits,
+        - a change to one user only updates the (small) stack that holds them.
+        """
+        def new_template(description):
+            return {
+                "AWSTemplateFormatVersion": "2010-09-09",
+                "Description": description,
+                "Resources": {},
+                "Outputs": {}
+            }
+
+        templates = {stack_name: new_template("Generated by AWS Easy Manager")}
+        sharded = any(self._user_stack(stack_name, u) != stack_name for u in self.spec['users'])
+
+        # 1. Add Groups
         # We need a map to specific AWS ARNs for common permissions
         PERMISSION_MAP = {
             'S3FullAccess': 'arn:aws:iam::aws:policy/AmazonS3FullAccess',
@@ -47,7 +222,7 @@ class EasyIAMManager:
                     print(f"WARNING: Unknown permission '{perm}'. Skipping.")
 
             # Create Group Resource
-            template['Resources'][f"Group{group_name}"] = {
+            templates[stack_name]['Resources'][f"Group{group_name}"] = {
                 "Type": "AWS::IAM::Group",
                 "Properties": {
                     "GroupName": group_name,
@@ -55,127 +230,489 @@ class EasyIAMManager:
                 }
             }
 
-        # 3. Add Users
+        # 2. Add Users
         for user in self.spec['users']:
             user_name = user['name']
             group_name = user['group']
-            
+            target = self._user_stack(stack_name, user)
+            if target not in templates:
+                templates[target] = new_template(f"Generated by AWS Easy Manager (users shard of {stack_name})")
+                # One shared output per shard (the link is the same for every user)
+                templates[target]['Outputs']["ConsoleLink"] = {
+                    "Description": "Console login link",
+                    "Value": { "Fn::Sub": "https://${AWS::AccountId}.signin.aws.amazon.com/console" }
+                }
+
+            # In a shard, the group lives in another stack, so we use its name instead of a Ref
+            groups = [group_name] if target != stack_name else [{"Ref": f"Group{group_name}"}]
+
             # Create User Resource
-            template['Resources'][f"User{user_name}"] = {
+            templates[target]['Resources'][f"User{user_name}"] = {
                 "Type": "AWS::IAM::User",
                 "Properties": {
                     "UserName": user_name,
-                    "Groups": [{"Ref": f"Group{group_name}"}],
+                    "Groups": groups,
                     "ManagedPolicyArns": [
                         "arn:aws:iam::aws:policy/IAMUserChangePassword"
                     ]
                 }
             }
 
-            # Add Output for Login URL
-            template['Outputs'][f"{user_name}ConsoleLink"] = {
-                "Description": f"Login link for {user_name}",
-                "Value": { "Fn::Sub": f"https://${{AWS::AccountId}}.signin.aws.amazon.com/console" }
-            }
+            # Add Output for Login URL (single-stack mode only, as before)
+            if not sharded:
+                templates[target]['Outputs'][f"{user_name}ConsoleLink"] = {
+                    "Description": f"Login link for {user_name}",
+                    "Value": { "Fn::Sub": f"https://${{AWS::AccountId}}.signin.aws.amazon.com/console" }
+                }
 
-        # 4. Write to File
-        with open(output_path, 'w') as f:
-            # Check if file exists to avoid overwrite error if we were appending (we are writing fresh)
-            pass 
-        
-        # We use a custom dumper logic or a library to write clean YAML
-        # But standard yaml.dump is sufficient for CloudFormation
-        with open(output_path, 'w') as f:
-            yaml.dump(template, f, default_flow_style=False)
-        
-        print(f"Success: Generated {output_path}")
+        # 3. Check CloudFormation's hard limits
+        for name, template in templates.items():
+            if len(template['Resources']) > MAX_TEMPLATE_RESOURCES or len(template['Outputs']) > MAX_TEMPLATE_OUTPUTS:
+                print(f"WARNING: Stack {name} has {len(template['Resources'])} resources and "
+                      f"{len(template['Outputs'])} outputs (limits: {MAX_TEMPLATE_RESOURCES}/{MAX_TEMPLATE_OUTPUTS}). "
+                      f"Increase 'shards' in the spec config.")
+        return templates
+
+    @staticmethod
+    def template_path_for(output_path, base_stack, stack_name):
+        # infrastructure/iam_generated.yaml -> infrastructure/iam_generated.users-03.yaml
+        if stack_name == base_stack:
+            return output_path
+        root, ext = os.path.splitext(output_path)
+        return f"{root}.{stack_name[len(base_stack) + 1:]}{ext}"
+
+    def generate_cloudformation(self, output_path, stack_name='easy-iam-stack'):
+        """
+        Reads the Simple Spec and writes the CloudFormation file(s).
+        Returns {stack name: file path}.
+        """
+        print(f"Generating CloudFormation from {self.spec_path}...")
+        if stack_name not in self._templates:
+            self._templates[stack_name] = self.build_templates(stack_name)
+        paths = {}
+        for name, template in self._templates[stack_name].items():
+            path = self.template_path_for(output_path, stack_name, name)
+            # We use a custom dumper logic or a library to write clean YAML
+            # But standard yaml.dump is sufficient for CloudFormation
+            with open(path, 'w') as f:
+                yaml.dump(template, f, default_flow_style=False)
+            paths[name] = path
+            print(f"Success: Generated {path}")
+        return paths
+
+    def deploy_stacks(self, stack_manager, paths, plan, max_parallel=5):
+        """
+        Deploys the generated stacks, only touching the ones that changed.
+
+        Order matters:
+        1. The groups stack (users refer to the groups by name).
+        2. Every other stack that changed, WITHOUT the users moving into it. This
+           deletes the moving users from the stacks they leave.
+        3. The stacks that receive users, now with them (a user must be gone
+           from its old stack before CloudFormation can create it again).
+        Inside each step, stacks are deployed in parallel.
+        Returns True if every deployed stack ended up healthy.
+        """
+        base = plan.base_stack
+        changed = [name for name in paths if name in plan.changed_stacks]
+        incoming = {}
+        for user, target in plan.moved_users.items():
+            incoming.setdefault(target, []).append(user)
+        losing = set(plan.moved_from.values())
+
+        def without_incoming(name):
+            # The final template minus the users that move into this stack
+            template = json.loads(json.dumps(self._templates[base][name]))
+            for user in incoming[name]:
+                template['Resources'].pop(f"User{user}", None)
+                template['Outputs'].pop(f"{user}ConsoleLink", None)
+            if not template['Resources']:
+                # A stack needs at least one resource: a handle that creates nothing
+                template['Resources']['Placeholder'] = {"Type": "AWS::CloudFormation::WaitConditionHandle"}
+            root, ext = os.path.splitext(paths[name])
+            path = f"{root}.before-move{ext}"
+            with open(path, 'w') as f:
+                yaml.dump(template, f, default_flow_style=False)
+            return path
+
+        # (stack, template file) per phase; a stack that only receives users waits for phase 3
+        phases = [[], [], []]
+        for name in changed:
+            if name in incoming:
+                if name == base or name in losing:
+                    phases[0 if name == base else 1].append((name, without_incoming(name)))
+                phases[2].append((name, paths[name]))
+            else:
+                phases[0 if name == base else 1].append((name, paths[name]))
+
+        def deploy(item):
+            name, path = item
+            if not stack_manager.deploy(name, path):
+                return name, 'FAILED'
+            return name, stack_manager.stack_exists(name)
+
+        ok = True
+        with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+            # Shards that are no longer needed go first (their users are deleted)
+            list(pool.map(stack_manager.destroy, plan.removed_stacks))
+            for phase in phases:
+                for name, status in pool.map(deploy, phase):
+                    if status not in ('CREATE_COMPLETE', 'UPDATE_COMPLETE'):
+                        print(f"Stack {name} is {status}.")
+                        ok = False
+                if not ok:
+                    break
+        return ok
+
+    # --- PART 2: The Planner (Only apply what changed) ---
+    def spec_state(self, stack_name='easy-iam-stack'):
+        """
+        The parts of the spec that matter, in a form we can save and compare.
+        Each generated stack gets its own hash, so we can tell exactly which
+        stacks need an update (an email change, for example, needs none).
+        """
+        groups = {g['name']: {'permissions': sorted(g.get('permissions', []))} for g in self.spec['groups']}
+        users = {u['name']: {'group': u['group'], 'email': u.get('email')} for u in self.spec['users']}
+        if stack_name not in self._templates:
+            self._templates[stack_name] = self.build_templates(stack_name)
+        stacks = {name: _hash(template) for name, template in self._templates[stack_name].items()}
+        return {
+            'spec_hash': _hash({'groups': groups, 'users': users}),
+            'template_hash': _hash(stacks),
+            'stacks': stacks,
+            'user_stacks': {u['name']: self._user_stack(stack_name, u) for u in self.spec['users']},
+            'groups': groups,
+            'users': users,
+        }
+
+    @staticmethod
+    def state_path_for(generated_path):
+        # The state lives next to the generated template, e.g. infrastructure/iam_generated.state.json
+        return os.path.splitext(generated_path)[0] + '.state.json'
+
+    @staticmethod
+    def load_state(path):
+        """
+        Reads what we applied last time (or None if we never applied).
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
 
-    # --- PART 2: The Onboarder (Simplifies Password Management) ---
-    def onboard_users(self):
+    def save_state(self, path, stack_name='easy-iam-stack', unfinished=()):
         """
-        Sets passwords for new users and prints "Welcome Emails".
+        Saves what was applied. 'unfinished' users (no password or no email yet)
+        are left out, so the next plan lists them as added and tries them again.
+        They are also listed under 'unfinished': only those may get their
+        welcome email again (see onboard_users).
+        """
+        state = self.spec_state(stack_name)
+        for name in unfinished:
+            state['users'].pop(name, None)
+        state['unfinished'] = sorted(unfinished)
+        state['applied_at'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        with open(path, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+
+    def plan(self, previous_state, stack_name='easy-iam-stack', reshard=False):
+        """
+        Compares the spec with the last applied state and returns a SpecPlan.
+        With no previous state, everything counts as 'added'.
+
+        Users stay in the stack they were deployed in. Moving one makes
+        CloudFormation delete and re-create the IAM user (new password, no
+        access keys, no MFA), so it only happens when its group changes with
+        'shard_by: group', or for everyone with reshard=True.
+        """
+        previous = previous_state or {'groups': {}, 'users': {}, 'template_hash': None}
+        # (Older state files have no placements: every user was in the main stack.)
+        saved = previous.get('user_stacks') or {name: stack_name for name in previous['users']}
+        self.placements = {} if reshard else dict(saved)
+        self._templates.pop(stack_name, None)
+        current = self.spec_state(stack_name)
+        plan = SpecPlan()
+        plan.base_stack = stack_name
+
+        for kind, added, removed, changed in [('groups', plan.added_groups, plan.removed_groups, plan.changed_groups),
+                                              ('users', plan.added_users, plan.removed_users, plan.changed_users)]:
+            old, new = previous[kind], current[kind]
+            added.extend(sorted(set(new) - set(old)))
+            removed.extend(sorted(set(old) - set(new)))
+            for name in sorted(set(new) & set(old)):
+                if old[name] != new[name]:
+                    changed.append(name)
+                    diffs = [f"{k}: {old[name].get(k)} -> {new[name].get(k)}"
+                             for k in new[name] if old[name].get(k) != new[name].get(k)]
+                    plan.changes[name] = ", ".join(diffs)
+
+        # Which stacks changed? (Older state files have no per-stack hashes: everything changed.)
+        old_stacks = previous.get('stacks', {})
+        plan.changed_stacks = [name for name, h in current['stacks'].items() if old_stacks.get(name) != h]
+        plan.removed_stacks = [name for name in old_stacks if name not in current['stacks']]
+
+        # Users that move to another stack
+        plan.moved_users = {name: new for name, new in current['user_stacks'].items()
+                            if name in saved and saved[name] != new}
+        plan.moved_from = {name: saved[name] for name in plan.moved_users}
+
+        plan.template_changed = bool(plan.changed_stacks or plan.removed_stacks)
+        return plan
+
+    # --- PART 3: The Snapshot (Reads the whole account in a few calls) ---
+    def load_snapshot(self):
+        """
+        Reads users, groups and attached policies with ONE paginated
+        'get_account_authorization_details', then finds out who has a password
+        from the IAM credential report. Only if the report is not available are
+        users checked one by one (in parallel, under IAM's rate limit).
+        """
+        print("Reading IAM state (bulk snapshot)...")
+        snapshot = IAMSnapshot()
+
+        try:
+            paginator = self.iam.get_paginator('get_account_authorization_details')
+            for page in paginator.paginate(Filter=['User', 'Group']):
+                for u in page.get('UserDetailList', []):
+                    snapshot.users[u['UserName']] = {
+                        'groups': u.get('GroupList', []),
+                        'policies': [p['PolicyArn'] for p in u.get('AttachedManagedPolicies', [])],
+                        'created': u.get('CreateDate'),
+                        'has_login_profile': None,
+                    }
+                for g in page.get('GroupDetailList', []):
+                    snapshot.groups[g['GroupName']] = {
+                        'policies': [p['PolicyArn'] for p in g.get('AttachedManagedPolicies', [])],
+                    }
+        except ClientError as e:
+            print(f"Note: Bulk IAM snapshot not available ({e.response['Error']['Code']}). Falling back to per-user lookups.")
+            return None
+
+        # Who already has a password? The credential report answers for everyone at once.
+        # If it isn't available, check the users from the spec one by one (in parallel),
+        # and so for the users the report can't answer for (re-created since it was made).
+        wanted = [u['name'] for u in self.spec['users'] if u['name'] in snapshot.users]
+        if self._apply_credential_report(snapshot):
+            wanted = [name for name in wanted if snapshot.users[name]['has_login_profile'] is None]
+        for name, has_profile in self._lookup_login_profiles(wanted).items():
+            snapshot.users[name]['has_login_profile'] = has_profile
+        checked = len(wanted)
+
+        print(f"Snapshot: {len(snapshot.users)} users, {len(snapshot.groups)} groups "
+              f"({checked} checked individually).")
+        self.snapshot = snapshot
+        return snapshot
+
+    def _apply_credential_report(self, snapshot):
+        """
+        Fills 'has_login_profile' for every user from the IAM credential report.
+        Returns False if the report isn't available.
+
+        IAM reuses a report for up to 4 hours, so only a 'true' for the same user
+        (its 'user_creation_time' matches the user's CreateDate) is trusted.
+        Everything else stays None (unknown) and the caller checks those users
+        on their own:
+        - a user missing from the report (created since), or listed as 'false',
+          may have been given a password since the report was made;
+        - a user deleted and created again since then (e.g. moved to another
+          stack) is listed with the OLD user's password.
+        """
+        try:
+            # Ask IAM to build the report (it reuses a recent one if it has it)
+            for _ in range(40):
+                if self.iam.generate_credential_report()['State'] == 'COMPLETE':
+                    break
+                time.sleep(0.5)
+            report = self.iam.get_credential_report()
+        except ClientError as e:
+            print(f"Note: Credential report not available ({e.response['Error']['Code']}).")
+            return False
+
+        for row in csv.DictReader(io.StringIO(report['Content'].decode('utf-8'))):
+            user = snapshot.users.get(row['user'])
+            if user is None:
+                continue
+            if row.get('password_enabled') == 'true' and _same_second(row.get('user_creation_time'), user.get('created')):
+                user['has_login_profile'] = True
+        return True
+
+    def _lookup_login_profiles(self, user_names):
+        """
+        Checks many users' login profiles at the same time, without going
+        over IAM_CALLS_PER_SECOND. Returns {user name: True/False/None}.
+        """
+        bucket = TokenBucket(IAM_CALLS_PER_SECOND)
+
+        def check(user_name):
+            bucket.acquire()
+            return user_name, self._user_has_login_profile(user_name)
+
+        with ThreadPoolExecutor(max_workers=IAM_LOOKUP_THREADS) as pool:
+            return dict(pool.map(check, user_names))
+
+    # --- PART 4: The Onboarder (Simplifies Password Management) ---
+    def onboard_users(self, user_names=None, report_path=None, retry=()):
+        """
+        Sets passwords for new users and sends their "Welcome Emails" in bulk.
+
+        Args:
+            user_names: Only onboard these users (e.g. the ones a plan added).
+                        None means everyone in the spec.
+            report_path: Where to save the email delivery report (CSV), if anywhere.
+            retry: Users the last run left unfinished (see save_state). One of
+                   them who already has a password but never signed in (we set
+                   it, the email failed) gets the email again.
+
+        Returns the names of the users that did not get a password and an email,
+        so the next apply can try them again.
         """
         print("\n--- ONBOARDING REPORT ---")
         
+        targets = [u for u in self.spec['users'] if user_names is None or u['name'] in user_names]
+        if not targets:
+            print("No new users to onboard.")
+            return []
+
         default_password = self.spec['config']['default_password']
         account_id = self.session.client('sts').get_caller_identity()['Account']
+        login_url = f"https://{account_id}.signin.aws.amazon.com/console"
 
-        for user in self.spec['users']:
+        # 1. Find out who already exists / has a password (a few bulk calls)
+        snapshot = self.snapshot or self.load_snapshot()
+        if snapshot is None:
+            # No permission for the bulk calls: check every user (in parallel)
+            profiles = self._lookup_login_profiles([u['name'] for u in targets])
+
+        welcome = []  # (email, template values) for everyone who got a new password
+        failed = []
+        for user in targets:
             user_name = user['name']
             email = user.get('email', 'N/A')
-            
+
+            if snapshot is not None:
+                if not snapshot.has_user(user_name):
+                    # The stack probably failed to create this user
+                    print(f"[SKIP] User {user_name} does not exist in IAM yet.")
+                    failed.append(user_name)
+                    continue
+                has_password = snapshot.has_login_profile(user_name)
+            else:
+                has_password = profiles[user_name]
+
             # Check if user needs a password
-            if not self._user_has_login_profile(user_name):
-                print(f"[*] Setting initial password for {user_name}...")
-                self._create_login_profile(user_name, default_password)
+            resend = has_password and user_name in retry and self._never_signed_in(user_name)
+            if has_password is False or resend:
+                if resend:
+                    print(f"[*] {user_name} never logged in with their password: sending the email again.")
+                else:
+                    print(f"[*] Setting initial password for {user_name}...")
+                    created = self._create_login_profile(user_name, default_password)
+                    if created is None:
+                        print(f"[OK] User {user_name} already has a password.")
+                        continue
+                    if not created:
+                        failed.append(user_name)
+                        continue
                 
                 # Print Welcome Kit (Backup)
                 print(f"\n[EMAIL CONTENT FOR {user_name}]")
                 print("-" * 40)
                 print(f"TO: {email}")
-                print(f"Login URL: https://{account_id}.signin.aws.amazon.com/console")
+                print(f"Login URL: {login_url}")
                 print(f"Username: {user_name}")
                 print(f"Password: {default_password}")
                 print("-" * 40)
 
-                # Send Real Email via SES
-                self._send_welcome_email(user_name, email, default_password, account_id)
+                if email != 'N/A':
+                    welcome.append((email, {'user_name': user_name, 'login_url': login_url,
+                                            'password': default_password}))
 
-            else:
+            elif has_password:
                 print(f"[OK] User {user_name} already has a password.")
+            else:
+                print(f"[SKIP] Could not check the password status of {user_name}.")
+                failed.append(user_name)
+
+        # 2. Send Real Emails (SES bulk templates, or a local SMTP server when testing)
+        if welcome:
+            report = self._send_welcome_emails(welcome)
+            if report is None:
+                failed.extend(data['user_name'] for _, data in welcome)
+            else:
+                failed.extend(d.data['user_name'] for d in report.failed)
+                if report_path:
+                    report.save(report_path)
+        return failed
 
-    def _send_welcome_email(self, user_name, email, password, account_id):
+    def _mailer(self):
         """
-        Sends the credentials via AWS SES.
+        SES by default. Set 'smtp: localhost:1025' in the spec config (or the
+        AWS_PLAYGROUND_SMTP variable) to send to a local test SMTP server instead.
+        'max_send_rate' caps the emails per second (default: the account's SES quota).
         """
-        ses = self.session.client('ses')
-        SENDER = "sean.girgis@gmail.com" # Must be verified in SES
-        
-        try:
-            print(f"[*] Sending email to {email}...")
-            ses.send_email(
-                Source=SENDER,
-                Destination={'ToAddresses': [email]},
-                Message={
-                    'Subject': {'Data': "Welcome to AWS - Your Credentials"},
-                    'Body': {
-                        'Text': {
-                            'Data': f"""
-Hello {user_name},
-
-Your AWS account has been created.
+        config = self.spec.get('config', {})
+        sender = config.get('sender', DEFAULT_SENDER)
+        smtp = os.environ.get('AWS_PLAYGROUND_SMTP') or config.get('smtp')
+        if smtp:
+            host, _, port = smtp.partition(':')
+            return SmtpMailer(host, port or 25, sender)
+        return SesBulkMailer(self.session, sender, max_send_rate=config.get('max_send_rate'))
 
-Login URL: https://{account_id}.signin.aws.amazon.com/console
-Username: {user_name}
-Password: {password}
-
-Please change this password immediately upon login.
-                            """
-                        }
-                    }
-                }
-            )
-            print(f"[SUCCESS] Email sent to {email}")
+    def _send_welcome_emails(self, recipients):
+        """
+        Sends the credentials to everyone at once (50 per SES call, paced to
+        the account's send rate). Returns the DeliveryReport, or None if SES refused.
+        """
+        mailer = self._mailer()
+        print(f"\n[*] Sending {len(recipients)} welcome emails...")
+        try:
+            mailer.ensure_template(WELCOME_TEMPLATE, WELCOME_SUBJECT, WELCOME_TEXT)
+            report = mailer.send(WELCOME_TEMPLATE, recipients)
         except ClientError as e:
-            print(f"[ERROR] Could not send email: {e}")
-            print(f"Tip: In Sandbox mode, both '{SENDER}' AND '{email}' must be verified.")
+            print(f"[ERROR] Could not send emails: {e}")
+            return None
+        report.print_summary()
+        if report.failed:
+            print(f"Tip: In Sandbox mode, both '{mailer.sender}' AND every recipient must be verified.")
+        return report
 
     def _user_has_login_profile(self, user_name):
+        """
+        Returns True (has a password), False (no password) or None (can't tell).
+        """
         try:
             self.iam.get_login_profile(UserName=user_name)
             return True
         except ClientError as e:
-            if "NoSuchEntity" in str(e):
-                return False # User exists but no password
-            # If user doesn't exist at all yet (maybe stack failed), return True to skip
-            return True 
+            if e.response['Error']['Code'] == 'NoSuchEntity':
+                return False # No password (or no user - the create call will tell us)
+            # Anything else (access denied, throttling...): we can't tell, so we skip the user
+            return None
+
+    def _never_signed_in(self, user_name):
+        """
+        True if the user never signed in with a password (so the initial
+        password from the spec is still the one that works).
+        """
+        try:
+            user = self.iam.get_user(UserName=user_name)['User']
+        except ClientError:
+            return False
+        return 'PasswordLastUsed' not in user
 
     def _create_login_profile(self, user_name, password):
+        """
+        Returns True (password set), False (error) or None (the user already had one).
+        """
         try:
             self.iam.create_login_profile(
                 UserName=user_name,
                 Password=password,
                 PasswordResetRequired=True
             )
+            return True
         except ClientError as e:
+            if e.response['Error']['Code'] == 'EntityAlreadyExists':
+                return None
             print(f"Error setting password for {user_name}: {e}")
+            return False
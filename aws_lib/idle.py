@@ -0,0 +1,231 @@
+"""
+Idle Resource Detector
+The resource audit lists every running instance and database, busy or not.
+This module asks CloudWatch how much each one was actually used and keeps only
+the ones that look idle:
+
+1. For every candidate we want a few metrics (CPU, network, connections).
+2. 'get_metric_data' fetches up to 500 metrics per call, so even hundreds of
+   resources need only a handful of calls (run in parallel).
+3. NumPy turns the answers into one table per metric (resources x hours) and
+   computes the 95th percentile of every row at once.
+4. A resource is idle when its p95 stays under all the thresholds below, i.e.
+   even its busiest hours were quiet.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from aws_lib.inventory import INSTANCE, DB_INSTANCE, NAT_GATEWAY
+
+# CloudWatch limit per get_metric_data call
+MAX_METRICS_PER_CALL = 500
+METRIC_THREADS = 8
+
+# One data point per hour
+PERIOD_SECONDS = 3600
+HOURS_PER_MONTH = 730
+
+# What we measure per resource type: (name, namespace, metric, dimension, statistic, idle when p95 below)
+METRICS = {
+    INSTANCE: [
+        ('cpu', 'AWS/EC2', 'CPUUtilization', 'InstanceId', 'Average', 5.0),             # percent
+        ('network', 'AWS/EC2', 'NetworkIn', 'InstanceId', 'Sum', 5 * 1024 ** 2),          # bytes per hour
+        ('network_out', 'AWS/EC2', 'NetworkOut', 'InstanceId', 'Sum', 5 * 1024 ** 2),
+    ],
+    DB_INSTANCE: [
+        ('cpu', 'AWS/RDS', 'CPUUtilization', 'DBInstanceIdentifier', 'Average', 5.0),
+        ('connections', 'AWS/RDS', 'DatabaseConnections', 'DBInstanceIdentifier', 'Maximum', 1.0),
+    ],
+    NAT_GATEWAY: [
+        ('network', 'AWS/NATGateway', 'BytesOutToDestination', 'NatGatewayId', 'Sum', 1024 ** 2),
+        ('connections', 'AWS/NATGateway', 'ActiveConnectionCount', 'NatGatewayId', 'Maximum', 1.0),
+    ],
+}
+
+# Rough on-demand prices (USD per hour, us-east-1, Linux) for the wasted-spend estimate,
+# used when the local price catalog (aws_lib/pricing.py) has no price for a resource
+HOURLY_PRICES = {
+    NAT_GATEWAY: 0.045,
+    't3.nano': 0.0052, 't3.micro': 0.0104, 't3.small': 0.0208, 't3.medium': 0.0416,
+    't3.large': 0.0832, 't3.xlarge': 0.1664, 't3.2xlarge': 0.3328,
+    'm5.large': 0.096, 'm5.xlarge': 0.192, 'm5.2xlarge': 0.384, 'm5.4xlarge': 0.768,
+    'c5.large': 0.085, 'c5.xlarge': 0.17, 'c5.2xlarge': 0.34,
+    'r5.large': 0.126, 'r5.xlarge': 0.252,
+    'db.t3.micro': 0.017, 'db.t3.small': 0.034, 'db.t3.medium': 0.068,
+    'db.m5.large': 0.171, 'db.m5.xlarge': 0.342, 'db.r5.large': 0.24,
+}
+
+
+def estimate_monthly_cost(resource, prices=None):
+    """
+    Approximate monthly cost of keeping a resource running, or None if unknown.
+    'prices' is an optional PriceCatalog, tried first.
+    """
+    if prices is not None:
+        monthly = prices.monthly_cost(resource)
+        if monthly is not None:
+            return monthly
+    if resource['type'] == NAT_GATEWAY:
+        hourly = HOURLY_PRICES[NAT_GATEWAY]
+    else:
+        details = resource.get('details') or {}
+        hourly = HOURLY_PRICES.get(details.get('instance_type') or details.get('db_class'))
+    return round(hourly * HOURS_PER_MONTH, 2) if hourly is not None else None
+
+
+class IdleFinding:
+    def __init__(self, resource, p95, monthly_cost):
+        self.resource = resource
+        self.p95 = p95                    # metric name -> p95 value
+        self.monthly_cost = monthly_cost  # None if we don't know the price
+
+
+class IdleDetector:
+    """
+    Usage:
+        detector = IdleDetector(session, days=14)
+        findings = detector.find_idle(resources)   # resources from the Inventory
+        detector.print_report(findings)
+    """
+
+    def __init__(self, session, days=14, prices=None):
+        self.session = session
+        self.days = days
+        self.prices = prices  # Optional PriceCatalog for the wasted-spend estimate
+        self.end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        self.start = self.end - timedelta(days=days)
+        self.no_data = []  # Resources CloudWatch had nothing for (too new, or stopped)
+
+    def _queries(self, resources):
+        """
+        One MetricDataQuery per (resource, metric), grouped by region.
+        Returns {region: [(query id, resource index, metric name, query)]}.
+        """
+        by_region = defaultdict(list)
+        for index, resource in enumerate(resources):
+            for name, namespace, metric, dimension, stat, _ in METRICS.get(resource['type'], []):
+                query_id = f"m{index}_{name}"  # Ids must start with a lower-case letter
+                by_region[resource['region']].append((query_id, index, name, {
+                    'Id': query_id,
+                    'MetricStat': {
+                        'Metric': {'Namespace': namespace, 'MetricName': metric,
+                                   'Dimensions': [{'Name': dimension, 'Value': resource['resource_id']}]},
+                        'Period': PERIOD_SECONDS,
+                        'Stat': stat,
+                    },
+                    'ReturnData': True,
+                }))
+        return by_region
+
+    def _fetch(self, region, batch):
+        """
+        One get_metric_data request (plus its pages) for up to 500 metrics.
+        Returns {query id: (timestamps, values)}.
+        """
+        cloudwatch = self.session.client('cloudwatch', region_name=region)
+        series = defaultdict(lambda: ([], []))
+        paginator = cloudwatch.get_paginator('get_metric_data')
+        for page in paginator.paginate(MetricDataQueries=[q for _, _, _, q in batch],
+                                       StartTime=self.start, EndTime=self.end):
+            for result in page['MetricDataResults']:
+                timestamps, values = series[result['Id']]
+                timestamps += result['Timestamps']
+                values += result['Values']
+        return series
+
+    def fetch_p95(self, resources):
+        """
+        Returns {metric name: array of p95 values, one per resource (NaN = no data)}.
+        """
+        jobs = []
+        for region, queries in self._queries(resources).items():
+            for start in range(0, len(queries), MAX_METRICS_PER_CALL):
+                jobs.append((region, queries[start:start + MAX_METRICS_PER_CALL]))
+
+        with ThreadPoolExecutor(max_workers=METRIC_THREADS) as pool:
+            results = list(pool.map(lambda job: (job[1], self._fetch(*job)), jobs))
+
+        # One table per metric: a row per resource, a column per hour (NaN where there's no point)
+        hours = int((self.end - self.start).total_seconds() // PERIOD_SECONDS)
+        start_ts = self.start.timestamp()
+        names = {name for specs in METRICS.values() for name, *_ in specs}
+        tables = {name: np.full((len(resources), hours), np.nan) for name in names}
+        for batch, series in results:
+            for query_id, index, name, _ in batch:
+                timestamps, values = series.get(query_id, ([], []))
+                if not values:
+                    continue
+                columns = ((np.array([t.timestamp() for t in timestamps]) - start_ts) // PERIOD_SECONDS).astype(int)
+                keep = (columns >= 0) & (columns < hours)
+                tables[name][index, columns[keep]] = np.array(values)[keep]
+
+        p95 = {}
+        for name, table in tables.items():
+            has_data = ~np.isnan(table).all(axis=1)
+            p95[name] = np.full(len(resources), np.nan)
+            if has_data.any():
+                p95[name][has_data] = np.nanpercentile(table[has_data], 95, axis=1)
+        return p95
+
+    def find_idle(self, resources):
+        """
+        Returns an IdleFinding for every resource whose metrics all stayed under
+        the idle thresholds, most expensive first.
+        """
+        resources = [r for r in resources if r['type'] in METRICS]
+        if not resources:
+            return []
+        p95 = self.fetch_p95(resources)
+
+        findings = []
+        self.no_data = []
+        for resource_type, specs in METRICS.items():
+            rows = np.array([r['type'] == resource_type for r in resources])
+            if not rows.any():
+                continue
+            # Vectorized over every resource of this type at once
+            values = np.column_stack([p95[name][rows] for name, *_ in specs])
+            thresholds = np.array([spec[-1] for spec in specs])
+            measured = ~np.isnan(values).all(axis=1)
+            idle = measured & np.all(np.isnan(values) | (values < thresholds), axis=1)
+            for resource, value_row, is_idle, has_data in zip(
+                    [r for r in resources if r['type'] == resource_type], values, idle, measured):
+                if not has_data:
+                    self.no_data.append(resource)
+                elif is_idle:
+                    findings.append(IdleFinding(
+                        resource, {name: float(v) for (name, *_), v in zip(specs, value_row)},
+                        estimate_monthly_cost(resource, self.prices)))
+
+        findings.sort(key=lambda f: -(f.monthly_cost or 0))
+        return findings
+
+    def print_report(self, findings, candidates):
+        print(f"\n--- Idle Resources (p95 over the last {self.days} days) ---")
+        print(f"Checked {candidates} resources: {len(findings)} look idle, {len(self.no_data)} had no metrics.")
+        if not findings:
+            print("OK: Nothing looks idle.")
+            return
+        print(f"{'Resource':<28} {'Type':<22} {'Region':<14} {'CPU p95':>8} {'Net p95/h':>10} {'Conn p95':>8} {'$/month':>9}")
+        print("-" * 104)
+        for f in findings:
+            r = f.resource
+            cpu = f.p95.get('cpu')
+            network = np.nansum([f.p95.get('network', np.nan), f.p95.get('network_out', np.nan)])
+            connections = f.p95.get('connections')
+            print(f"{r['resource_id']:<28} {r['type'].split('::')[-1]:<22} {r['region']:<14} "
+                  f"{_fmt(cpu, '{:.1f}%'):>8} {_fmt(network / 1024 ** 2, '{:.2f}MB'):>10} "
+                  f"{_fmt(connections, '{:.0f}'):>8} {_fmt(f.monthly_cost, '{:.2f}'):>9}")
+        print("-" * 104)
+        total = sum(f.monthly_cost or 0 for f in findings)
+        unknown = sum(1 for f in findings if f.monthly_cost is None)
+        print(f"Estimated wasted spend: ${total:,.2f}/month" + (f" (+{unknown} resources with unknown price)" if unknown else ""))
+
+
+def _fmt(value, pattern):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return '-'
+    return pattern.format(value)
@@ -0,0 +1,521 @@
+"""
+Resource Inventory
+A local, searchable list of everything in the account (a SQLite file), so audits
+and cleanups can ask "which instances are running in eu-west-1?" in
+milliseconds instead of calling describe APIs service by service, region by region.
+
+Where the data comes from (best first):
+1. AWS Config ('config'): every resource with its state. After the first run we
+   only ask for items that changed since the last refresh (plus a short list of
+   what still exists, to drop deleted ones). Regions where Config isn't
+   recording are read with describe calls.
+2. AWS Resource Explorer ('resource-explorer'): every resource and its tags,
+   but no state (running/stopped). We only rewrite rows that changed.
+3. Describe calls ('describe'): the classic per-service calls, for the resource
+   types our audits need. Skipped when that region/type was read recently.
+
+The index lives in ~/.aws_playground/inventory/<profile>.sqlite.
+"""
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+from aws_lib.core import get_cache_dir
+
+# The resource types our audits look at (CloudFormation type names are used everywhere)
+INSTANCE = 'AWS::EC2::Instance'
+VOLUME = 'AWS::EC2::Volume'
+NAT_GATEWAY = 'AWS::EC2::NatGateway'
+DB_INSTANCE = 'AWS::RDS::DBInstance'
+LAMBDA_FUNCTION = 'AWS::Lambda::Function'
+
+# Describe results older than this are read again (seconds)
+DEFAULT_MAX_AGE = 300
+
+# How long we remember whether AWS Config / Resource Explorer are set up (seconds)
+PROBE_MAX_AGE = 3600
+
+REGION_THREADS = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    arn           TEXT PRIMARY KEY,
+    type          TEXT NOT NULL,
+    region        TEXT,
+    resource_id   TEXT,
+    name          TEXT,
+    state         TEXT,
+    details       TEXT,   -- JSON: instance type, size, runtime...
+    last_modified TEXT,
+    source        TEXT,
+    synced_at     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_resources_type ON resources(type);
+CREATE INDEX IF NOT EXISTS idx_resources_region ON resources(region);
+CREATE INDEX IF NOT EXISTS idx_resources_state ON resources(state);
+
+CREATE TABLE IF NOT EXISTS tags (
+    arn   TEXT NOT NULL,
+    key   TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (arn, key)
+);
+CREATE INDEX IF NOT EXISTS idx_tags_key_value ON tags(key, value);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    source    TEXT NOT NULL,
+    scope     TEXT NOT NULL,   -- region, or region/type for describe calls
+    cursor    TEXT,            -- newest change we have seen (Config)
+    synced_at REAL,
+    PRIMARY KEY (source, scope)
+);
+"""
+
+# What we ask AWS Config for. 'configuration.state' is an object for instances
+# ({'name': 'running'}) and a plain string for volumes and NAT gateways.
+CONFIG_QUERY = (
+    "SELECT arn, resourceId, resourceName, resourceType, awsRegion, tags, "
+    "configurationItemCaptureTime, configurationItemStatus, "
+    "configuration.state, configuration.instanceType, configuration.size, "
+    "configuration.dBInstanceStatus, configuration.dBInstanceClass, configuration.engine, "
+    "configuration.volumeType, configuration.runtime"
+)
+# Just enough to know what exists (to find deleted resources)
+CONFIG_KEYS_QUERY = "SELECT arn, resourceId, resourceType"
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _config_arn(item):
+    # A few resource types have no ARN in AWS Config
+    return item.get('arn') or f"{item['resourceType']}/{item['resourceId']}"
+
+
+def _tags(tag_list):
+    # AWS returns tags as [{'Key': 'a', 'Value': 'b'}] (sometimes lower-case keys)
+    return {t.get('Key', t.get('key')): t.get('Value', t.get('value')) for t in tag_list or []}
+
+
+class Inventory:
+    """
+    Usage:
+        inventory = Inventory(session)
+        inventory.refresh()                              # cheap after the first time
+        inventory.query(type=INSTANCE, state='running')  # list of dicts
+    """
+
+    def __init__(self, session, regions=None, db_path=None):
+        self.session = session
+        self.regions = regions or [session.region_name or 'us-east-1']
+        profile = getattr(session, 'profile_name', None) or 'default'
+        self.db_path = db_path or os.path.join(get_cache_dir('inventory'), f"{profile}.sqlite")
+        self.db = sqlite3.connect(self.db_path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        self._account_id = None
+
+    def close(self):
+        self.db.close()
+
+    # --- Reading the index ---
+
+    def query(self, type=None, region=None, state=None, tag=None):
+        """
+        Returns matching resources as dicts (with 'details' and 'tags' decoded).
+
+        Args:
+            state: a state ('running') or a list of states.
+            tag: 'Key' (has the tag) or ('Key', 'Value').
+        """
+        sql = "SELECT r.* FROM resources r"
+        where, params = [], []
+        if tag is not None:
+            key, value = (tag, None) if isinstance(tag, str) else tag
+            sql += " JOIN tags t ON t.arn = r.arn"
+            where.append("t.key = ?")
+            params.append(key)
+            if value is not None:
+                where.append("t.value = ?")
+                params.append(value)
+        if type is not None:
+            where.append("r.type = ?")
+            params.append(type)
+        if region is not None:
+            where.append("r.region = ?")
+            params.append(region)
+        if state is not None:
+            states = [state] if isinstance(state, str) else list(state)
+            where.append(f"r.state IN ({', '.join('?' * len(states))})")
+            params += states
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY r.region, r.type, r.resource_id"
+
+        rows = [dict(row) for row in self.db.execute(sql, params)]
+        for row in rows:
+            row['details'] = json.loads(row['details'] or '{}')
+            row['tags'] = {r['key']: r['value'] for r in
+                           self.db.execute("SELECT key, value FROM tags WHERE arn = ?", (row['arn'],))}
+        return rows
+
+    def summary(self):
+        """
+        Resource counts per (region, type).
+        """
+        return [tuple(row) for row in self.db.execute(
+            "SELECT region, type, COUNT(*) FROM resources GROUP BY region, type ORDER BY region, type")]
+
+    def last_synced(self):
+        """
+        When the index was last refreshed (UTC, as text), or None.
+        """
+        row = self.db.execute("SELECT MAX(synced_at) FROM sync_state WHERE source != 'probe'").fetchone()
+        if row[0] is None:
+            return None
+        return datetime.fromtimestamp(row[0], timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+
+    # --- Writing the index ---
+
+    def _upsert(self, records, source):
+        synced_at = _now()
+        with self.db:  # One transaction
+            for r in records:
+                self.db.execute(
+                    """INSERT INTO resources (arn, type, region, resource_id, name, state, details, last_modified, source, synced_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(arn) DO UPDATE SET
+                           type = excluded.type, region = excluded.region, resource_id = excluded.resource_id,
+                           last_modified = excluded.last_modified, source = excluded.source, synced_at = excluded.synced_at,
+                           -- Resource Explorer does not know these: keep the ones we had
+                           name = COALESCE(excluded.name, resources.name),
+                           state = COALESCE(excluded.state, resources.state),
+                           details = COALESCE(excluded.details, resources.details)""",
+                    (r['arn'], r['type'], r['region'], r.get('resource_id'), r.get('name'), r.get('state'),
+                     json.dumps(r['details']) if 'details' in r else None, r.get('last_modified'), source, synced_at))
+                if 'tags' in r:
+                    self.db.execute("DELETE FROM tags WHERE arn = ?", (r['arn'],))
+                    self.db.executemany("INSERT INTO tags (arn, key, value) VALUES (?, ?, ?)",
+                                        [(r['arn'], k, v) for k, v in r['tags'].items()])
+
+    def _delete(self, arns):
+        with self.db:
+            for arn in arns:
+                self.db.execute("DELETE FROM resources WHERE arn = ?", (arn,))
+                self.db.execute("DELETE FROM tags WHERE arn = ?", (arn,))
+
+    def _get_sync(self, source, scope):
+        row = self.db.execute("SELECT cursor, synced_at FROM sync_state WHERE source = ? AND scope = ?",
+                              (source, scope)).fetchone()
+        return (row['cursor'], row['synced_at']) if row else (None, None)
+
+    def _set_sync(self, source, scope, cursor=None):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO sync_state (source, scope, cursor, synced_at) VALUES (?, ?, ?, ?)",
+                            (source, scope, cursor, time.time()))
+
+    def refresh(self, source='auto', full=False, max_age=DEFAULT_MAX_AGE, aggregator=None):
+        """
+        Brings the index up to date.
+
+        Args:
+            source: 'auto', 'config', 'resource-explorer' or 'describe'.
+            full: Ignore what we already have and read everything again.
+            max_age: Describe results younger than this (seconds) are kept as they are.
+            aggregator: Name of an AWS Config aggregator (covers many accounts/regions at once).
+        Returns:
+            The source that was used.
+        """
+        aggregator = aggregator or os.environ.get('AWS_PLAYGROUND_CONFIG_AGGREGATOR')
+        if full:
+            max_age = 0
+
+        if source in ('auto', 'config') and aggregator:
+            self._sync_config(aggregator, full)
+            return 'config'
+        recording = [r for r in self.regions if self._config_enabled(r)] if source in ('auto', 'config') else []
+        if recording:
+            self._sync_config(None, full, recording)
+            others = [r for r in self.regions if r not in recording]
+            if others:
+                # Config only covers the regions where it records: read the rest directly
+                print(f"AWS Config is not recording in {', '.join(others)}; using describe calls there.")
+                self._sync_describe(max_age, others)
+            return 'config'
+        if source == 'config':
+            print("AWS Config is not recording here; using describe calls instead.")
+
+        if source in ('auto', 'resource-explorer') and self._resource_explorer_enabled():
+            self._sync_resource_explorer()
+            # Resource Explorer has no state: read the types our audits need directly
+            self._sync_describe(max_age)
+            return 'resource-explorer'
+        if source == 'resource-explorer':
+            print("Resource Explorer has no index here; using describe calls instead.")
+
+        self._sync_describe(max_age)
+        return 'describe'
+
+    def _probe(self, name, check):
+        """
+        Remembers the answer of an 'is this service set up?' check for a while,
+        so refreshing a fresh index doesn't cost any API calls.
+        """
+        answer, checked_at = self._get_sync('probe', name)
+        if checked_at is None or time.time() - checked_at >= PROBE_MAX_AGE:
+            answer = 'yes' if check() else 'no'
+            self._set_sync('probe', name, answer)
+        return answer == 'yes'
+
+    # --- Source 1: AWS Config ---
+
+    def _config_enabled(self, region):
+        return self._probe(f"config/{region}", lambda: self._check_config(region))
+
+    def _check_config(self, region):
+        try:
+            statuses = self.session.client('config', region_name=region) \
+                .describe_configuration_recorder_status()['ConfigurationRecordersStatus']
+            return any(s.get('recording') for s in statuses)
+        except ClientError:
+            return False
+
+    def _sync_config(self, aggregator, full, regions=None):
+        """
+        Advanced queries only return resources that exist now, never deleted ones.
+        So besides the changed items we list the keys (ARNs) of everything that
+        exists, and drop the rows of this scope that aren't among them.
+        """
+        scopes = [f"aggregator:{aggregator}"] if aggregator else regions or self.regions
+        # Read the cursors and our rows here: the SQLite connection belongs to this thread
+        cursors = {scope: self._get_sync('config', scope)[0] for scope in scopes}
+        known = {}
+        for scope in scopes:
+            # A region is covered completely (also rows left from describe calls); an aggregator only by its own rows
+            sql, params = ("SELECT arn FROM resources WHERE source = 'config'", ()) if aggregator \
+                else ("SELECT arn FROM resources WHERE region = ?", (scope,))
+            known[scope] = {row[0] for row in self.db.execute(sql, params)}
+
+        def select(scope, expression):
+            if aggregator:
+                client = self.session.client('config', region_name=self.regions[0])
+                pages = client.get_paginator('select_aggregate_resource_config').paginate(
+                    Expression=expression, ConfigurationAggregatorName=aggregator)
+            else:
+                client = self.session.client('config', region_name=scope)
+                pages = client.get_paginator('select_resource_config').paginate(Expression=expression)
+            return [json.loads(result) for page in pages for result in page['Results']]
+
+        def sync(scope):
+            cursor = cursors[scope]
+            if cursor and not full:
+                # Incremental: only what changed since the last refresh, plus the keys of what exists
+                items = select(scope, CONFIG_QUERY + f" WHERE configurationItemCaptureTime > '{cursor}'")
+                existing = {_config_arn(item) for item in select(scope, CONFIG_KEYS_QUERY)}
+            else:
+                items = select(scope, CONFIG_QUERY)
+                existing = {_config_arn(item) for item in items}
+            return scope, cursor, items, existing
+
+        with ThreadPoolExecutor(max_workers=REGION_THREADS) as pool:
+            results = list(pool.map(sync, scopes))
+
+        for scope, cursor, items, existing in results:
+            records = []
+            for item in items:
+                cursor = max(cursor or '', item.get('configurationItemCaptureTime', ''))
+                records.append(self._from_config(_config_arn(item), item))
+            deleted = known[scope] - existing
+            self._upsert(records, 'config')
+            self._delete(deleted)
+            self._set_sync('config', scope, cursor)
+            print(f"Inventory ({scope}): {len(records)} changed, {len(deleted)} deleted (AWS Config)")
+
+    @staticmethod
+    def _from_config(arn, item):
+        config = item.get('configuration') or {}
+        state = config.get('state') or config.get('dBInstanceStatus')
+        if isinstance(state, dict):
+            state = state.get('name')
+        if item['resourceType'] == LAMBDA_FUNCTION:
+            state = 'active'
+        details = {k: v for k, v in {
+            'instance_type': config.get('instanceType'),
+            'size_gb': config.get('size'),
+            'volume_type': config.get('volumeType'),
+            'db_class': config.get('dBInstanceClass'),
+            'engine': config.get('engine'),
+            'runtime': config.get('runtime'),
+        }.items() if v is not None}
+        return {
+            'arn': arn,
+            'type': item['resourceType'],
+            'region': item.get('awsRegion'),
+            'resource_id': item.get('resourceId'),
+            'name': item.get('resourceName'),
+            'state': state,
+            'details': details,
+            'tags': _tags(item.get('tags')),
+            'last_modified': item.get('configurationItemCaptureTime'),
+        }
+
+    # --- Source 2: Resource Explorer ---
+
+    def _resource_explorer_enabled(self):
+        return self._probe(f"resource-explorer/{self.regions[0]}", self._check_resource_explorer)
+
+    def _check_resource_explorer(self):
+        try:
+            client = self.session.client('resource-explorer-2', region_name=self.regions[0])
+            return bool(client.list_indexes().get('Indexes'))
+        except ClientError:
+            return False
+
+    def _sync_resource_explorer(self):
+        client = self.session.client('resource-explorer-2', region_name=self.regions[0])
+        known = {row['arn']: row['last_modified'] for row in
+                 self.db.execute("SELECT arn, last_modified FROM resources WHERE source = 'resource-explorer'")}
+
+        seen, changed = set(), []
+        for page in client.get_paginator('list_resources').paginate():
+            for resource in page['Resources']:
+                arn = resource['Arn']
+                last_reported = resource['LastReportedAt'].strftime('%Y-%m-%dT%H:%M:%SZ')
+                seen.add(arn)
+                if known.get(arn) == last_reported:
+                    continue  # Unchanged since the last refresh
+                tags = {}
+                for prop in resource.get('Properties', []):
+                    if prop['Name'] == 'tags':
+                        tags = _tags(prop.get('Data'))
+                changed.append({
+                    'arn': arn,
+                    'type': resource.get('CfnResourceType') or resource['ResourceType'],
+                    'region': resource.get('Region') or None,
+                    'resource_id': arn.split('/')[-1].split(':')[-1],
+                    'tags': tags,
+                    'last_modified': last_reported,
+                })
+
+        self._upsert(changed, 'resource-explorer')
+        gone = [arn for arn in known if arn not in seen]
+        self._delete(gone)
+        self._set_sync('resource-explorer', self.regions[0])
+        print(f"Inventory: {len(changed)} changed, {len(gone)} deleted (Resource Explorer, {len(seen)} resources)")
+
+    # --- Source 3: Describe calls ---
+
+    def _account(self):
+        if self._account_id is None:
+            self._account_id = self.session.client('sts').get_caller_identity()['Account']
+        return self._account_id
+
+    def _describe_instances(self, region):
+        ec2 = self.session.client('ec2', region_name=region)
+        for page in ec2.get_paginator('describe_instances').paginate():
+            for reservation in page['Reservations']:
+                for i in reservation['Instances']:
+                    yield {
+                        'arn': f"arn:aws:ec2:{region}:{reservation['OwnerId']}:instance/{i['InstanceId']}",
+                        'type': INSTANCE, 'region': region, 'resource_id': i['InstanceId'],
+                        'name': _tags(i.get('Tags')).get('Name'), 'state': i['State']['Name'],
+                        'details': {'instance_type': i['InstanceType']}, 'tags': _tags(i.get('Tags')),
+                        'last_modified': i['LaunchTime'].strftime('%Y-%m-%dT%H:%M:%SZ'),
+                    }
+
+    def _describe_volumes(self, region):
+        ec2 = self.session.client('ec2', region_name=region)
+        for page in ec2.get_paginator('describe_volumes').paginate():
+            for v in page['Volumes']:
+                yield {
+                    'arn': f"arn:aws:ec2:{region}:{self._account()}:volume/{v['VolumeId']}",
+                    'type': VOLUME, 'region': region, 'resource_id': v['VolumeId'],
+                    'name': _tags(v.get('Tags')).get('Name'), 'state': v['State'],
+                    'details': {'size_gb': v['Size'], 'volume_type': v.get('VolumeType')}, 'tags': _tags(v.get('Tags')),
+                }
+
+    def _describe_nat_gateways(self, region):
+        ec2 = self.session.client('ec2', region_name=region)
+        for page in ec2.get_paginator('describe_nat_gateways').paginate():
+            for nat in page['NatGateways']:
+                yield {
+                    'arn': f"arn:aws:ec2:{region}:{self._account()}:natgateway/{nat['NatGatewayId']}",
+                    'type': NAT_GATEWAY, 'region': region, 'resource_id': nat['NatGatewayId'],
+                    'state': nat['State'], 'tags': _tags(nat.get('Tags')),
+                }
+
+    def _describe_db_instances(self, region):
+        rds = self.session.client('rds', region_name=region)
+        for page in rds.get_paginator('describe_db_instances').paginate():
+            for db in page['DBInstances']:
+                yield {
+                    'arn': db['DBInstanceArn'], 'type': DB_INSTANCE, 'region': region,
+                    'resource_id': db['DBInstanceIdentifier'], 'state': db['DBInstanceStatus'],
+                    'details': {'db_class': db['DBInstanceClass'], 'engine': db.get('Engine')},
+                    'tags': _tags(db.get('TagList')),
+                }
+
+    def _describe_functions(self, region):
+        lambda_client = self.session.client('lambda', region_name=region)
+        for page in lambda_client.get_paginator('list_functions').paginate():
+            for f in page['Functions']:
+                yield {
+                    'arn': f['FunctionArn'], 'type': LAMBDA_FUNCTION, 'region': region,
+                    'resource_id': f['FunctionName'], 'name': f['FunctionName'], 'state': 'active',
+                    'details': {'runtime': f.get('Runtime')}, 'last_modified': f.get('LastModified'),
+                }
+
+    def _sync_describe(self, max_age, regions=None):
+        describers = {
+            INSTANCE: self._describe_instances,
+            VOLUME: self._describe_volumes,
+            NAT_GATEWAY: self._describe_nat_gateways,
+            DB_INSTANCE: self._describe_db_instances,
+            LAMBDA_FUNCTION: self._describe_functions,
+        }
+        # Only the (region, type) pairs we haven't read recently
+        jobs = []
+        for region in regions or self.regions:
+            for resource_type in describers:
+                _, synced_at = self._get_sync('describe', f"{region}/{resource_type}")
+                if synced_at is None or time.time() - synced_at >= max_age:
+                    jobs.append((region, resource_type))
+        if not jobs:
+            return
+        self._account()  # Look it up once here, not in every thread
+
+        def run(job):
+            region, resource_type = job
+            try:
+                return job, list(describers[resource_type](region)), None
+            except ClientError as e:
+                return job, None, e
+
+        with ThreadPoolExecutor(max_workers=REGION_THREADS) as pool:
+            results = list(pool.map(run, jobs))
+
+        for (region, resource_type), records, error in results:
+            if error is not None:
+                print(f"Warning: could not list {resource_type} in {region}: {error}")
+                continue
+            # Replace what we had for this region/type (deleted resources disappear)
+            old = {row[0] for row in self.db.execute(
+                "SELECT arn FROM resources WHERE region = ? AND type = ?", (region, resource_type))}
+            self._upsert(records, 'describe')
+            self._delete(old - {r['arn'] for r in records})
+            self._set_sync('describe', f"{region}/{resource_type}")
+        print(f"Inventory: read {len(jobs)} region/type lists with describe calls.")
+
+
+def all_regions(session):
+    """
+    Every region enabled for this account.
+    """
+    ec2 = session.client('ec2')
+    return sorted(r['RegionName'] for r in ec2.describe_regions()['Regions'])
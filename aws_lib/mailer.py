@@ -0,0 +1,257 @@
+"""
+Bulk Mailer
+Sends the same kind of email (e.g. "Welcome, here is your login") to many people.
+
+Instead of one 'send_email' call per person, we:
+1. Store the email once in SES as a *template* with placeholders like {{user_name}}.
+2. Send it with 'send_bulk_templated_email': up to 50 people per API call,
+   each with their own placeholder values.
+3. Pace the calls with a token bucket sized from the account's send rate
+   ('get_send_quota'), so a big batch doesn't get throttled.
+4. Retry only the people whose delivery failed for a temporary reason.
+
+For testing without SES there is SmtpMailer: same interface, but it renders the
+template itself and hands the emails to a local SMTP server, e.g.
+    python -m aiosmtpd -n -l localhost:1025
+"""
+import csv
+import json
+import re
+import smtplib
+import time
+from email.message import EmailMessage
+
+from botocore.exceptions import ClientError
+
+from aws_lib.ratelimit import TokenBucket
+
+# SES accepts at most 50 destinations per bulk call
+MAX_DESTINATIONS_PER_CALL = 50
+
+# Per-recipient statuses that are worth trying again (the rest are permanent)
+RETRYABLE_STATUSES = {'TransientFailure', 'AccountThrottled', 'Failed'}
+RETRYABLE_ERRORS = {'Throttling', 'ThrottlingException', 'ServiceUnavailable', 'InternalFailure'}
+
+
+class Delivery:
+    """
+    What happened to one recipient.
+    """
+
+    def __init__(self, email, data):
+        self.email = email
+        self.data = data          # Placeholder values, e.g. {'user_name': 'alice', ...}
+        self.status = 'Pending'   # 'Success', or the SES/SMTP error status
+        self.message_id = None
+        self.error = None
+        self.attempts = 0
+
+    @property
+    def delivered(self):
+        return self.status == 'Success'
+
+
+class DeliveryReport:
+    """
+    The outcome of one bulk send: one Delivery per recipient.
+    """
+
+    def __init__(self, deliveries):
+        self.deliveries = deliveries
+
+    @property
+    def sent(self):
+        return [d for d in self.deliveries if d.delivered]
+
+    @property
+    def failed(self):
+        return [d for d in self.deliveries if not d.delivered]
+
+    def print_summary(self):
+        print(f"\n--- Delivery Report: {len(self.sent)} sent, {len(self.failed)} failed ---")
+        for d in self.deliveries:
+            mark = "[SUCCESS]" if d.delivered else "[ERROR]"
+            detail = f" - {d.status}: {d.error}" if not d.delivered else ""
+            retries = f" (after {d.attempts} attempts)" if d.attempts > 1 else ""
+            print(f"{mark} {d.email}{retries}{detail}")
+
+    def save(self, path):
+        """
+        Writes the report as CSV (one row per recipient).
+        """
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['email', 'status', 'attempts', 'message_id', 'error'])
+            for d in self.deliveries:
+                writer.writerow([d.email, d.status, d.attempts, d.message_id or '', d.error or ''])
+        print(f"Delivery report saved to {path}")
+
+
+class SesBulkMailer:
+    """
+    Sends templated emails through SES in batches of 50.
+
+    Usage:
+        mailer = SesBulkMailer(session, sender='me@example.com')
+        mailer.ensure_template('Welcome', 'Hi {{user_name}}', 'Your login: {{login_url}}')
+        report = mailer.send('Welcome', [('alice@example.com', {'user_name': 'alice', ...})])
+    """
+
+    def __init__(self, session, sender, max_attempts=3, max_send_rate=None):
+        """
+        Args:
+            max_send_rate: Emails per second. None = the account's SES quota.
+        """
+        self.ses = session.client('ses')
+        self.sender = sender
+        self.max_attempts = max_attempts
+        self._limiter = TokenBucket(max_send_rate) if max_send_rate else None
+
+    def ensure_template(self, name, subject, text):
+        """
+        Creates the SES template, or updates it if the text changed.
+        """
+        try:
+            current = self.ses.get_template(TemplateName=name)['Template']
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TemplateDoesNotExist':
+                raise
+            current = None
+
+        template = {'TemplateName': name, 'SubjectPart': subject, 'TextPart': text}
+        if current is None:
+            self.ses.create_template(Template=template)
+        elif current.get('SubjectPart') != subject or current.get('TextPart') != text:
+            self.ses.update_template(Template=template)
+
+    def _rate_limiter(self, count):
+        """
+        A token bucket that allows 'MaxSendRate' emails per second (one bulk
+        call with 50 destinations uses 50 tokens).
+        """
+        if self._limiter is None:
+            quota = self.ses.get_send_quota()
+            self._limiter = TokenBucket(max(quota.get('MaxSendRate', 1), 1))
+            remaining = quota.get('Max24HourSend', -1) - quota.get('SentLast24Hours', 0)
+            if quota.get('Max24HourSend', -1) >= 0 and count > remaining:
+                print(f"WARNING: {count} emails to send but only {remaining:.0f} left in today's SES quota.")
+        return self._limiter
+
+    def send(self, template_name, recipients):
+        """
+        Args:
+            recipients: list of (email, placeholder values) pairs.
+        Returns:
+            A DeliveryReport.
+        """
+        deliveries = [Delivery(email, data) for email, data in recipients]
+        limiter = self._rate_limiter(len(deliveries))
+
+        pending = list(deliveries)
+        for attempt in range(1, self.max_attempts + 1):
+            if not pending:
+                break
+            if attempt > 1:
+                print(f"[*] Retrying {len(pending)} recipients (attempt {attempt} of {self.max_attempts})...")
+                time.sleep(2 ** (attempt - 1))  # Back off: 2s, 4s...
+
+            retry = []
+            for start in range(0, len(pending), MAX_DESTINATIONS_PER_CALL):
+                batch = pending[start:start + MAX_DESTINATIONS_PER_CALL]
+                limiter.acquire(len(batch))
+                retry += self._send_batch(template_name, batch, final=attempt == self.max_attempts)
+            pending = retry
+
+        return DeliveryReport(deliveries)
+
+    def _send_batch(self, template_name, batch, final):
+        # Returns the deliveries that should be tried again
+        for d in batch:
+            d.attempts += 1
+        try:
+            response = self.ses.send_bulk_templated_email(
+                Source=self.sender,
+                Template=template_name,
+                DefaultTemplateData='{}',
+                Destinations=[{
+                    'Destination': {'ToAddresses': [d.email]},
+                    'ReplacementTemplateData': json.dumps(d.data),
+                } for d in batch],
+            )
+        except ClientError as e:
+            # The whole call failed: every recipient in it gets the same error
+            code = e.response['Error']['Code']
+            for d in batch:
+                d.status, d.error = code, e.response['Error'].get('Message', str(e))
+            return batch if code in RETRYABLE_ERRORS and not final else []
+
+        retry = []
+        # SES answers with one status per destination, in the same order
+        for d, result in zip(batch, response['Status']):
+            d.status = result.get('Status') or ('Success' if result.get('MessageId') else 'Failed')
+            d.message_id = result.get('MessageId')
+            d.error = result.get('Error')
+            if d.status in RETRYABLE_STATUSES and not final:
+                retry.append(d)
+        return retry
+
+
+class SmtpMailer:
+    """
+    A local stand-in for SesBulkMailer (same methods), for testing.
+    Templates are kept in memory and {{placeholders}} are filled in here.
+    """
+
+    def __init__(self, host, port, sender, max_attempts=3):
+        self.host = host
+        self.port = int(port)
+        self.sender = sender
+        self.max_attempts = max_attempts
+        self.templates = {}
+
+    def ensure_template(self, name, subject, text):
+        self.templates[name] = (subject, text)
+
+    @staticmethod
+    def render(text, data):
+        return re.sub(r'\{\{\s*(\w+)\s*\}\}', lambda m: str(data.get(m.group(1), '')), text)
+
+    def send(self, template_name, recipients):
+        subject, text = self.templates[template_name]
+        deliveries = [Delivery(email, data) for email, data in recipients]
+
+        pending = list(deliveries)
+        for attempt in range(1, self.max_attempts + 1):
+            if not pending:
+                break
+            if attempt > 1:
+                time.sleep(2 ** (attempt - 1))
+            retry = []
+            for d in pending:
+                d.attempts += 1
+            try:
+                # One connection for the whole batch
+                with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+                    for d in pending:
+                        message = EmailMessage()
+                        message['From'] = self.sender
+                        message['To'] = d.email
+                        message['Subject'] = self.render(subject, d.data)
+                        message.set_content(self.render(text, d.data))
+                        try:
+                            smtp.send_message(message)
+                            d.status, d.error = 'Success', None
+                        except smtplib.SMTPException as e:
+                            d.status, d.error = 'TransientFailure', str(e)
+                            retry.append(d)
+            except OSError as e:
+                # Could not reach the server at all
+                for d in pending:
+                    if not d.delivered and d not in retry:
+                        d.status, d.error = 'TransientFailure', str(e)
+                        retry.append(d)
+            pending = retry
+
+        for d in pending:
+            d.status = 'Failed'
+        return DeliveryReport(deliveries)
@@ -0,0 +1,325 @@
+"""
+Pipeline Orchestrator ('pipeline run')
+Runs the whole data lake pipeline from one YAML file instead of six commands
+typed in the right order:
+
+1. The YAML lists the steps ('deploy', 'run-job', 'run-crawler'...) and which
+   steps each one 'needs' first. That is a DAG: steps that don't depend on each
+   other (uploading the data and uploading the job code) run at the same time.
+2. Job and crawler steps wait until the run is really finished, polling with a
+   growing interval (5s, 7.5s, 11s... up to 30s) instead of a fixed sleep.
+3. Every step gets a fingerprint: its action, its settings, the content of its
+   'inputs' files and the fingerprints of the steps it needs. A step that
+   already succeeded with the same fingerprint is skipped, and so is everything
+   after it that didn't change.
+4. Results are saved after every step, per account and region
+   (~/.aws_playground/pipeline/<name>.<account>.<region>.json), so a run
+   against another account or region starts from scratch.
+   When a step fails, fix the problem and run again: the steps that succeeded
+   are skipped, so the run resumes where it stopped.
+
+Usage:
+    python cli.py pipeline run                        # cloud_intelligence_pipeline/pipeline.yaml
+    python cli.py pipeline run --dag my.yaml --dry-run
+    python cli.py pipeline run --force                # ignore what already ran
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+
+import yaml
+
+from aws_lib.core import get_cache_dir
+
+MAX_PARALLEL = 4
+
+
+class StepFailed(Exception):
+    pass
+
+
+# --- Actions: what a step can do. Each gets the PipelineManager and the step's settings ---
+
+def _deploy(manager, p):
+    if not manager.deploy_infra(p['bucket']):
+        raise StepFailed(f"bucket {p['bucket']} is not ready")
+
+
+def _upload_ingest(manager, p):
+    if not manager.upload_orders(p['bucket'], rows=p.get('rows', 10000), categories=p.get('categories', 8),
+                                 skew=p.get('skew', 1.2)):
+        raise StepFailed("upload failed")
+
+
+def _upload_job(manager, p):
+    manager.publish_job(p['bucket'], p['script'], p.get('extra_py', []), job_name=p['job'])
+
+
+def _create_job(manager, p):
+    script_uri, bundle_uri = manager.publish_job(p['bucket'], p['script'], p.get('extra_py', []))
+    if not manager.create_glue_job(p['job'], p['role'], script_uri, extra_py_files=bundle_uri):
+        raise StepFailed(f"could not create job {p['job']}")
+
+
+def _run_job(manager, p):
+    run_id = manager.start_glue_job(p['job'])
+    if run_id is None:
+        raise StepFailed(f"job {p['job']} did not start")
+    state = manager.wait_for_job_run(p['job'], run_id, timeout=p.get('timeout', 2 * 60 * 60))
+    if state != 'SUCCEEDED':
+        raise StepFailed(f"job run {run_id} ended {state}")
+
+
+def _create_crawler(manager, p):
+    if not manager.create_crawler(p['crawler'], p['role'], p['database'], f"s3://{p['bucket']}/{p['target']}"):
+        raise StepFailed(f"could not create crawler {p['crawler']}")
+
+
+def _run_crawler(manager, p):
+    previous = manager.last_crawl_start(p['crawler'])
+    if not manager.start_crawler(p['crawler']):
+        raise StepFailed(f"crawler {p['crawler']} did not start")
+    status = manager.wait_for_crawler(p['crawler'], previous, timeout=p.get('timeout', 60 * 60))
+    if status != 'SUCCEEDED':
+        raise StepFailed(f"crawl ended {status}")
+
+
+def _refresh_summaries(manager, p):
+    from aws_lib.summaries import SummaryManager
+
+    summaries = SummaryManager(manager.session, p['database'], f"s3://{p['bucket']}/athena-results/",
+                               f"s3://{p['bucket']}/processed/summaries/")
+    summaries.refresh(append_only=p.get('append_only', False))
+    if summaries.failed:
+        raise StepFailed(f"could not refresh {', '.join(summaries.failed)}")
+
+
+ACTIONS = {
+    'deploy': _deploy,
+    'upload-ingest': _upload_ingest,
+    'upload-job': _upload_job,
+    'create-job': _create_job,
+    'run-job': _run_job,
+    'create-crawler': _create_crawler,
+    'run-crawler': _run_crawler,
+    'refresh-summaries': _refresh_summaries,
+}
+
+
+def _path_hashes(paths):
+    """
+    {path: sha256} for input files (folders: every file inside).
+    """
+    hashes = {}
+    for path in paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+                           if '__pycache__' not in root)
+        for file_path in files:
+            with open(file_path, 'rb') as f:
+                hashes[file_path.replace(os.sep, '/')] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+
+class Step:
+    """
+    One step of the DAG.
+    """
+
+    def __init__(self, name, action, params, needs=(), inputs=(), always=False):
+        self.name = name
+        self.action = action
+        self.params = params        # 'vars' from the file, overridden by the step's 'with'
+        self.needs = list(needs)
+        self.inputs = list(inputs)
+        self.always = always        # True: never skipped as unchanged
+        self.fingerprint = None
+        self.status = 'pending'     # pending -> running -> succeeded / failed / blocked, or unchanged
+        self.error = None
+        self.seconds = 0.0
+
+
+class PipelineDag:
+    """
+    The steps from a pipeline YAML file, checked and in dependency order.
+    """
+
+    def __init__(self, path):
+        with open(path) as f:
+            spec = yaml.safe_load(f) or {}
+        self.path = path
+        self.name = spec.get('name') or os.path.splitext(os.path.basename(path))[0]
+        defaults = spec.get('vars') or {}
+
+        self.steps = {}
+        for name, step in (spec.get('steps') or {}).items():
+            step = step or {}
+            action = step.get('action', name)
+            if action not in ACTIONS:
+                raise ValueError(f"Step '{name}': unknown action '{action}' (use {', '.join(ACTIONS)}).")
+            self.steps[name] = Step(name, action, dict(defaults, **(step.get('with') or {})),
+                                    step.get('needs') or [], step.get('inputs') or [], step.get('always', False))
+        for step in self.steps.values():
+            for need in step.needs:
+                if need not in self.steps:
+                    raise ValueError(f"Step '{step.name}' needs unknown step '{need}'.")
+        self.order = self._sort()
+
+    def _sort(self):
+        """
+        Steps with everything they need before them. Raises ValueError on a cycle.
+        """
+        order, done = [], set()
+        while len(order) < len(self.steps):
+            ready = [s for s in self.steps.values() if s.name not in done and set(s.needs) <= done]
+            if not ready:
+                cycle = sorted(set(self.steps) - done)
+                raise ValueError(f"The steps {', '.join(cycle)} depend on each other in a circle.")
+            for step in ready:
+                order.append(step)
+                done.add(step.name)
+        return order
+
+    def fingerprint(self):
+        """
+        Sets every step's fingerprint (upstream steps first, so changes flow downstream).
+        """
+        for step in self.order:
+            content = {
+                'action': step.action,
+                'params': step.params,
+                'inputs': _path_hashes(step.inputs),
+                'needs': {name: self.steps[name].fingerprint for name in sorted(step.needs)},
+            }
+            step.fingerprint = hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class PipelineRunner:
+    """
+    Runs a PipelineDag: every step whose needs succeeded (or were unchanged)
+    starts right away, up to 'max_parallel' at a time.
+    """
+
+    def __init__(self, manager, dag, max_parallel=MAX_PARALLEL, force=False):
+        self.manager = manager
+        self.dag = dag
+        self.max_parallel = max_parallel
+        self.force = force
+        # What ran in one account/region says nothing about another: one state file each
+        account = manager.session.client('sts').get_caller_identity()['Account']
+        region = manager.session.region_name or 'us-east-1'
+        self.state_path = os.path.join(get_cache_dir('pipeline'), f"{dag.name}.{account}.{region}.json")
+        self.state = self._load_state()
+        self._lock = threading.Lock()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, step):
+        with self._lock:
+            self.state[step.name] = {
+                'fingerprint': step.fingerprint,
+                'status': step.status,
+                'error': step.error,
+                'seconds': round(step.seconds, 1),
+                'finished': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            }
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.state_path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(temp_path, self.state_path)
+
+    def _say(self, message):
+        with self._lock:
+            print(message)
+
+    def _unchanged(self, step):
+        previous = self.state.get(step.name, {})
+        return (not self.force and not step.always and previous.get('status') == 'succeeded'
+                and previous.get('fingerprint') == step.fingerprint)
+
+    def _run(self, step):
+        start = time.monotonic()
+        try:
+            ACTIONS[step.action](self.manager, step.params)
+        finally:
+            step.seconds = time.monotonic() - start
+
+    def plan(self):
+        """
+        Prints what a run would do.
+        """
+        self.dag.fingerprint()
+        print(f"Pipeline '{self.dag.name}' ({self.dag.path}):")
+        changed = set()
+        for step in self.dag.order:
+            rerun = not self._unchanged(step) or any(n in changed for n in step.needs)
+            if rerun:
+                changed.add(step.name)
+            needs = f" (after {', '.join(step.needs)})" if step.needs else ""
+            print(f"   {'RUN ' if rerun else 'SKIP'} {step.name}: {step.action}{needs}")
+
+    def run(self):
+        """
+        Returns True if every step succeeded or was unchanged.
+        """
+        self.dag.fingerprint()
+        steps = self.dag.steps
+        ok = {'succeeded', 'unchanged'}
+        running = {}
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            while True:
+                for step in self.dag.order:
+                    if step.status != 'pending':
+                        continue
+                    if any(steps[n].status in ('failed', 'blocked') for n in step.needs):
+                        step.status = 'blocked'
+                        step.error = "blocked by " + ", ".join(n for n in step.needs if steps[n].status not in ok)
+                        self._say(f"[SKIP] {step.name} ({step.error})")
+                    elif all(steps[n].status in ok for n in step.needs):
+                        # Unchanged only if nothing it needs ran again (a re-run upstream step means new output)
+                        if self._unchanged(step) and all(steps[n].status == 'unchanged' for n in step.needs):
+                            step.status = 'unchanged'
+                            self._say(f"[SKIP] {step.name} (unchanged since {self.state[step.name]['finished']})")
+                        else:
+                            step.status = 'running'
+                            self._say(f"[*] {step.name}: {step.action}...")
+                            running[pool.submit(self._run, step)] = step
+
+                # (Steps are visited in dependency order, so an unchanged step unblocks the next ones in the same pass)
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        step.status = 'succeeded'
+                        self._say(f"[OK] {step.name} ({step.seconds:.1f}s)")
+                    else:
+                        step.status = 'failed'
+                        step.error = str(error)
+                        self._say(f"[ERROR] {step.name}: {error}")
+                    self._save(step)
+
+        counts = {}
+        for step in steps.values():
+            counts[step.status] = counts.get(step.status, 0) + 1
+        print(f"\nPipeline '{self.dag.name}' finished in {time.monotonic() - start:.1f}s: "
+              + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())) + ".")
+        failed = [s for s in steps.values() if s.status not in ok]
+        if failed:
+            print("Fix the error and run again: steps that succeeded will be skipped.")
+        return not failed
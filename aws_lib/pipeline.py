@@ -4,10 +4,58 @@ Handles provisioning of S3 Buckets, Glue Databases, and uploading scripts.
 """
 import boto3
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+from botocore.exceptions import ClientError
+
+from aws_lib.datagen import generate_orders, to_json_bytes
+
+DEFAULT_REGISTRY = 'cloud_intelligence_pipeline/datasets.yaml'
+
+# Job runs we keep going at once. Glue's default quota is 50 concurrent runs per
+# account (shared with everyone else's jobs), and 1 per job unless MaxConcurrentRuns is raised.
+MAX_CONCURRENT_RUNS = 10
+
+RUNNING_STATES = ('STARTING', 'RUNNING', 'STOPPING', 'WAITING')
+
+
+def load_datasets(path=DEFAULT_REGISTRY, names=None):
+    """
+    Reads the dataset registry (YAML). Returns one dict per dataset with every
+    setting filled in from 'defaults'. names: only these datasets.
+    """
+    with open(path) as f:
+        spec = yaml.safe_load(f) or {}
+    defaults = spec.get('defaults') or {}
+    registry = spec.get('datasets') or {}
+    unknown = sorted(set(names or []) - set(registry))
+    if unknown:
+        raise ValueError(f"Unknown dataset(s) {', '.join(unknown)} (the registry has {', '.join(registry)}).")
+
+    datasets = []
+    for name, settings in registry.items():
+        if names and name not in names:
+            continue
+        dataset = dict(defaults, **(settings or {}), name=name)
+        for key in ('bucket', 'role', 'database', 'script', 'source', 'output'):
+            if not dataset.get(key):
+                raise ValueError(f"Dataset '{name}' has no '{key}'.")
+        dataset.setdefault('job', f"etl-{name}")
+        dataset.setdefault('crawler', f"crawl-{name}")
+        dataset.setdefault('table_prefix', 'clean_')
+        dataset['output'] = dataset['output'].rstrip('/') + '/'
+        dataset['table'] = dataset['table_prefix'] + dataset['output'].rstrip('/').rsplit('/', 1)[-1]
+        datasets.append(dataset)
+    return datasets
+
 
 class PipelineManager:
     def __init__(self, session):
         self.session = session
+        self._role_lock = threading.Lock()
         self.s3 = session.client('s3')
         self.iam = session.client('iam')
         self.glue = session.client('glue')
@@ -16,6 +64,7 @@ class PipelineManager:
     def deploy_infra(self, bucket_name):
         """
         Creates S3 Bucket and required folders.
+        Returns True if everything is in place.
         """
         print(f"--- Deploying Pipeline Infrastructure to {self.region} ---")
         
@@ -25,23 +74,33 @@ class PipelineManager:
             print(f"✅ Bucket {bucket_name} already exists.")
         except Exception:
             print(f"Creating bucket {bucket_name}...")
-            if self.region == 'us-east-1':
-                self.s3.create_bucket(Bucket=bucket_name)
-            else:
-                self.s3.create_bucket(Bucket=bucket_name, CreateBucketConfiguration={'LocationConstraint': self.region})
+            try:
+                if self.region == 'us-east-1':
+                    self.s3.create_bucket(Bucket=bucket_name)
+                else:
+                    self.s3.create_bucket(Bucket=bucket_name, CreateBucketConfiguration={'LocationConstraint': self.region})
+            except ClientError as e:
+                print(f"❌ Could not create bucket {bucket_name}: {e}")
+                return False
             print(f"✅ Bucket {bucket_name} created.")
 
         # 2. Create 'Folders' (Empty objects ending in /)
         folders = ['raw/', 'processed/', 'scripts/', 'athena-results/']
+        missing = []
         for folder in folders:
             try:
                 self.s3.put_object(Bucket=bucket_name, Key=folder)
                 print(f"   - Folder created: {folder}")
             except Exception as e:
                 print(f"   - Skipped folder {folder}: {e}")
+                missing.append(folder)
 
+        if missing:
+            print(f"\n❌ Infrastructure incomplete: {', '.join(missing)} missing.")
+            return False
         print("\n✅ Infrastructure Ready.")
         print(f"   Target Bucket: s3://{bucket_name}/")
+        return True
 
     def upload_script(self, bucket_name, local_path, s3_key):
         """
@@ -54,28 +113,70 @@ class PipelineManager:
         except Exception as e:
             print(f"❌ Upload failed: {e}")
 
-    def create_glue_job(self, job_name, role_name, script_s3_path):
+    def publish_job(self, bucket_name, script_path, extra_paths=(), job_name=None):
+        """
+        Uploads the job script (and a zip of extra modules) under content-hash keys,
+        skipping what is already there. If job_name exists, points it at them.
+        Returns (script_uri, bundle_uri).
+        """
+        from aws_lib.artifacts import GlueArtifacts
+
+        artifacts = GlueArtifacts(self.session, bucket_name)
+        script_uri = artifacts.publish_script(script_path)
+        bundle_uri = artifacts.publish_bundle(list(extra_paths))
+        if job_name:
+            try:
+                artifacts.point_job(job_name, script_uri, bundle_uri)
+            except self.glue.exceptions.EntityNotFoundException:
+                print(f"   (Job {job_name} doesn't exist yet: run 'create-job')")
+        return script_uri, bundle_uri
+
+    def upload_orders(self, bucket_name, rows=10000, categories=8, skew=1.2, s3_key='raw/orders.json'):
+        """
+        Generates synthetic orders and uploads them as the raw input of the Glue job.
+        """
+        print(f"Generating {rows} orders ({categories} categories, skew={skew})...")
+        body = to_json_bytes(generate_orders(rows=rows, categories=categories, skew=skew))
+        print(f"Uploading {len(body)} bytes -> s3://{bucket_name}/{s3_key}")
+        try:
+            self.s3.put_object(Bucket=bucket_name, Key=s3_key, Body=body, ContentType='application/json')
+            print("✅ Upload complete.")
+            return True
+        except Exception as e:
+            print(f"❌ Upload failed: {e}")
+            return False
+
+    def ensure_glue_role(self, role_name):
+        """
+        Returns the ARN of the Glue service role, creating it the first time.
+        """
+        with self._role_lock:  # Parallel deploys share one role: create it once
+            try:
+                role_arn = self.iam.get_role(RoleName=role_name)['Role']['Arn']
+                print(f"✅ Using existing Role: {role_arn}")
+            except Exception:
+                print(f"Creating Role {role_name}...")
+                assume_role_policy = '{"Version": "2012-10-17","Statement": [{"Effect": "Allow","Principal": {"Service": "glue.amazonaws.com"},"Action": "sts:AssumeRole"}]}'
+                role = self.iam.create_role(RoleName=role_name, AssumeRolePolicyDocument=assume_role_policy)
+                self.iam.attach_role_policy(RoleName=role_name, PolicyArn='arn:aws:iam::aws:policy/service-role/AWSGlueServiceRole')
+                # Add S3 Access (For playground simplicity, giving FullAccess, but scope down in production!)
+                self.iam.attach_role_policy(RoleName=role_name, PolicyArn='arn:aws:iam::aws:policy/AmazonS3FullAccess')
+                role_arn = role['Role']['Arn']
+                print(f"✅ Role created: {role_arn}")
+                # Wait for propagation
+                time.sleep(10)
+            return role_arn
+
+    def create_glue_job(self, job_name, role_name, script_s3_path, extra_py_files=None, arguments=None, workers=2):
         """
         Creates (or updates) an AWS Glue Job.
+        script_s3_path: 's3://bucket/key' or 'bucket/key'. extra_py_files: s3:// URI of a zip, optional.
+        arguments: more job arguments, e.g. {'--source_path': 's3://...'}.
         """
         print(f"--- Creating Glue Job: {job_name} ---")
         
         # 1. Get/Create IAM Role
-        try:
-            role_arn = self.iam.get_role(RoleName=role_name)['Role']['Arn']
-            print(f"✅ Using existing Role: {role_arn}")
-        except Exception:
-            print(f"Creating Role {role_name}...")
-            assume_role_policy = '{"Version": "2012-10-17","Statement": [{"Effect": "Allow","Principal": {"Service": "glue.amazonaws.com"},"Action": "sts:AssumeRole"}]}'
-            role = self.iam.create_role(RoleName=role_name, AssumeRolePolicyDocument=assume_role_policy)
-            self.iam.attach_role_policy(RoleName=role_name, PolicyArn='arn:aws:iam::aws:policy/service-role/AWSGlueServiceRole')
-            # Add S3 Access (For playground simplicity, giving FullAccess, but scope down in production!)
-            self.iam.attach_role_policy(RoleName=role_name, PolicyArn='arn:aws:iam::aws:policy/AmazonS3FullAccess')
-            role_arn = role['Role']['Arn']
-            print(f"✅ Role created: {role_arn}")
-            # Wait for propagation
-            import time
-            time.sleep(10)
+        role_arn = self.ensure_glue_role(role_name)
 
         # 2. Create Job
         job_args = {
@@ -83,32 +184,44 @@ class PipelineManager:
             'Role': role_arn,
             'Command': {
                 'Name': 'glueetl',
-                'ScriptLocation': f"s3://{script_s3_path}",
+                'ScriptLocation': script_s3_path if script_s3_path.startswith('s3://') else f"s3://{script_s3_path}",
                 'PythonVersion': '3'
             },
             'DefaultArguments': {
-                '--job-language': 'python'
+                '--job-language': 'python',
+                **({'--extra-py-files': extra_py_files} if extra_py_files else {}),
+                **(arguments or {})
             },
             'GlueVersion': '3.0',
             'WorkerType': 'G.1X',
-            'NumberOfWorkers': 2
+            'NumberOfWorkers': workers
         }
         
         try:
             self.glue.create_job(**job_args)
             print(f"✅ Job {job_name} created successfully.")
-        except self.glue.exceptions.IdempotentParameterMismatchException:
-            print(f"⚠️ Job {job_name} exists with different parameters. Updating...")
-            self.glue.update_job(JobName=job_name, JobUpdate=job_args)
-            print(f"✅ Job {job_name} updated.")
-        except self.glue.exceptions.AlreadyExistsException:
-             print(f"✅ Job {job_name} already exists.")
+            return True
+        except (self.glue.exceptions.IdempotentParameterMismatchException, self.glue.exceptions.AlreadyExistsException):
+            pass  # Exists: update it below
         except Exception as e:
             print(f"❌ Failed to create job: {e}")
+            return False
+
+        # Script, bundle, role, workers and the full argument set in one update,
+        # so no run mixes old and new code (and removed arguments really go away)
+        from aws_lib.artifacts import GlueArtifacts
+        try:
+            GlueArtifacts(self.session, None).point_job(
+                job_name, job_args['Command']['ScriptLocation'], extra_py_files,
+                arguments=job_args['DefaultArguments'], role=role_arn, workers=workers, replace_arguments=True)
+        except Exception as e:
+            print(f"❌ Failed to update job {job_name}: {e}")
+            return False
+        return True
 
     def start_glue_job(self, job_name):
         """
-        Triggers a Glue Job run.
+        Triggers a Glue Job run. Returns the run id (None if it didn't start).
         """
         print(f"--- Starting Glue Job: {job_name} ---")
         try:
@@ -116,12 +229,35 @@ class PipelineManager:
             run_id = response['JobRunId']
             print(f"✅ Job started! Run ID: {run_id}")
             print(f"   Monitor at: https://{self.region}.console.aws.amazon.com/glue/home?region={self.region}#jobRun:jobName={job_name};jobRunId={run_id}")
+            return run_id
         except Exception as e:
             print(f"❌ Failed to start job: {e}")
+            return None
 
-    def create_crawler(self, crawler_name, role_name, db_name, s3_target):
+    def wait_for_job_run(self, job_name, run_id, timeout=2 * 60 * 60):
         """
-        Creates a Glue Crawler to catalog the data.
+        Waits for a job run to finish (checking every few seconds, then less often).
+        Returns its final state: 'SUCCEEDED', 'FAILED', 'TIMEOUT'...
+        """
+        from aws_lib.teardown import poll
+
+        finished = {}
+
+        def done():
+            run = self.glue.get_job_run(JobName=job_name, RunId=run_id)['JobRun']
+            finished.update(run)
+            return run['JobRunState'] not in ('STARTING', 'RUNNING', 'STOPPING', 'WAITING')
+
+        if not poll(done, timeout=timeout, first=5.0, longest=30.0):
+            return 'TIMEOUT'
+        if finished.get('ErrorMessage'):
+            print(f"   {job_name}: {finished['ErrorMessage']}")
+        return finished['JobRunState']
+
+    def create_crawler(self, crawler_name, role_name, db_name, s3_target, table_prefix='clean_'):
+        """
+        Creates (or updates) a Glue Crawler to catalog the data.
+        Returns True on success.
         """
         print(f"--- Creating Glue Crawler: {crawler_name} ---")
         
@@ -131,6 +267,9 @@ class PipelineManager:
             print(f"✅ Database {db_name} created (or verified).")
         except self.glue.exceptions.AlreadyExistsException:
              print(f"✅ Database {db_name} already exists.")
+        except Exception as e:
+            print(f"❌ Failed to create database {db_name}: {e}")
+            return False
 
         # 2. Create Crawler
         # We point it to the 'processed' folder where Parquet files live
@@ -141,17 +280,243 @@ class PipelineManager:
                 Role=role_name,
                 DatabaseName=db_name,
                 Targets=targets,
-                TablePrefix='clean_'
+                TablePrefix=table_prefix
             )
             print(f"✅ Crawler {crawler_name} created.")
         except self.glue.exceptions.AlreadyExistsException:
             print(f"✅ Crawler {crawler_name} exists. Updating...")
-            self.glue.update_crawler(Name=crawler_name, Role=role_name, DatabaseName=db_name, Targets=targets)
+            try:
+                self.glue.update_crawler(Name=crawler_name, Role=role_name, DatabaseName=db_name, Targets=targets,
+                                         TablePrefix=table_prefix)
+            except Exception as e:
+                print(f"❌ Failed to update crawler {crawler_name}: {e}")
+                return False
+        except Exception as e:
+            print(f"❌ Failed to create crawler {crawler_name}: {e}")
+            return False
+        return True
 
     def start_crawler(self, crawler_name):
         print(f"--- Starting Crawler: {crawler_name} ---")
         try:
             self.glue.start_crawler(Name=crawler_name)
             print("✅ Crawler started! It will inspect S3 and create tables.")
+            return True
+        except self.glue.exceptions.CrawlerRunningException:
+            print("✅ Crawler is already running.")
+            return True
         except Exception as e:
              print(f"❌ Failed to start crawler: {e}")
+             return False
+
+    def last_crawl_start(self, crawler_name):
+        """
+        When the crawler's last crawl started (None if it never ran).
+        """
+        return (self.glue.get_crawler(Name=crawler_name)['Crawler'].get('LastCrawl') or {}).get('StartTime')
+
+    def wait_for_crawler(self, crawler_name, previous_start=None, timeout=60 * 60):
+        """
+        Waits until the crawler is idle again with a newer crawl than the one
+        that started at 'previous_start' (see last_crawl_start). Returns the
+        crawl's status: 'SUCCEEDED', 'FAILED', 'CANCELLED' or 'TIMEOUT'.
+        """
+        from aws_lib.teardown import poll
+
+        crawler = {}
+
+        def done():
+            crawler.update(self.glue.get_crawler(Name=crawler_name)['Crawler'])
+            last = crawler.get('LastCrawl') or {}
+            if crawler['State'] != 'READY' or not last:
+                return False
+            return previous_start is None or last.get('StartTime') != previous_start
+
+        if not poll(done, timeout=timeout, first=5.0, longest=30.0):
+            return 'TIMEOUT'
+        last = crawler['LastCrawl']
+        if last.get('ErrorMessage'):
+            print(f"   {crawler_name}: {last['ErrorMessage']}")
+        return last.get('Status', 'SUCCEEDED')
+
+    # --- Many datasets (see load_datasets) ---
+
+    @staticmethod
+    def _job_arguments(dataset):
+        """
+        The per-dataset arguments process_job.py reads.
+        """
+        bucket = dataset['bucket']
+        arguments = {'--source_path': f"s3://{bucket}/{dataset['source']}",
+                     '--output_path': f"s3://{bucket}/{dataset['output']}"}
+        if dataset.get('partition_by'):
+            arguments['--partition_by'] = ",".join(dataset['partition_by'])
+        return arguments
+
+    def deploy_datasets(self, datasets, max_parallel=8):
+        """
+        Creates (or updates) the job and the crawler of every dataset, several at a time.
+        Returns the names of the datasets that failed.
+        """
+        # Shared pieces once: each role, and each (script, extra modules) upload
+        bad_roles = set()
+        for role in sorted({d['role'] for d in datasets}):
+            try:
+                self.ensure_glue_role(role)
+            except Exception as e:
+                print(f"❌ Failed to set up role {role}: {e}")
+                bad_roles.add(role)
+        published = {}  # (bucket, script, extra modules) -> (script URI, bundle URI), or None if the upload failed
+
+        def artifact_key(dataset):
+            return dataset['bucket'], dataset['script'], tuple(dataset.get('extra_py', []))
+
+        for key in dict.fromkeys(artifact_key(d) for d in datasets):
+            try:
+                published[key] = self.publish_job(*key[:2], key[2])
+            except Exception as e:
+                print(f"❌ Failed to upload {key[1]} to {key[0]}: {e}")
+                published[key] = None
+
+        def deploy(dataset):
+            # One dataset's error must not stop the others: report it and move on
+            artifacts = published[artifact_key(dataset)]
+            if artifacts is None or dataset['role'] in bad_roles:
+                return False
+            script_uri, bundle_uri = artifacts
+            try:
+                if not self.create_glue_job(dataset['job'], dataset['role'], script_uri, extra_py_files=bundle_uri,
+                                            arguments=self._job_arguments(dataset), workers=dataset.get('workers', 2)):
+                    return False
+                return self.create_crawler(dataset['crawler'], dataset['role'], dataset['database'],
+                                           f"s3://{dataset['bucket']}/{dataset['output']}", dataset['table_prefix'])
+            except Exception as e:
+                print(f"❌ {dataset['name']}: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+            results = list(pool.map(deploy, datasets))
+        failed = [d['name'] for d, ok in zip(datasets, results) if not ok]
+        print(f"\n✅ {len(datasets) - len(failed)} of {len(datasets)} datasets deployed."
+              + (f" Failed: {', '.join(failed)}" if failed else ""))
+        return failed
+
+    def run_datasets(self, datasets, max_runs=MAX_CONCURRENT_RUNS, timeout=4 * 60 * 60):
+        """
+        Runs every dataset's job, then its crawler, keeping at most 'max_runs'
+        job runs going at once. One loop checks all runs and crawls, every 5s
+        growing to 30s. Returns {dataset: {'job': state, 'crawl': status}}.
+        """
+        queue = list(datasets)
+        jobs = {}        # dataset name -> (dataset, run id)
+        crawls = {}      # crawler name -> (dataset, start of its previous crawl)
+        results = {d['name']: {'job': 'WAITING', 'crawl': None} for d in datasets}
+        deadline = time.monotonic() + timeout
+        interval = 5.0
+
+        while queue or jobs or crawls:
+            # 1. Start jobs while we are under the cap
+            while queue and len(jobs) < max_runs:
+                dataset = queue[0]
+                try:
+                    run_id = self.glue.start_job_run(JobName=dataset['job'])['JobRunId']
+                except ClientError as e:
+                    if e.response['Error']['Code'] == 'ConcurrentRunsExceededException':
+                        break  # Glue's own limit is lower than ours: try again once a run finished
+                    queue.pop(0)
+                    results[dataset['name']]['job'] = 'NOT STARTED'
+                    print(f"❌ {dataset['name']}: {e}")
+                    continue
+                queue.pop(0)
+                jobs[dataset['name']] = (dataset, run_id)
+                results[dataset['name']]['job'] = 'RUNNING'
+                print(f"[*] {dataset['name']}: job {dataset['job']} started ({run_id})")
+
+            if time.monotonic() > deadline:
+                for name in list(jobs) + [d['name'] for d, _ in crawls.values()]:
+                    print(f"❌ {name}: still running after {timeout}s")
+                break
+            time.sleep(interval)
+            interval = min(interval * 1.5, 30.0)
+
+            # 2. Check the runs
+            for name, (dataset, run_id) in list(jobs.items()):
+                run = self.glue.get_job_run(JobName=dataset['job'], RunId=run_id)['JobRun']
+                if run['JobRunState'] in RUNNING_STATES:
+                    continue
+                del jobs[name]
+                results[name]['job'] = run['JobRunState']
+                if run['JobRunState'] != 'SUCCEEDED':
+                    print(f"❌ {name}: job {run['JobRunState']} {run.get('ErrorMessage', '')}")
+                    continue
+                print(f"[OK] {name}: job finished ({run.get('ExecutionTime', 0)}s), starting crawler {dataset['crawler']}")
+                previous = self.last_crawl_start(dataset['crawler'])
+                if self.start_crawler(dataset['crawler']):
+                    crawls[dataset['crawler']] = (dataset, previous)
+                    results[name]['crawl'] = 'RUNNING'
+                else:
+                    results[name]['crawl'] = 'NOT STARTED'
+
+            # 3. Check the crawlers (up to 100 in one call)
+            names = list(crawls)
+            for start in range(0, len(names), 100):
+                for crawler in self.glue.batch_get_crawlers(CrawlerNames=names[start:start + 100])['Crawlers']:
+                    dataset, previous = crawls[crawler['Name']]
+                    last = crawler.get('LastCrawl') or {}
+                    if crawler['State'] != 'READY' or not last or (previous and last.get('StartTime') == previous):
+                        continue
+                    del crawls[crawler['Name']]
+                    status = results[dataset['name']]['crawl'] = last.get('Status', 'SUCCEEDED')
+                    print(f"[OK] {dataset['name']}: crawl finished" if status == 'SUCCEEDED'
+                          else f"❌ {dataset['name']}: crawl {status} {last.get('ErrorMessage', '')}")
+
+        return results
+
+    def dataset_status(self, datasets):
+        """
+        One row per dataset: its last job run and its crawler.
+        """
+        def last_run(dataset):
+            try:
+                runs = self.glue.get_job_runs(JobName=dataset['job'], MaxResults=1)['JobRuns']
+            except self.glue.exceptions.EntityNotFoundException:
+                return None
+            return runs[0] if runs else {}
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            runs = list(pool.map(last_run, datasets))
+        crawlers = {}
+        names = [d['crawler'] for d in datasets]
+        for start in range(0, len(names), 100):
+            response = self.glue.batch_get_crawlers(CrawlerNames=names[start:start + 100])
+            crawlers.update({c['Name']: c for c in response['Crawlers']})
+
+        rows = []
+        for dataset, run in zip(datasets, runs):
+            crawler = crawlers.get(dataset['crawler'])
+            last_crawl = (crawler or {}).get('LastCrawl') or {}
+            rows.append({
+                'dataset': dataset['name'],
+                'job': 'not deployed' if run is None else run.get('JobRunState', 'never ran'),
+                'started': run['StartedOn'].strftime('%Y-%m-%d %H:%M') if run and run.get('StartedOn') else '-',
+                'seconds': str(run.get('ExecutionTime', '-')) if run else '-',
+                'crawler': 'not deployed' if crawler is None else crawler['State'],
+                'last crawl': last_crawl.get('Status', '-'),
+                'crawled': last_crawl['StartTime'].strftime('%Y-%m-%d %H:%M') if last_crawl.get('StartTime') else '-',
+                'table': f"{dataset['database']}.{dataset['table']}",
+            })
+        return rows
+
+    @staticmethod
+    def print_table(rows):
+        """
+        Prints a list of same-keyed dicts as aligned columns.
+        """
+        if not rows:
+            print("(nothing)")
+            return
+        columns = list(rows[0])
+        widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+        print("  ".join(c.upper().ljust(w) for c, w in zip(columns, widths)))
+        for row in rows:
+            print("  ".join(str(row[c]).ljust(w) for c, w in zip(columns, widths)))
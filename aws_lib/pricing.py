@@ -0,0 +1,223 @@
+"""
+Price Catalog
+Tells you what a resource costs per month without calling any AWS API.
+
+AWS publishes every price as public 'Price List' bulk files (one CSV per service
+and region). They are big (hundreds of MB for EC2), so 'refresh()' streams
+them once and keeps only the few rows our audits need:
+- EC2: on-demand Linux price per instance type (per hour)
+- EBS: price per GB-month per volume type (gp2, gp3, io1...)
+- NAT Gateway: price per hour and per GB processed
+- RDS: on-demand single-AZ price per instance class and engine (per hour)
+- Lambda: price per GB-second and per request
+
+The result is a small SQLite file (~/.aws_playground/pricing/prices.sqlite).
+Looking a price up is then a local query.
+
+Usage:
+    python cli.py audit pricing --regions us-east-1 eu-west-1   # download / update
+"""
+import csv
+import io
+import os
+import sqlite3
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+from aws_lib.core import get_cache_dir
+from aws_lib.inventory import INSTANCE, VOLUME, NAT_GATEWAY, DB_INSTANCE, LAMBDA_FUNCTION
+
+PRICE_LIST_URL = 'https://pricing.us-east-1.amazonaws.com/offers/v1.0/aws/{offer}/current/{region}/index.csv'
+
+# The bulk files ('offers') we read, and the catalog 'service' names they fill
+OFFERS = ['AmazonEC2', 'AmazonRDS', 'AWSLambda']
+
+HOURS_PER_MONTH = 730
+
+# RDS engine names: API value -> Price List value
+RDS_ENGINES = {
+    'mysql': 'MySQL',
+    'postgres': 'PostgreSQL',
+    'mariadb': 'MariaDB',
+    'aurora-mysql': 'Aurora MySQL',
+    'aurora-postgresql': 'Aurora PostgreSQL',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    region  TEXT NOT NULL,
+    service TEXT NOT NULL,   -- ec2, ebs, nat, rds, lambda
+    key     TEXT NOT NULL,   -- instance type, volume type, 'hours'...
+    unit    TEXT,
+    usd     REAL NOT NULL,
+    PRIMARY KEY (region, service, key)
+);
+CREATE TABLE IF NOT EXISTS offers (
+    offer         TEXT NOT NULL,
+    region        TEXT NOT NULL,
+    last_modified TEXT,      -- from the download, to skip unchanged files
+    fetched_at    TEXT,
+    rows          INTEGER,
+    PRIMARY KEY (offer, region)
+);
+"""
+
+
+def _price_row(row):
+    """
+    Decides whether one Price List CSV row is one we keep.
+    Returns (service, key, unit) or None.
+    """
+    if row.get('TermType') != 'OnDemand' or row.get('Currency', 'USD') != 'USD':
+        return None
+    family = row.get('Product Family')
+    unit = row.get('Unit')
+
+    if family == 'Compute Instance':
+        if (row.get('operation') == 'RunInstances' and row.get('Tenancy') == 'Shared'
+                and row.get('CapacityStatus') == 'Used' and row.get('Pre Installed S/W') == 'NA'):
+            return 'ec2', row['Instance Type'], unit
+    elif family == 'Storage' and unit == 'GB-Mo' and row.get('Volume API Name'):
+        return 'ebs', row['Volume API Name'], unit
+    elif family == 'NAT Gateway':
+        return 'nat', 'hours' if unit == 'Hrs' else 'gb', unit
+    elif family == 'Database Instance':
+        if row.get('Deployment Option') == 'Single-AZ' and row.get('Database Engine'):
+            return 'rds', f"{row['Instance Type']}|{row['Database Engine']}", unit
+    elif family == 'Serverless' and row.get('StartingRange', '0') in ('0', ''):
+        group = row.get('Group')
+        if group == 'AWS-Lambda-Duration':
+            return 'lambda', 'gb-second', unit
+        if group == 'AWS-Lambda-Requests':
+            return 'lambda', 'request', unit
+    return None
+
+
+class PriceCatalog:
+    """
+    Usage:
+        catalog = PriceCatalog()
+        catalog.refresh(['us-east-1'])          # downloads (only when AWS published new prices)
+        catalog.monthly_cost(resource)          # e.g. 70.08, or None if unknown
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(get_cache_dir('pricing'), 'prices.sqlite')
+        self.db = sqlite3.connect(self.db_path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    @property
+    def is_empty(self):
+        return self.db.execute("SELECT COUNT(*) FROM prices").fetchone()[0] == 0
+
+    # --- Updating ---
+
+    def refresh(self, regions, offers=OFFERS):
+        """
+        Downloads the Price List files for these regions and keeps the rows we need.
+        Files that didn't change since the last refresh are skipped.
+        """
+        base_url = os.environ.get('AWS_PLAYGROUND_PRICE_LIST_URL', PRICE_LIST_URL)
+        for region in regions:
+            for offer in offers:
+                url = base_url.format(offer=offer, region=region)
+                row = self.db.execute("SELECT last_modified FROM offers WHERE offer = ? AND region = ?",
+                                      (offer, region)).fetchone()
+                request = urllib.request.Request(url)
+                if row and row[0]:
+                    request.add_header('If-Modified-Since', row[0])
+                try:
+                    with urllib.request.urlopen(request, timeout=60) as response:
+                        print(f"Downloading {offer} prices for {region}...")
+                        kept = self._load_csv(region, io.TextIOWrapper(response, encoding='utf-8'))
+                        last_modified = response.headers.get('Last-Modified')
+                except urllib.error.HTTPError as e:
+                    if e.code == 304:
+                        print(f"{offer} prices for {region} are up to date.")
+                    elif e.code in (403, 404):
+                        print(f"No {offer} price list for {region}.")
+                    else:
+                        print(f"Error downloading {url}: {e}")
+                    continue
+                except urllib.error.URLError as e:
+                    print(f"Error downloading {url}: {e.reason}")
+                    continue
+                with self.db:
+                    self.db.execute("INSERT OR REPLACE INTO offers (offer, region, last_modified, fetched_at, rows) "
+                                    "VALUES (?, ?, ?, ?, ?)",
+                                    (offer, region, last_modified,
+                                     datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'), kept))
+                print(f"   kept {kept} prices")
+
+    def _load_csv(self, region, text):
+        # The file starts with a few 'Key, Value' lines (publication date...), then the header row
+        for line in text:
+            if line.startswith('"SKU"'):
+                header = next(csv.reader([line]))
+                break
+        else:
+            return 0
+
+        prices = {}
+        for row in csv.DictReader(text, fieldnames=header):  # Streamed: never the whole file in memory
+            match = _price_row(row)
+            if match is None:
+                continue
+            try:
+                usd = float(row['PricePerUnit'])
+            except (TypeError, ValueError):
+                continue
+            service, key, unit = match
+            # Keep one price per key (the cheapest, e.g. Linux over the rare duplicate rows)
+            if (service, key) not in prices or usd < prices[(service, key)][1]:
+                prices[(service, key)] = (unit, usd)
+
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO prices (region, service, key, unit, usd) VALUES (?, ?, ?, ?, ?)",
+                                [(region, service, key, unit, usd) for (service, key), (unit, usd) in prices.items()])
+        return len(prices)
+
+    # --- Looking up ---
+
+    def price(self, region, service, key):
+        row = self.db.execute("SELECT usd FROM prices WHERE region = ? AND service = ? AND key = ?",
+                              (region, service, key)).fetchone()
+        return row[0] if row else None
+
+    def monthly_cost(self, resource):
+        """
+        Estimated cost per month of keeping this resource (an inventory row) as it is.
+        Returns None when we don't have a price for it.
+        """
+        region = resource.get('region')
+        details = resource.get('details') or {}
+        resource_type = resource['type']
+
+        if resource_type == INSTANCE:
+            hourly = self.price(region, 'ec2', details.get('instance_type'))
+            return round(hourly * HOURS_PER_MONTH, 2) if hourly is not None else None
+        if resource_type == VOLUME:
+            per_gb = self.price(region, 'ebs', details.get('volume_type') or 'gp2')
+            size = details.get('size_gb')
+            return round(per_gb * size, 2) if per_gb is not None and size else None
+        if resource_type == NAT_GATEWAY:
+            hourly = self.price(region, 'nat', 'hours')
+            return round(hourly * HOURS_PER_MONTH, 2) if hourly is not None else None
+        if resource_type == DB_INSTANCE:
+            engine = RDS_ENGINES.get(details.get('engine'), details.get('engine'))
+            hourly = self.price(region, 'rds', f"{details.get('db_class')}|{engine}")
+            return round(hourly * HOURS_PER_MONTH, 2) if hourly is not None else None
+        if resource_type == LAMBDA_FUNCTION:
+            return 0.0  # Pay per use: nothing while it is not called
+        return None
+
+
+def format_cost(monthly):
+    """
+    ' (~$70.08/month)' for audit lines, or '' when the price is unknown.
+    """
+    return f" (~${monthly:,.2f}/month)" if monthly is not None else ""
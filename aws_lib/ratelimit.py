@@ -0,0 +1,52 @@
+"""
+Rate Limiter
+AWS throttles accounts that call an API too fast. When we run many calls at
+once (threads), we use a 'token bucket' to stay under the limit:
+
+- The bucket refills at 'rate' tokens per second, up to 'capacity' tokens.
+- Every API call takes one token. If the bucket is empty, the caller waits.
+
+This spreads calls out evenly instead of sending a burst and getting throttled.
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate: Tokens added per second (= allowed calls per second).
+            capacity: Largest burst allowed. Defaults to one second's worth.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until 'tokens' are available, then takes them.
+        Safe to call from many threads at once.
+
+        Asking for more than 'capacity' is allowed (e.g. one bulk email call
+        that counts as 50 sends): we wait for a full bucket and go 'into debt',
+        so the following callers wait until it is paid back.
+        """
+        needed = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,272 @@
+"""
+Query Results (typed columns for Athena answers)
+Athena returns every value as text, row by row ('ResultSet.Rows[].Data[].VarCharValue').
+This module turns an answer into one typed NumPy array per column instead:
+
+1. Types come from 'ResultSetMetadata.ColumnInfo': integers become int64,
+   double/real/decimal float64, boolean bool, date/timestamp datetime64.
+   Everything else (varchar, arrays, maps...) stays text. NULLs are kept in a
+   separate mask, so an integer column with a NULL is still an integer column.
+2. Results are fetched one page (1000 rows) at a time. The table display prints
+   each page as soon as it arrives, with column widths taken from the first page,
+   and pauses after every screenful in a terminal.
+3. Exports for other tools:
+   - csv: the CSV file Athena already wrote to S3 is downloaded as is (nothing is re-encoded)
+   - json: a list of records with real numbers, booleans and nulls
+   - parquet: the NumPy columns handed to Arrow (needs 'pip install pyarrow')
+
+Usage:
+    result = QueryResult(session, query_id)
+    result.show()
+    result.columns['total_revenue'].values.sum()
+    result.export('parquet', 'answer.parquet')
+"""
+import codecs
+import json
+import shutil
+import sys
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional: only needed for --output parquet
+    pyarrow = None
+
+PAGE_SIZE = 1000    # The most get_query_results returns per call
+MAX_WIDTH = 40      # Longer values are cut in the table display
+MIN_WIDTHS = {'i': 12, 'f': 14, 'b': 5}  # By NumPy kind; anything else fits 'NULL'
+
+INTEGER_TYPES = {'tinyint', 'smallint', 'integer', 'int', 'bigint'}
+FLOAT_TYPES = {'float', 'real', 'double', 'decimal'}  # decimal: float64 is plenty for display and analysis
+
+OUTPUT_FORMATS = ('table', 'csv', 'json', 'parquet')
+
+
+class Column:
+    """
+    One result column: a typed NumPy array plus a NULL mask (True = NULL).
+    """
+
+    def __init__(self, name, athena_type, values, nulls):
+        self.name = name
+        self.type = athena_type
+        self.values = values
+        self.nulls = nulls
+
+    def __len__(self):
+        return len(self.values)
+
+    def python_values(self):
+        """
+        Plain Python values (None for NULL), e.g. for JSON.
+        """
+        if self.values.dtype.kind == 'M':
+            items = [str(v) for v in self.values]
+        else:
+            items = self.values.tolist()
+        return [None if null else item for item, null in zip(items, self.nulls)]
+
+    def text(self):
+        """
+        Display strings for every value.
+        """
+        if self.values.dtype.kind == 'f':
+            items = [f"{v:,.2f}" if abs(v) < 1e15 else f"{v:.6g}" for v in self.values]
+        elif self.values.dtype.kind == 'M':
+            items = [str(v).replace('T', ' ') for v in self.values]
+        else:
+            items = [str(v) for v in self.values]
+        return ['NULL' if null else item for item, null in zip(items, self.nulls)]
+
+
+def _base_type(athena_type):
+    return athena_type.split('(', 1)[0].strip().lower()
+
+
+def decode_column(name, athena_type, raw):
+    """
+    Text values from Athena (None = NULL) -> Column.
+    """
+    nulls = np.fromiter((v is None for v in raw), dtype=bool, count=len(raw))
+    base = _base_type(athena_type)
+    try:
+        if base in INTEGER_TYPES:
+            values = np.array([v if v is not None else '0' for v in raw]).astype(np.int64)
+        elif base in FLOAT_TYPES:
+            values = np.array([v if v is not None else 'nan' for v in raw]).astype(np.float64)
+        elif base == 'boolean':
+            values = np.array([v == 'true' for v in raw], dtype=bool)
+        elif base == 'date':
+            values = np.array([v if v is not None else 'NaT' for v in raw], dtype='datetime64[D]')
+        elif base == 'timestamp':
+            values = np.array([v if v is not None else 'NaT' for v in raw], dtype='datetime64[ms]')
+        else:
+            values = np.array([v if v is not None else '' for v in raw], dtype=object)
+    except ValueError:
+        # Something we can't parse (e.g. a timestamp with a time zone): keep the text
+        values = np.array([v if v is not None else '' for v in raw], dtype=object)
+    return Column(name, athena_type, values, nulls)
+
+
+class QueryResult:
+    """
+    The answer of one finished Athena query, fetched page by page.
+    """
+
+    def __init__(self, session, query_id, page_size=PAGE_SIZE):
+        self.session = session
+        self.query_id = query_id
+        self.page_size = page_size
+        self.athena = session.client('athena')
+        self.column_info = None
+        self._pages = []        # Each page: list of Columns
+        self._next_token = None
+        self._done = False
+
+    def _fetch_page(self):
+        kwargs = {'QueryExecutionId': self.query_id, 'MaxResults': self.page_size}
+        if self._next_token:
+            kwargs['NextToken'] = self._next_token
+        response = self.athena.get_query_results(**kwargs)
+        rows = response['ResultSet']['Rows']
+        if self.column_info is None:
+            self.column_info = response['ResultSet'].get('ResultSetMetadata', {}).get('ColumnInfo', [])
+            if not self.column_info and rows:
+                # No metadata (e.g. a stub): every column is text, named by the header row
+                self.column_info = [{'Name': d.get('VarCharValue', f'_col{i}'), 'Type': 'varchar'}
+                                    for i, d in enumerate(rows[0]['Data'])]
+            # A SELECT's first row repeats the column names
+            names = [c['Name'] for c in self.column_info]
+            if rows and [d.get('VarCharValue') for d in rows[0]['Data']] == names:
+                rows = rows[1:]
+        self._next_token = response.get('NextToken')
+        self._done = not self._next_token
+
+        page = []
+        for i, info in enumerate(self.column_info):
+            raw = [row['Data'][i].get('VarCharValue') if i < len(row['Data']) else None for row in rows]
+            page.append(decode_column(info['Name'], info['Type'], raw))
+        self._pages.append(page)
+        return page
+
+    def pages(self):
+        """
+        Yields one list of Columns per page: first the pages already fetched, then new ones.
+        """
+        yield from list(self._pages)
+        while not self._done:
+            yield self._fetch_page()
+
+    @property
+    def columns(self):
+        """
+        {name: Column} for the whole result (fetches every page).
+        """
+        pages = list(self.pages())
+        columns = {}
+        for i, info in enumerate(self.column_info or []):
+            parts = [page[i] for page in pages]
+            columns[info['Name']] = Column(info['Name'], info['Type'],
+                                           np.concatenate([p.values for p in parts]),
+                                           np.concatenate([p.nulls for p in parts]))
+        return columns
+
+    def __len__(self):
+        return sum(len(page[0]) if page else 0 for page in self.pages())
+
+    def __bool__(self):
+        return True  # A finished query, even with no rows (len() would fetch every page)
+
+    # --- Display ---
+
+    def show(self, out=None, interactive=None):
+        """
+        Prints the result as an aligned table, page by page.
+        In a terminal it pauses after each screenful (Enter = more, q = stop).
+        """
+        out = out or sys.stdout
+        if interactive is None:
+            interactive = out.isatty() and sys.stdin.isatty()
+        screen = max(shutil.get_terminal_size().lines - 3, 5)
+
+        widths, aligns, printed = None, None, 0
+        print("\n--- 📊 Results ---", file=out)
+        for page in self.pages():
+            texts = [column.text() for column in page]
+            if widths is None:
+                # Widths from the header and the first page; later pages are cut to fit
+                # (at least room for NULL / False, and for a 12-digit number: numbers are never cut)
+                widths = [min(max([len(c.name), MIN_WIDTHS.get(c.values.dtype.kind, 4)] + [len(t) for t in text]), MAX_WIDTH)
+                          for c, text in zip(page, texts)]
+                aligns = ['>' if c.values.dtype.kind in 'iuf' else '<' for c in page]
+                print(" | ".join(f"{c.name[:w]:{a}{w}}" for c, w, a in zip(page, widths, aligns)), file=out)
+                print("-+-".join('-' * w for w in widths), file=out)
+            for row in zip(*texts):
+                cells = [v if len(v) <= w or a == '>' else v[:w - 1] + '…' for v, w, a in zip(row, widths, aligns)]
+                print(" | ".join(f"{v:{a}{w}}" for v, w, a in zip(cells, widths, aligns)), file=out)
+                printed += 1
+                if interactive and printed % screen == 0:
+                    if input("-- more (Enter), q to stop -- ").strip().lower() == 'q':
+                        print("------------------\n", file=out)
+                        return
+        print(f"------------------ {printed} row(s)\n", file=out)
+
+    # --- Exports ---
+
+    def export(self, output_format, path=None):
+        """
+        Writes the result as csv, json or parquet to path (csv/json: stdout when path is None).
+        """
+        if output_format == 'csv':
+            self._export_csv(path)
+        elif output_format == 'json':
+            columns = self.columns
+            values = [column.python_values() for column in columns.values()]
+            records = [dict(zip(columns, row)) for row in zip(*values)]
+            if path:
+                with open(path, 'w') as f:
+                    json.dump(records, f, indent=1)
+            else:
+                json.dump(records, sys.stdout, indent=1)
+                print()
+        elif output_format == 'parquet':
+            if pyarrow is None:
+                raise ValueError("--output parquet needs the 'pyarrow' package (pip install pyarrow).")
+            if not path:
+                raise ValueError("--output parquet needs --output-file.")
+            arrays, names = [], []
+            for name, column in self.columns.items():
+                values = column.values if column.values.dtype != object else column.values.tolist()
+                arrays.append(pyarrow.array(values, mask=column.nulls))
+                names.append(name)
+            pyarrow.parquet.write_table(pyarrow.Table.from_arrays(arrays, names=names), path)
+        else:
+            raise ValueError(f"Unknown output format '{output_format}' (use {', '.join(OUTPUT_FORMATS)}).")
+        if path:
+            print(f"Wrote {output_format} to {path}")
+
+    def _export_csv(self, path):
+        """
+        Athena already wrote the answer as CSV to S3: download that file instead of re-encoding it.
+        """
+        execution = self.athena.get_query_execution(QueryExecutionId=self.query_id)['QueryExecution']
+        location = execution['ResultConfiguration']['OutputLocation']
+        bucket, _, key = location.replace('s3://', '', 1).partition('/')
+        s3 = self.session.client('s3')
+        if path:
+            s3.download_file(bucket, key, path)
+        else:
+            body = s3.get_object(Bucket=bucket, Key=key)['Body']
+            # Text-only streams (e.g. the daemon's socket writer) have no binary 'buffer'
+            binary = getattr(sys.stdout, 'buffer', None)
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            for chunk in iter(lambda: body.read(1024 * 1024), b''):
+                if binary is not None:
+                    binary.write(chunk)
+                else:
+                    sys.stdout.write(decoder.decode(chunk))
+            if binary is None:
+                sys.stdout.write(decoder.decode(b'', final=True))
+            sys.stdout.flush()
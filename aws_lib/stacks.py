@@ -1,13 +1,25 @@
 import botocore
 from botocore.exceptions import ClientError
+import threading
 import time
 import os
 
+from aws_lib.templates import TemplatePackager
+
 class StackManager:
     """
     The 'Builder' class.
     It talks to AWS CloudFormation to create, update, or delete lists of resources (Stacks).
     It also helps with S3 bucket tasks (uploading files).
+
+    Stack descriptions (status, outputs, parameters) are remembered for the
+    rest of the run, so checking a status and then reading an output costs one
+    'describe_stacks' call. Our own create/update/delete forget the stack, so
+    the next lookup sees the new state. Commands that touch many stacks can
+    call load_stacks() first: one paginated call describes all of them.
+
+    Templates are checked locally and, when too big for 'TemplateBody' (or
+    when they contain nested stacks), uploaded to S3 first (see templates.py).
     """
 
     def __init__(self, session):
@@ -21,18 +33,67 @@ class StackManager:
         self.s3 = session.resource('s3')
         # Client for lower-level S3 commands
         self.s3_client = session.client('s3')
+        # Local validation + S3 packaging of big / nested templates
+        self.templates = TemplatePackager(session)
+
+        # Stack name -> description from describe_stacks (None = doesn't exist)
+        self._stacks = {}
+        self._all_loaded = False  # True after load_stacks(): missing names don't exist
+        self._stale = set()       # Stacks we changed since load_stacks()
+        self._lock = threading.Lock()  # Deploys may run in parallel threads
+
+    def load_stacks(self):
+        """
+        Describes every stack in the region with one paginated call and keeps
+        the results, so later lookups don't call AWS at all.
+        """
+        stacks = {}
+        paginator = self.cfn.get_paginator('describe_stacks')
+        for page in paginator.paginate():
+            for stack in page['Stacks']:
+                stacks[stack['StackName']] = stack
+        with self._lock:
+            self._stacks = stacks
+            self._all_loaded = True
+            self._stale.clear()
+
+    def describe(self, stack_name):
+        """
+        The stack's description (a dict), or None if it doesn't exist.
+        Cached until we change the stack (see invalidate).
+        """
+        with self._lock:
+            if stack_name in self._stacks:
+                return self._stacks[stack_name]
+            if self._all_loaded and stack_name not in self._stale:
+                return None
+        try:
+            stack = self.cfn.describe_stacks(StackName=stack_name)['Stacks'][0]
+        except ClientError as e:
+            if 'does not exist' not in str(e):
+                return None  # Throttling, permissions...: don't remember an answer we didn't get
+            stack = None
+        with self._lock:
+            self._stacks[stack_name] = stack
+            self._stale.discard(stack_name)
+        return stack
+
+    def invalidate(self, stack_name):
+        """
+        Forgets what we know about a stack (call after changing it).
+        """
+        with self._lock:
+            self._stacks.pop(stack_name, None)
+            self._stale.add(stack_name)
 
     def stack_exists(self, stack_name):
         """
         Checks if a stack with this name already exists in AWS.
         Returns the status (like 'CREATE_COMPLETE') if yes, or None if no.
         """
-        try:
-            data = self.cfn.describe_stacks(StackName=stack_name)
-            return data['Stacks'][0]['StackStatus']
-        except ClientError:
-            # If AWS says "I can't find that stack", we catch the error and return None
-            return None
+        stack = self.describe(stack_name)
+        # If AWS said "I can't find that stack", describe() gave us None
+        return stack['StackStatus'] if stack else None
 
     def _wait_for_completion(self, stack_name, operation):
         """
@@ -51,8 +112,13 @@ class StackManager:
         try:
             waiter.wait(StackName=stack_name)
             print(f"{stack_name} {operation} complete.")
+            return True
         except Exception as e:
             print(f"Error waiting for stack {operation}: {e}")
+            return False
+        finally:
+            # The status and outputs changed: read them again next time
+            self.invalidate(stack_name)
 
     def deploy(self, stack_name, template_path, parameters=None):
         """
@@ -60,15 +126,30 @@ class StackManager:
         1. Reads your YAML blueprint.
         2. Checks if the stack exists.
         3. Creates it (if new) or Updates it (if existing).
+
+        Returns True if the stack is in a good state afterwards, False if something failed.
         """
         # A. Read the Blueprint file
         if not os.path.exists(template_path):
             print(f"Error: Template {template_path} not found.")
-            return
+            return False
 
         with open(template_path, 'r') as f:
             template_body = f.read()
 
+        # Catch template mistakes here, before any slow round trip to CloudFormation
+        errors = self.templates.validate(template_body)
+        if errors:
+            print(f"Error: {template_path} is not valid:")
+            for error in errors:
+                print(f"   - {error}")
+            return False
+        try:
+            template = self.templates.package(template_path, template_body)  # TemplateBody or TemplateURL
+        except (ValueError, OSError, ClientError) as e:
+            print(f"Error packaging {template_path}: {e}")
+            return False
+
         # B. Format the Parameters (Questions/Answers for the template)
         params = []
         if parameters:
@@ -84,30 +165,32 @@ class StackManager:
             try:
                 self.cfn.create_stack(
                     StackName=stack_name,
-                    TemplateBody=template_body,
+                    **template,
                     Parameters=params,
                     Capabilities=['CAPABILITY_NAMED_IAM'] # Permission to name things (like Roles) explicitely
                 )
-                self._wait_for_completion(stack_name, 'create')
+                return self._wait_for_completion(stack_name, 'create')
             except ClientError as e:
                 print(f"Error creating stack: {e}")
+                return False
         else:
             # --- UPDATE EXISTING ---
             print(f"Updating stack: {stack_name}")
             try:
                 self.cfn.update_stack(
                     StackName=stack_name,
-                    TemplateBody=template_body,
+                    **template,
                     Parameters=params,
                     Capabilities=['CAPABILITY_NAMED_IAM']
                 )
-                self._wait_for_completion(stack_name, 'update')
+                return self._wait_for_completion(stack_name, 'update')
             except ClientError as e:
                 # AWS throws an error if we say "Update" but changed nothing. We ignore that specific error.
                 if "No updates are to be performed" in str(e):
                     print(f"No changes for {stack_name}.")
-                else:
-                    print(f"Error updating stack: {e}")
+                    return True
+                print(f"Error updating stack: {e}")
+                return False
 
     def destroy(self, stack_name):
         """
@@ -121,19 +204,108 @@ class StackManager:
         else:
             print(f"Stack {stack_name} does not exist.")
 
+    def detect_drift(self, stack_names, timeout=15 * 60):
+        """
+        Checks whether anyone changed these stacks' resources by hand.
+
+        All detections are started at once and then polled together, so the
+        whole check takes about as long as the slowest stack. Each stack's
+        report is printed as soon as its detection finishes.
+
+        Returns {stack name: 'IN_SYNC' / 'DRIFTED' / 'UNKNOWN' / 'NOT_FOUND' / 'FAILED'}.
+        """
+        results = {}
+        pending = {}  # detection id -> stack name
+
+        # 1. Start every detection (they run on AWS's side, in parallel)
+        for name in stack_names:
+            if not self.stack_exists(name):
+                print(f"Stack {name} does not exist.")
+                results[name] = 'NOT_FOUND'
+                continue
+            try:
+                detection_id = self.cfn.detect_stack_drift(StackName=name)['StackDriftDetectionId']
+                pending[detection_id] = name
+            except ClientError as e:
+                print(f"Error starting drift detection for {name}: {e}")
+                results[name] = 'FAILED'
+        if pending:
+            print(f"Checking {len(pending)} stacks for drift...")
+
+        # 2. One loop polls all of them, waiting a little longer each round
+        interval = 1.0
+        deadline = time.monotonic() + timeout
+        while pending:
+            for detection_id, name in list(pending.items()):
+                try:
+                    status = self.cfn.describe_stack_drift_detection_status(StackDriftDetectionId=detection_id)
+                except ClientError as e:
+                    print(f"Error checking drift for {name}: {e}")
+                    results[name] = 'FAILED'
+                    del pending[detection_id]
+                    continue
+                if status['DetectionStatus'] == 'DETECTION_IN_PROGRESS':
+                    continue
+                del pending[detection_id]
+                if status['DetectionStatus'] == 'DETECTION_FAILED' and status.get('StackDriftStatus') is None:
+                    print(f"\n[ERROR] {name}: drift detection failed ({status.get('DetectionStatusReason')})")
+                    results[name] = 'FAILED'
+                    continue
+                results[name] = status.get('StackDriftStatus', 'UNKNOWN')
+                self._print_drift(name, status)
+            if not pending:
+                break
+            if time.monotonic() > deadline:
+                for name in pending.values():
+                    print(f"Timed out waiting for the drift detection of {name}.")
+                    results[name] = 'FAILED'
+                break
+            time.sleep(interval)
+            interval = min(interval * 1.5, 10.0)
+        return results
+
+    def _print_drift(self, stack_name, status):
+        """
+        Prints one stack's drift result, with the changed properties of each drifted resource.
+        """
+        drift = status.get('StackDriftStatus', 'UNKNOWN')
+        if drift != 'DRIFTED':
+            print(f"\n[OK] {stack_name}: {drift}")
+            if status.get('DetectionStatus') == 'DETECTION_FAILED':
+                # Some resource types can't be checked; the others were
+                print(f"   (partly checked: {status.get('DetectionStatusReason')})")
+            return
+
+        print(f"\n[DRIFTED] {stack_name}: {status.get('DriftedStackResourceCount', '?')} resources changed outside CloudFormation")
+        paginator = self.cfn.get_paginator('describe_stack_resource_drifts')
+        for page in paginator.paginate(StackName=stack_name,
+                                       StackResourceDriftStatusFilters=['MODIFIED', 'DELETED']):
+            for resource in page['StackResourceDrifts']:
+                print(f"   - {resource['LogicalResourceId']} ({resource['ResourceType']}): "
+                      f"{resource['StackResourceDriftStatus']}")
+                for diff in resource.get('PropertyDifferences', []):
+                    print(f"       {diff['DifferenceType']:<8} {diff['PropertyPath']}: "
+                          f"expected {diff.get('ExpectedValue')!s}, actual {diff.get('ActualValue')!s}")
+
     def get_output(self, stack_name, output_key):
         """
         Reads the 'Outputs' section of a built stack.
         Useful for getting the WebsiteURL after it's built.
         """
-        try:
-            response = self.cfn.describe_stacks(StackName=stack_name)
-            outputs = response['Stacks'][0].get('Outputs', [])
-            for o in outputs:
-                if o['OutputKey'] == output_key:
-                    return o['OutputValue']
-        except Exception:
-            pass
+        stack = self.describe(stack_name)
+        for o in (stack or {}).get('Outputs', []):
+            if o['OutputKey'] == output_key:
+                return o['OutputValue']
+        return None
+
+    def get_parameter(self, stack_name, parameter_key):
+        """
+        Reads the value a built stack was given for one of its Parameters.
+        """
+        stack = self.describe(stack_name)
+        for p in (stack or {}).get('Parameters', []):
+            if p['ParameterKey'] == parameter_key:
+                return p.get('ResolvedValue', p.get('ParameterValue'))
         return None
 
     def empty_bucket(self, bucket_name):
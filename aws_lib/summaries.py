@@ -0,0 +1,469 @@
+"""
+Summary Tables (materialized aggregates for the AI agent)
+Most agent questions are 'revenue / price / quantity by category' or 'by month'.
+Each of them reads the whole orders table again. This module:
+
+1. Remembers the 'shape' of every query the agent ran: which table, grouped by
+   which columns (or months/days of a date column), aggregating which columns.
+   (~/.aws_playground/agent/query_shapes.json)
+2. Turns the shapes that come up often into small Parquet tables with one CTAS
+   ('CREATE TABLE ... AS SELECT') each, e.g. 'summary_clean_orders_by_category'.
+   Every aggregated column is stored as sum / count / min / max, so any of
+   SUM, AVG (= sum / count), MIN, MAX, COUNT can be answered from it, also
+   for coarser groupings.
+3. Refreshes them when the source data changed (after an ETL run):
+   - summaries are rebuilt into a new folder and the table is switched over to
+     it in one Glue update;
+   - only when the data is append-only (refresh(append_only=True), and no
+     existing file was rewritten or removed) are the time buckets from the last
+     refresh onwards recomputed instead. The ETL job overwrites its output, so
+     by default every changed summary is rebuilt.
+4. Describes the summaries to the model (see DataAgent.generate_sql), so it
+   queries them instead of the big table whenever they have the columns it needs.
+
+Usage:
+    python cli.py agent summaries            # build summaries for frequent questions
+    python cli.py agent refresh-summaries    # after the ETL job ran
+"""
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+from aws_lib.core import get_cache_dir
+
+# How often a query shape must come up before it gets a summary table
+MIN_HITS = 3
+MAX_SUMMARIES = 10
+
+# Glue table parameters that mark (and describe) our summary tables
+SUMMARY_PARAMETER = 'playground_summary'
+WATERMARK_PARAMETER = 'playground_summary_watermark'
+SOURCE_PARAMETER = 'playground_summary_source'
+
+TIME_UNITS = ('year', 'quarter', 'month', 'week', 'day')
+
+_FROM = re.compile(r'\bFROM\s+"?(\w+)"?(?:\s*\.\s*"?(\w+)"?)?', re.IGNORECASE)
+_GROUP_BY = re.compile(r'\bGROUP\s+BY\s+(.*?)(?=\bHAVING\b|\bORDER\s+BY\b|\bLIMIT\b|$)', re.IGNORECASE | re.DOTALL)
+_AGG = re.compile(r'\b(SUM|AVG|MIN|MAX|COUNT)\s*\(\s*(DISTINCT\s+)?([\w\s.*+\-/()]*?)\s*\)', re.IGNORECASE)
+_DATE_TRUNC = re.compile(r"^date_trunc\s*\(\s*'(\w+)'\s*,\s*(?:CAST\s*\(\s*)?\"?(\w+)\"?(?:\s+AS\s+\w+\s*\))?\s*\)$", re.IGNORECASE)
+_DATE_PART = re.compile(r'^(year|quarter|month|week|day)\s*\(\s*"?(\w+)"?\s*\)$', re.IGNORECASE)
+_IDENTIFIER = re.compile(r'^"?(\w+)"?$')
+
+
+def _name(text):
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')
+
+
+def query_shape(sql, default_database):
+    """
+    The shape of an aggregate query over one table, or None if it isn't one
+    we can materialize (joins, subqueries, COUNT(DISTINCT ...)...).
+
+    Returns {'table': 'db.table', 'dimensions': [...], 'measures': [...]}, where a
+    dimension is {'column': 'category'} or {'column': 'order_date', 'unit': 'month'}
+    and a measure is a column or simple expression ('price * quantity').
+    """
+    sql = sql.strip().rstrip(';')
+    if len(re.findall(r'\bSELECT\b', sql, re.IGNORECASE)) != 1 or re.search(r'\b(JOIN|UNION)\b', sql, re.IGNORECASE):
+        return None
+    tables = _FROM.findall(sql)
+    group_by = _GROUP_BY.search(sql)
+    if len(tables) != 1 or not group_by:
+        return None
+    database, table = tables[0]
+    table = f"{database}.{table}" if table else f"{default_database}.{database}"
+
+    dimensions = []
+    for expression in [e.strip() for e in re.split(r',(?![^(]*\))', group_by.group(1)) if e.strip()]:
+        trunc, part, plain = _DATE_TRUNC.match(expression), _DATE_PART.match(expression), _IDENTIFIER.match(expression)
+        if trunc and trunc.group(1).lower() in TIME_UNITS:
+            dimensions.append({'column': trunc.group(2), 'unit': trunc.group(1).lower()})
+        elif part:
+            dimensions.append({'column': part.group(2), 'unit': part.group(1).lower()})
+        elif plain and not plain.group(1).isdigit():
+            dimensions.append({'column': plain.group(1)})
+        else:
+            return None  # GROUP BY 1, or an expression we don't understand
+
+    measures = set()
+    for function, distinct, argument in _AGG.findall(sql):
+        if distinct:
+            return None  # Distinct counts can't be added up from partial results
+        argument = ' '.join(argument.split())
+        if argument and argument != '*':
+            measures.add(argument)
+    return {'table': table, 'dimensions': dimensions, 'measures': sorted(measures)}
+
+
+def shape_key(shape):
+    dims = ",".join(f"{d['column']}:{d.get('unit', '')}" for d in shape['dimensions'])
+    return f"{shape['table']}|{dims}|{','.join(shape['measures'])}"
+
+
+def _version():
+    return datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')
+
+
+def _dimension_name(dimension):
+    return f"{dimension['column']}_{dimension['unit']}" if dimension.get('unit') else dimension['column']
+
+
+def _dimension_sql(dimension):
+    if dimension.get('unit'):
+        # Stored as 'YYYY-MM-DD' of the bucket start, so it works as a partition value
+        return f"CAST(date_trunc('{dimension['unit']}', CAST(\"{dimension['column']}\" AS date)) AS varchar)"
+    return f"\"{dimension['column']}\""
+
+
+class SummaryManager:
+    """
+    Usage:
+        manager = SummaryManager(session, 'edu_etl_db', 's3://bucket/athena-results/', 's3://bucket/summaries/')
+        manager.record(sql)                 # after every agent query
+        manager.materialize()               # CTAS for the frequent shapes
+        manager.refresh()                   # after an ETL run
+        manager.describe_for_prompt()       # text for the model
+    """
+
+    def __init__(self, session, database, results_location, data_location):
+        self.session = session
+        self.database = database
+        self.results_location = results_location
+        self.data_location = data_location.rstrip('/') + '/'
+        self.athena = session.client('athena')
+        self.glue = session.client('glue')
+        self.s3 = session.client('s3')
+        self.shapes_path = os.path.join(get_cache_dir('agent'), 'query_shapes.json')
+        self.failed = []  # Summaries the last refresh() could not bring up to date
+
+    # --- 1. Tracking query shapes ---
+
+    def _load_shapes(self):
+        try:
+            with open(self.shapes_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, sql):
+        """
+        Counts this query's shape. Returns the shape (or None).
+        """
+        shape = query_shape(sql, self.database)
+        if shape is None or not shape['measures'] or shape['table'].split('.', 1)[1].startswith('summary_'):
+            return None
+        shapes = self._load_shapes()
+        entry = shapes.setdefault(shape_key(shape), dict(shape, hits=0))
+        entry['hits'] += 1
+        entry['last_seen'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        with open(self.shapes_path, 'w') as f:
+            json.dump(shapes, f, indent=2)
+        return shape
+
+    # --- Running Athena statements ---
+
+    def _execute(self, sql):
+        """
+        Runs one statement and waits. Returns True on success.
+        """
+        query_id = self.athena.start_query_execution(
+            QueryString=sql,
+            QueryExecutionContext={'Database': self.database},
+            ResultConfiguration={'OutputLocation': self.results_location},
+        )['QueryExecutionId']
+        interval = 0.5
+        while True:
+            status = self.athena.get_query_execution(QueryExecutionId=query_id)['QueryExecution']['Status']
+            if status['State'] == 'SUCCEEDED':
+                return True
+            if status['State'] in ('FAILED', 'CANCELLED'):
+                print(f"   ❌ {status.get('StateChangeReason', status['State'])}")
+                return False
+            time.sleep(interval)
+            interval = min(interval * 1.5, 5.0)
+
+    def _delete_prefix(self, location):
+        bucket, _, prefix = location.replace('s3://', '', 1).partition('/')
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+            if keys:
+                self.s3.delete_objects(Bucket=bucket, Delete={'Objects': keys, 'Quiet': True})
+
+    def _source_files(self, table):
+        """
+        [(last modified, size)] for every file of the source table.
+        """
+        database, name = table.split('.', 1)
+        location = self.glue.get_table(DatabaseName=database, Name=name)['Table']['StorageDescriptor']['Location']
+        bucket, _, prefix = location.replace('s3://', '', 1).partition('/')
+        files = []
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix.rstrip('/') + '/'):
+            files += [(obj['LastModified'].isoformat(), obj['Size']) for obj in page.get('Contents', [])]
+        return files
+
+    @staticmethod
+    def _signature(files):
+        """
+        Changes whenever the files change: 'count:size:newest write'.
+        """
+        return f"{len(files)}:{sum(size for _, size in files)}:{max((m for m, _ in files), default='')}"
+
+    @staticmethod
+    def _only_appended(files, previous):
+        """
+        True if the files from the previous signature are all still there, unchanged
+        (everything written since is new). An overwrite rewrites them all.
+        """
+        try:
+            count, size, newest = previous.split(':', 2)
+        except (AttributeError, ValueError):
+            return False
+        old = [s for m, s in files if m <= newest]
+        return len(old) == int(count) and sum(old) == int(size)
+
+    def _source_signature(self, table):
+        return self._signature(self._source_files(table))
+
+    # --- 2. Building summary tables ---
+
+    @staticmethod
+    def table_name(shape):
+        source = shape['table'].split('.', 1)[1]
+        dims = "_".join(_dimension_name(d) for d in shape['dimensions']) or 'all'
+        return f"summary_{source}_by_{dims}"[:250]
+
+    def _select(self, shape, where=None):
+        """
+        The aggregate SELECT behind a summary (time bucket last: it is the partition column).
+        """
+        dims = sorted(shape['dimensions'], key=lambda d: bool(d.get('unit')))
+        columns = [f"{_dimension_sql(d)} AS \"{_dimension_name(d)}\"" for d in dims if not d.get('unit')]
+        columns.append("COUNT(*) AS row_count")
+        for measure in shape['measures']:
+            alias = _name(measure)
+            columns += [f"SUM({measure}) AS sum_{alias}", f"COUNT({measure}) AS count_{alias}",
+                        f"MIN({measure}) AS min_{alias}", f"MAX({measure}) AS max_{alias}"]
+        columns += [f"{_dimension_sql(d)} AS \"{_dimension_name(d)}\"" for d in dims if d.get('unit')]
+        sql = f"SELECT {', '.join(columns)} FROM {shape['table']}"
+        if where:
+            sql += f" WHERE {where}"
+        if dims:
+            sql += " GROUP BY " + ", ".join(_dimension_sql(d) for d in dims)
+        return sql
+
+    def _ctas(self, name, shape, location):
+        time_dims = [_dimension_name(d) for d in shape['dimensions'] if d.get('unit')]
+        options = [f"format = 'PARQUET'", f"external_location = '{location}'"]
+        if time_dims:
+            options.append(f"partitioned_by = ARRAY['{time_dims[-1]}']")
+        return f"CREATE TABLE {self.database}.{name} WITH ({', '.join(options)}) AS {self._select(shape)}"
+
+    def _tag(self, name, shape, watermark, signature):
+        """
+        Stores what the summary is (and how fresh) in its Glue table parameters.
+        """
+        table = self.glue.get_table(DatabaseName=self.database, Name=name)['Table']
+        parameters = dict(table.get('Parameters', {}))
+        parameters[SUMMARY_PARAMETER] = json.dumps({k: shape[k] for k in ('table', 'dimensions', 'measures')})
+        parameters[SOURCE_PARAMETER] = signature
+        if watermark:
+            parameters[WATERMARK_PARAMETER] = watermark
+        self._update_table(table, Parameters=parameters)
+
+    def _update_table(self, table, **changes):
+        # update_table wants a TableInput: the table minus the read-only fields
+        allowed = ('Name', 'Description', 'Owner', 'Retention', 'StorageDescriptor', 'PartitionKeys',
+                   'TableType', 'Parameters')
+        table_input = {k: v for k, v in table.items() if k in allowed}
+        table_input.update(changes)
+        self.glue.update_table(DatabaseName=self.database, TableInput=table_input)
+
+    def _max_bucket(self, name, shape):
+        """
+        The newest time bucket in a summary ('2024-06-01'), used as the refresh watermark.
+        """
+        time_dims = [_dimension_name(d) for d in shape['dimensions'] if d.get('unit')]
+        if not time_dims:
+            return None
+        values = []
+        paginator = self.glue.get_paginator('get_partitions')
+        for page in paginator.paginate(DatabaseName=self.database, TableName=name):
+            values += [p['Values'][0] for p in page['Partitions']]
+        return max(values) if values else None
+
+    def materialize(self, min_hits=MIN_HITS, limit=MAX_SUMMARIES):
+        """
+        Creates summary tables for the query shapes seen at least min_hits times.
+        """
+        existing = {s['name'] for s in self.summaries()}
+        frequent = sorted((s for s in self._load_shapes().values() if s['hits'] >= min_hits),
+                          key=lambda s: -s['hits'])[:limit]
+        if not frequent:
+            print(f"No question shape was asked {min_hits}+ times yet.")
+        for shape in frequent:
+            name = self.table_name(shape)
+            if name in existing:
+                print(f"✅ {name} exists ({shape['hits']} questions).")
+                continue
+            location = f"{self.data_location}{name}/{_version()}/"
+            print(f"Building {name} ({shape['hits']} questions)...")
+            signature = self._source_signature(shape['table'])
+            if self._execute(self._ctas(name, shape, location)):
+                self._tag(name, shape, self._max_bucket(name, shape), signature)
+                print(f"✅ {self.database}.{name} created.")
+
+    # --- 3. Refreshing after ETL runs ---
+
+    def summaries(self):
+        """
+        The summary tables in the database: [{'name', 'shape', 'watermark', 'source', 'table'}].
+        """
+        found = []
+        paginator = self.glue.get_paginator('get_tables')
+        for page in paginator.paginate(DatabaseName=self.database):
+            for table in page['TableList']:
+                parameters = table.get('Parameters', {})
+                if SUMMARY_PARAMETER in parameters:
+                    found.append({'name': table['Name'], 'shape': json.loads(parameters[SUMMARY_PARAMETER]),
+                                  'watermark': parameters.get(WATERMARK_PARAMETER),
+                                  'source': parameters.get(SOURCE_PARAMETER), 'table': table})
+        return found
+
+    def refresh(self, force=False, append_only=False):
+        """
+        Brings every summary up to date with its source table.
+        append_only: the source only ever gets new rows, in new time buckets.
+                     Time-bucketed summaries then only recompute the buckets from
+                     the last refresh on (if no existing file was rewritten).
+        Returns the names of the summaries that were refreshed; the ones whose
+        refresh failed end up in 'self.failed'.
+        """
+        refreshed, self.failed = [], []
+        for summary in self.summaries():
+            name, shape = summary['name'], summary['shape']
+            files = self._source_files(shape['table'])
+            signature = self._signature(files)
+            if signature == summary['source'] and not force:
+                continue
+            time_dims = [d for d in shape['dimensions'] if d.get('unit')]
+            incremental = time_dims and summary['watermark'] and append_only and not force
+            if incremental and not self._only_appended(files, summary['source']):
+                print(f"   {name}: source files were rewritten, not just added. Rebuilding.")
+                incremental = False
+            if incremental:
+                ok = self._refresh_from_watermark(summary, time_dims[-1])
+            else:
+                ok = self._rebuild(summary)
+            if ok:
+                self._tag(name, shape, self._max_bucket(name, shape), signature)
+                refreshed.append(name)
+            else:
+                self.failed.append(name)
+        return refreshed
+
+    def _refresh_from_watermark(self, summary, time_dim):
+        """
+        Recomputes the time buckets from the last refresh onwards (older buckets are kept).
+        """
+        name, watermark = summary['name'], summary['watermark']
+        print(f"Refreshing {name} from {watermark} on...")
+        # Remove the buckets we recompute (their files, and their Glue partitions)
+        partitions = []
+        paginator = self.glue.get_paginator('get_partitions')
+        for page in paginator.paginate(DatabaseName=self.database, TableName=name):
+            partitions += [p for p in page['Partitions'] if p['Values'][0] >= watermark]
+        for partition in partitions:
+            self._delete_prefix(partition['StorageDescriptor']['Location'].rstrip('/') + '/')
+        for start in range(0, len(partitions), 25):
+            self.glue.batch_delete_partition(
+                DatabaseName=self.database, TableName=name,
+                PartitionsToDelete=[{'Values': p['Values']} for p in partitions[start:start + 25]])
+
+        where = f"{_dimension_sql(time_dim)} >= '{watermark}'"
+        return self._execute(f"INSERT INTO {self.database}.{name} {self._select(summary['shape'], where)}")
+
+    def _rebuild(self, summary):
+        """
+        Builds the summary again in a new folder, then points the table at it.
+        Readers see the old or the new data, never a half-written table.
+        """
+        name, shape, table = summary['name'], summary['shape'], summary['table']
+        print(f"Rebuilding {name}...")
+        location = f"{self.data_location}{name}/{_version()}/"  # CTAS needs an empty folder
+        staging = f"{name}__staging"
+        self._execute(f"DROP TABLE IF EXISTS {self.database}.{staging}")
+        if not self._execute(self._ctas(staging, shape, location)):
+            return False
+
+        new = self.glue.get_table(DatabaseName=self.database, Name=staging)['Table']
+        old_location = table['StorageDescriptor']['Location']
+        self._update_table(table, StorageDescriptor=new['StorageDescriptor'],
+                           PartitionKeys=new.get('PartitionKeys', []))
+        if new.get('PartitionKeys') or table.get('PartitionKeys'):
+            if not self._swap_partitions(name, staging):
+                # Some buckets may still point at the old folder: keep it (and the staging table)
+                print(f"   ❌ {name}: partitions were not all switched. Run 'agent refresh-summaries --force' again.")
+                return False
+        self.glue.delete_table(DatabaseName=self.database, Name=staging)  # Keeps the files
+        if old_location.rstrip('/') != location.rstrip('/'):
+            self._delete_prefix(old_location.rstrip('/') + '/')
+        return True
+
+    def _partitions(self, name):
+        partitions = {}
+        paginator = self.glue.get_paginator('get_partitions')
+        for page in paginator.paginate(DatabaseName=self.database, TableName=name):
+            for p in page['Partitions']:
+                partitions[tuple(p['Values'])] = {'Values': p['Values'], 'StorageDescriptor': p['StorageDescriptor']}
+        return partitions
+
+    def _swap_partitions(self, name, staging):
+        """
+        Makes the summary's Glue partitions those of the staging table: buckets in
+        both are pointed at the new files, new ones added, vanished ones removed.
+        Returns False if Glue refused any of them (it reports per partition, it doesn't raise).
+        """
+        old, new = self._partitions(name), self._partitions(staging)
+        errors = []
+        kept = [values for values in new if values in old]
+        for start in range(0, len(kept), 100):
+            response = self.glue.batch_update_partition(
+                DatabaseName=self.database, TableName=name,
+                Entries=[{'PartitionValueList': list(values), 'PartitionInput': new[values]}
+                         for values in kept[start:start + 100]])
+            errors += response.get('Errors', [])
+        added = [new[values] for values in new if values not in old]
+        for start in range(0, len(added), 100):
+            response = self.glue.batch_create_partition(DatabaseName=self.database, TableName=name,
+                                                        PartitionInputList=added[start:start + 100])
+            errors += response.get('Errors', [])
+        removed = [{'Values': list(values)} for values in old if values not in new]
+        for start in range(0, len(removed), 25):
+            response = self.glue.batch_delete_partition(DatabaseName=self.database, TableName=name,
+                                                        PartitionsToDelete=removed[start:start + 25])
+            errors += response.get('Errors', [])
+        for error in errors[:5]:
+            values = error.get('PartitionValues') or error.get('PartitionValueList')
+            print(f"   ❌ Partition {values}: {error.get('ErrorDetail', {}).get('ErrorMessage')}")
+        return not errors
+
+    # --- 4. Telling the model ---
+
+    def describe_for_prompt(self):
+        """
+        Text for the model listing the summary tables, or '' when there are none.
+        """
+        lines = []
+        for summary in self.summaries():
+            shape = summary['shape']
+            dims = [_dimension_name(d) + (f" (start of the {d['unit']}, 'YYYY-MM-DD' text)" if d.get('unit') else '')
+                    for d in shape['dimensions']]
+            measures = [f"{m} -> sum_{_name(m)}, count_{_name(m)}, min_{_name(m)}, max_{_name(m)}" for m in shape['measures']]
+            lines.append(f"Table: {self.database}.{summary['name']} (pre-aggregated from {shape['table']})\n"
+                         f"Grouped by: {', '.join(dims) or 'nothing (one row)'}\n"
+                         f"Columns: row_count; " + "; ".join(measures))
+        return "\n\n".join(lines)
@@ -0,0 +1,434 @@
+"""
+Teardown Engine
+Deletes a whole lab (a VPC and everything inside it, plus old buckets) in the
+right order, and as much as possible at the same time.
+
+AWS refuses to delete a resource while something still uses it (a subnet with
+an instance in it, a VPC with a security group...). So we:
+1. Discover everything that belongs to the target VPCs.
+2. Build a plan (a 'DAG'): for each resource, the list of resources that must be
+   gone first ('blockers').
+3. Delete every resource whose blockers are gone, in parallel; when one finishes,
+   whatever it was blocking can start.
+4. Wait for slow deletes (instances, NAT gateways, endpoints) by polling with a
+   growing interval (1s, 1.5s, 2.3s... up to 15s), and retry deletes that fail
+   with 'DependencyViolation' the same way (AWS needs a moment to notice).
+
+Usage:
+    python cli.py cleanup --tag Name=Playground-VPC --bucket-prefix egirg-study-playground- --dry-run
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from botocore.exceptions import ClientError
+
+# Error codes that mean 'already gone'
+NOT_FOUND_SUFFIXES = ('.NotFound', 'NotFound', 'NoSuchBucket', 'NoSuchEntity')
+
+# Error codes that mean 'something still uses it, try again in a moment'
+RETRY_CODES = {'DependencyViolation', 'IncorrectState', 'InvalidState', 'ResourceInUse'}
+
+DEFAULT_TIMEOUT = 15 * 60  # Seconds to wait for one resource
+MAX_PARALLEL = 10
+
+
+def _is_not_found(error):
+    code = error.response['Error']['Code']
+    return any(code.endswith(suffix) for suffix in NOT_FOUND_SUFFIXES)
+
+
+def poll(check, timeout=DEFAULT_TIMEOUT, first=1.0, factor=1.5, longest=15.0):
+    """
+    Calls check() until it returns True, waiting a little longer each time.
+    Returns False on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    interval = first
+    while True:
+        if check():
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+        interval = min(interval * factor, longest)
+
+
+class Node:
+    """
+    One resource to delete.
+    """
+
+    def __init__(self, key, label, delete, gone=None, blockers=()):
+        self.key = key              # Unique id, e.g. 'subnet:subnet-123'
+        self.label = label          # What we print
+        self.delete = delete        # Starts the deletion
+        self.gone = gone            # Optional: returns True once the deletion finished
+        self.blockers = set(blockers)
+        self.status = 'pending'     # pending -> running -> deleted / failed / skipped
+        self.error = None
+        self.seconds = 0.0
+
+
+class TeardownPlan:
+    """
+    Finds what to delete and in which order.
+    """
+
+    def __init__(self, session, region=None):
+        self.session = session
+        self.region = region or session.region_name
+        self.ec2 = session.client('ec2', region_name=self.region)
+        self.nodes = {}
+
+    def _add(self, key, label, delete, gone=None, blockers=()):
+        if key not in self.nodes:
+            self.nodes[key] = Node(key, label, delete, gone, blockers)
+        return self.nodes[key]
+
+    def _block(self, key, *blockers):
+        # 'key' can only be deleted after all of 'blockers'
+        if key in self.nodes:
+            self.nodes[key].blockers.update(b for b in blockers if b in self.nodes and b != key)
+
+    # --- Discovery ---
+
+    def find_vpcs(self, vpc_ids=(), tags=()):
+        """
+        VPC ids given directly, plus VPCs that have all of the given tags.
+        tags: list of (key, value).
+        """
+        found = set(vpc_ids)
+        if tags:
+            filters = [{'Name': f"tag:{k}", 'Values': [v]} for k, v in tags]
+            for page in self.ec2.get_paginator('describe_vpcs').paginate(Filters=filters):
+                found.update(v['VpcId'] for v in page['Vpcs'])
+        return sorted(found)
+
+    def add_vpc(self, vpc_id):
+        """
+        Adds a VPC and everything inside it to the plan.
+        """
+        ec2 = self.ec2
+        vpc_filter = [{'Name': 'vpc-id', 'Values': [vpc_id]}]
+        known = set(self.nodes)  # Anything added before belongs to other targets
+
+        def pages(operation, key, **kwargs):
+            return [item for page in ec2.get_paginator(operation).paginate(**kwargs) for item in page[key]]
+
+        # 1. Instances (terminate, then wait until 'terminated')
+        instances = [i for r in pages('describe_instances', 'Reservations', Filters=vpc_filter)
+                     for i in r['Instances'] if i['State']['Name'] not in ('terminated', 'shutting-down')]
+        for i in instances:
+            iid = i['InstanceId']
+            self._add(f"instance:{iid}", f"EC2 instance {iid}",
+                      lambda iid=iid: ec2.terminate_instances(InstanceIds=[iid]),
+                      lambda iid=iid: self._instance_gone(iid))
+
+        # 2. NAT gateways (and their Elastic IPs, which cost money on their own)
+        nats = [n for n in pages('describe_nat_gateways', 'NatGateways', Filters=vpc_filter)
+                if n['State'] not in ('deleted', 'deleting')]
+        for n in nats:
+            nid = n['NatGatewayId']
+            self._add(f"nat:{nid}", f"NAT gateway {nid}",
+                      lambda nid=nid: ec2.delete_nat_gateway(NatGatewayId=nid),
+                      lambda nid=nid: self._nat_gone(nid))
+
+        # 3. VPC endpoints
+        endpoints = [e for e in pages('describe_vpc_endpoints', 'VpcEndpoints', Filters=vpc_filter)
+                     if (e.get('State') or '').lower() not in ('deleted', 'deleting')]
+        for e in endpoints:
+            eid = e['VpcEndpointId']
+            self._add(f"endpoint:{eid}", f"VPC endpoint {eid} ({e['ServiceName']})",
+                      lambda eid=eid: self._delete_endpoint(eid),
+                      lambda eid=eid: self._endpoint_gone(eid))
+
+        # 4. Network interfaces that are left over (the ones owned by instances,
+        #    NAT gateways and endpoints disappear together with them)
+        enis = pages('describe_network_interfaces', 'NetworkInterfaces', Filters=vpc_filter)
+        owned_by = {}
+        for eni in enis:
+            eni_id = eni['NetworkInterfaceId']
+            attachment = eni.get('Attachment') or {}
+            after = []  # Nodes that must be gone before this interface can be deleted
+            if attachment.get('InstanceId'):
+                if attachment.get('DeleteOnTermination'):
+                    owned_by[eni_id] = f"instance:{attachment['InstanceId']}"
+                else:
+                    # Attached by hand: it is only detached when the instance terminates
+                    after = [f"instance:{attachment['InstanceId']}"]
+            elif eni.get('InterfaceType') == 'nat_gateway':
+                owned_by[eni_id] = next(
+                    (f"nat:{n['NatGatewayId']}" for n in nats
+                     if any(a.get('NetworkInterfaceId') == eni_id for a in n.get('NatGatewayAddresses', []))), None)
+            elif eni.get('InterfaceType') == 'vpc_endpoint':
+                owned_by[eni_id] = next(
+                    (f"endpoint:{e['VpcEndpointId']}" for e in endpoints
+                     if eni_id in e.get('NetworkInterfaceIds', [])), None)
+            if owned_by.get(eni_id) is None and not eni.get('RequesterManaged'):
+                # Interfaces another service manages (Lambda, load balancers, RDS...) can't be deleted by us
+                self._add(f"eni:{eni_id}", f"Network interface {eni_id} ({eni.get('Description') or eni.get('InterfaceType')})",
+                          lambda eni_id=eni_id: ec2.delete_network_interface(NetworkInterfaceId=eni_id))
+                self._block(f"eni:{eni_id}", *after)
+
+        # 5. Elastic IPs attached to things we delete
+        for address in ec2.describe_addresses(Filters=[{'Name': 'domain', 'Values': ['vpc']}])['Addresses']:
+            owner = None
+            if address.get('InstanceId') and f"instance:{address['InstanceId']}" in self.nodes:
+                owner = f"instance:{address['InstanceId']}"
+            for n in nats:
+                if any(a.get('AllocationId') == address.get('AllocationId') for a in n.get('NatGatewayAddresses', [])):
+                    owner = f"nat:{n['NatGatewayId']}"
+            if owner:
+                alloc = address['AllocationId']
+                self._add(f"eip:{alloc}", f"Elastic IP {address.get('PublicIp')}",
+                          lambda alloc=alloc: ec2.release_address(AllocationId=alloc), blockers=[owner])
+
+        # 6. Security groups: first remove the rules (groups can point at each other), then the groups
+        groups = [g for g in pages('describe_security_groups', 'SecurityGroups', Filters=vpc_filter)
+                  if g['GroupName'] != 'default']
+        rules_key = f"sg-rules:{vpc_id}"
+        if groups:
+            self._add(rules_key, f"Security group rules in {vpc_id}", lambda: self._revoke_rules(groups))
+        for g in groups:
+            gid = g['GroupId']
+            self._add(f"sg:{gid}", f"Security group {gid} ({g['GroupName']})",
+                      lambda gid=gid: ec2.delete_security_group(GroupId=gid), blockers=[rules_key])
+
+        # 7. Subnets, route tables, internet gateways
+        subnets = pages('describe_subnets', 'Subnets', Filters=vpc_filter)
+        for s in subnets:
+            sid = s['SubnetId']
+            self._add(f"subnet:{sid}", f"Subnet {sid} ({s['CidrBlock']})",
+                      lambda sid=sid: ec2.delete_subnet(SubnetId=sid))
+
+        route_tables = pages('describe_route_tables', 'RouteTables', Filters=vpc_filter)
+        for rt in route_tables:
+            if any(a.get('Main') for a in rt.get('Associations', [])):
+                continue  # The main route table goes away with the VPC
+            rid = rt['RouteTableId']
+            associations = [a['RouteTableAssociationId'] for a in rt.get('Associations', []) if a.get('SubnetId')]
+            self._add(f"rtb:{rid}", f"Route table {rid}",
+                      lambda rid=rid, associations=associations: self._delete_route_table(rid, associations))
+
+        igws = pages('describe_internet_gateways', 'InternetGateways',
+                     Filters=[{'Name': 'attachment.vpc-id', 'Values': [vpc_id]}])
+        for igw in igws:
+            gid = igw['InternetGatewayId']
+            self._add(f"igw:{gid}", f"Internet gateway {gid}",
+                      lambda gid=gid: self._delete_igw(gid, vpc_id))
+
+        # 8. The VPC itself
+        self._add(f"vpc:{vpc_id}", f"VPC {vpc_id}", lambda: ec2.delete_vpc(VpcId=vpc_id))
+
+        # --- Dependencies (only between resources of this VPC) ---
+        mine = [k for k in self.nodes if k not in known]
+        compute = [f"instance:{i['InstanceId']}" for i in instances] + [f"nat:{n['NatGatewayId']}" for n in nats]
+        interface_owners = compute + [f"endpoint:{e['VpcEndpointId']}" for e in endpoints]
+        leftover_enis = [k for k in mine if k.startswith('eni:')]
+        for eni in enis:
+            owner = owned_by.get(eni['NetworkInterfaceId'])
+            users = [owner] if owner else [f"eni:{eni['NetworkInterfaceId']}"]
+            # A subnet / security group is in use until the interfaces inside it are gone
+            self._block(f"subnet:{eni['SubnetId']}", *users)
+            for group in eni.get('Groups', []):
+                self._block(f"sg:{group['GroupId']}", *users)
+        for i in instances:
+            self._block(f"subnet:{i.get('SubnetId')}", f"instance:{i['InstanceId']}")
+        for n in nats:
+            self._block(f"subnet:{n['SubnetId']}", f"nat:{n['NatGatewayId']}")
+        for e in endpoints:
+            for sid in e.get('SubnetIds', []):
+                self._block(f"subnet:{sid}", f"endpoint:{e['VpcEndpointId']}")
+            for rid in e.get('RouteTableIds', []):
+                self._block(f"rtb:{rid}", f"endpoint:{e['VpcEndpointId']}")
+            for group in e.get('Groups', []):
+                self._block(f"sg:{group['GroupId']}", f"endpoint:{e['VpcEndpointId']}")
+        for igw in igws:
+            # Public addresses (instances, NAT gateways) must be gone before the detach
+            self._block(f"igw:{igw['InternetGatewayId']}", *compute)
+        for key in mine:
+            if key.startswith('sg:'):
+                self._block(key, *interface_owners, *leftover_enis)
+        self._block(f"vpc:{vpc_id}", *(k for k in mine if not k.startswith('eip:')))
+
+    def add_buckets(self, prefix):
+        """
+        Adds every S3 bucket whose name starts with 'prefix' (emptied, then deleted).
+        """
+        s3 = self.session.resource('s3')
+        for bucket in s3.buckets.all():
+            if bucket.name.startswith(prefix):
+                self._add(f"bucket:{bucket.name}", f"S3 bucket {bucket.name} (and all its objects)",
+                          lambda name=bucket.name: self._delete_bucket(name))
+
+    # --- Delete helpers ---
+
+    def _instance_gone(self, instance_id):
+        try:
+            reservations = self.ec2.describe_instances(InstanceIds=[instance_id])['Reservations']
+        except ClientError as e:
+            if _is_not_found(e):
+                return True
+            raise
+        return all(i['State']['Name'] == 'terminated' for r in reservations for i in r['Instances'])
+
+    def _nat_gone(self, nat_id):
+        nats = self.ec2.describe_nat_gateways(NatGatewayIds=[nat_id])['NatGateways']
+        return all(n['State'] in ('deleted', 'failed') for n in nats)
+
+    def _endpoint_gone(self, endpoint_id):
+        try:
+            endpoints = self.ec2.describe_vpc_endpoints(VpcEndpointIds=[endpoint_id])['VpcEndpoints']
+        except ClientError as e:
+            if _is_not_found(e):
+                return True
+            raise
+        return all((e.get('State') or 'deleted').lower() == 'deleted' for e in endpoints)
+
+    def _delete_endpoint(self, endpoint_id):
+        # This call reports failures in the response instead of raising
+        response = self.ec2.delete_vpc_endpoints(VpcEndpointIds=[endpoint_id])
+        for item in response.get('Unsuccessful', []):
+            raise ClientError({'Error': item['Error']}, 'DeleteVpcEndpoints')
+
+    def _revoke_rules(self, groups):
+        for g in groups:
+            if g.get('IpPermissions'):
+                self.ec2.revoke_security_group_ingress(GroupId=g['GroupId'], IpPermissions=g['IpPermissions'])
+            if g.get('IpPermissionsEgress'):
+                self.ec2.revoke_security_group_egress(GroupId=g['GroupId'], IpPermissions=g['IpPermissionsEgress'])
+
+    def _delete_route_table(self, route_table_id, associations):
+        for association_id in associations:
+            try:
+                self.ec2.disassociate_route_table(AssociationId=association_id)
+            except ClientError as e:
+                if not _is_not_found(e):
+                    raise
+        self.ec2.delete_route_table(RouteTableId=route_table_id)
+
+    def _delete_igw(self, igw_id, vpc_id):
+        try:
+            self.ec2.detach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'Gateway.NotAttached':
+                raise
+        self.ec2.delete_internet_gateway(InternetGatewayId=igw_id)
+
+    def _delete_bucket(self, name):
+        bucket = self.session.resource('s3').Bucket(name)
+        # Deleted in batches of 1000 keys per request
+        bucket.object_versions.all().delete()
+        bucket.objects.all().delete()
+        bucket.delete()
+
+    # --- Showing and running the plan ---
+
+    def waves(self):
+        """
+        Groups the nodes into 'waves': everything in a wave can be deleted at the
+        same time once the previous waves are done. (For display; the engine
+        doesn't wait for a whole wave.)
+        """
+        remaining = dict(self.nodes)
+        done, result = set(), []
+        while remaining:
+            wave = [n for n in remaining.values() if n.blockers <= done]
+            if not wave:  # A cycle: shouldn't happen, but don't loop forever
+                result.append(list(remaining.values()))
+                break
+            result.append(sorted(wave, key=lambda n: n.key))
+            for n in wave:
+                done.add(n.key)
+                del remaining[n.key]
+        return result
+
+    def print_plan(self):
+        print(f"\n--- Teardown Plan ({len(self.nodes)} resources in {self.region}) ---")
+        for number, wave in enumerate(self.waves(), start=1):
+            print(f"Step {number}:")
+            for node in wave:
+                print(f"   - {node.label}")
+
+
+class TeardownEngine:
+    """
+    Runs a TeardownPlan: starts every node whose blockers are deleted, up to
+    'max_parallel' at a time.
+    """
+
+    def __init__(self, plan, max_parallel=MAX_PARALLEL, timeout=DEFAULT_TIMEOUT):
+        self.plan = plan
+        self.max_parallel = max_parallel
+        self.timeout = timeout
+        self._print_lock = threading.Lock()
+
+    def _say(self, message):
+        with self._print_lock:
+            print(message)
+
+    def _run(self, node):
+        start = time.monotonic()
+
+        def attempt():
+            try:
+                node.delete()
+                return True
+            except ClientError as e:
+                if _is_not_found(e):
+                    return True
+                if e.response['Error']['Code'] in RETRY_CODES:
+                    return False  # Still in use: try again after a short wait
+                raise
+
+        if not poll(attempt, timeout=self.timeout):
+            raise TimeoutError(f"{node.label} was still in use after {self.timeout}s")
+        if node.gone is not None and not poll(node.gone, timeout=self.timeout, first=2.0):
+            raise TimeoutError(f"{node.label} did not finish deleting after {self.timeout}s")
+        node.seconds = time.monotonic() - start
+
+    def run(self):
+        """
+        Returns True if everything was deleted.
+        """
+        nodes = self.plan.nodes
+        deleted = set()
+        running = {}
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            while True:
+                # Skip whatever depends on something that failed
+                for node in nodes.values():
+                    if node.status == 'pending' and any(nodes[b].status in ('failed', 'skipped') for b in node.blockers):
+                        node.status = 'skipped'
+                        node.error = "blocked by " + ", ".join(b for b in node.blockers if nodes[b].status != 'deleted')
+                        self._say(f"[SKIP] {node.label} ({node.error})")
+
+                # Start everything that is ready
+                for node in nodes.values():
+                    if node.status == 'pending' and node.blockers <= deleted:
+                        node.status = 'running'
+                        self._say(f"[*] Deleting {node.label}...")
+                        running[pool.submit(self._run, node)] = node
+
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        node.status = 'deleted'
+                        deleted.add(node.key)
+                        self._say(f"[OK] Deleted {node.label} ({node.seconds:.1f}s)")
+                    else:
+                        node.status = 'failed'
+                        node.error = str(error)
+                        self._say(f"[ERROR] {node.label}: {error}")
+
+        failed = [n for n in nodes.values() if n.status != 'deleted']
+        print(f"\nTeardown finished in {time.monotonic() - start:.1f}s: "
+              f"{len(deleted)} deleted, {len(failed)} failed or skipped.")
+        return not failed
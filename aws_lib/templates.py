@@ -0,0 +1,305 @@
+"""
+Template Packager
+Gets a CloudFormation template ready before StackManager sends it to AWS.
+
+1. Validate locally: cfn-lint checks the template against the CloudFormation
+   specs on this machine, so a typo fails in milliseconds instead of after a
+   slow create/update. Results are remembered per template hash
+   (~/.aws_playground/templates/validation.json), so unchanged templates are
+   not linted again. (Without cfn-lint installed we still run a few basic checks.)
+2. Package: AWS only accepts templates up to 51,200 bytes inline ('TemplateBody').
+   Bigger ones, and nested stack templates referenced by a local path, are
+   uploaded to S3 under their content hash and deployed by 'TemplateURL'.
+   A hash that is already in the bucket is not uploaded again.
+
+Usage:
+    packager = TemplatePackager(session)
+    errors = packager.validate(body)
+    kwargs = packager.package('infrastructure/network.yaml', body)  # {'TemplateBody': ...} or {'TemplateURL': ...}
+"""
+import hashlib
+import importlib.metadata
+import json
+import os
+import tempfile
+import threading
+
+import yaml
+from botocore.exceptions import ClientError
+
+from aws_lib.core import get_cache_dir
+
+# Largest template CloudFormation accepts inline / from S3 (bytes)
+TEMPLATE_BODY_LIMIT = 51200
+TEMPLATE_URL_LIMIT = 1024 * 1024
+
+# S3 prefix for packaged templates
+TEMPLATE_PREFIX = 'templates/'
+
+PSEUDO_PARAMETERS = {'AWS::AccountId', 'AWS::NoValue', 'AWS::NotificationARNs', 'AWS::Partition',
+                     'AWS::Region', 'AWS::StackId', 'AWS::StackName', 'AWS::URLSuffix'}
+
+_cache_lock = threading.Lock()  # Parallel deploys share the validation cache file
+
+
+def template_hash(body):
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+class _CfnLoader(yaml.SafeLoader):
+    """
+    A YAML loader that understands the short CloudFormation tags
+    (!Ref, !Sub, !GetAtt...) and turns them into their long form.
+    """
+
+
+def _cfn_tag(loader, tag_suffix, node):
+    if isinstance(node, yaml.ScalarNode):
+        value = loader.construct_scalar(node)
+    elif isinstance(node, yaml.SequenceNode):
+        value = loader.construct_sequence(node, deep=True)
+    else:
+        value = loader.construct_mapping(node, deep=True)
+    if tag_suffix == 'Ref':
+        return {'Ref': value}
+    if tag_suffix == 'GetAtt' and isinstance(value, str):
+        value = value.split('.', 1)
+    if tag_suffix == 'Condition':
+        return {'Condition': value}
+    return {f"Fn::{tag_suffix}": value}
+
+
+_CfnLoader.add_multi_constructor('!', _cfn_tag)
+
+
+def load_template(body):
+    """
+    Parses a JSON or YAML template into a dict (short tags become long form).
+    """
+    return yaml.load(body, Loader=_CfnLoader)
+
+
+def _is_local(url):
+    return isinstance(url, str) and not url.startswith(('https://', 'http://', 's3://'))
+
+
+def basic_checks(template):
+    """
+    A few checks that need no extra package: the template has resources, each
+    one has a type, and every Ref / GetAtt / DependsOn points at something that exists.
+    """
+    if not isinstance(template, dict):
+        return ["The template is not a mapping."]
+    resources = template.get('Resources')
+    if not isinstance(resources, dict) or not resources:
+        return ["The template has no 'Resources'."]
+
+    errors = []
+    names = set(resources) | set(template.get('Parameters') or {}) | PSEUDO_PARAMETERS
+
+    def walk(value, where):
+        if isinstance(value, dict):
+            if 'Ref' in value and isinstance(value['Ref'], str) and value['Ref'] not in names:
+                errors.append(f"{where}: Ref to unknown '{value['Ref']}'")
+            target = value.get('Fn::GetAtt')
+            if isinstance(target, list) and target and target[0] not in resources:
+                errors.append(f"{where}: GetAtt on unknown resource '{target[0]}'")
+            for item in value.values():
+                walk(item, where)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item, where)
+
+    for name, resource in resources.items():
+        if not isinstance(resource, dict) or not isinstance(resource.get('Type'), str):
+            errors.append(f"Resources/{name}: missing 'Type'")
+            continue
+        depends_on = resource.get('DependsOn') or []
+        for dependency in [depends_on] if isinstance(depends_on, str) else depends_on:
+            if dependency not in resources:
+                errors.append(f"Resources/{name}: DependsOn unknown resource '{dependency}'")
+        walk(resource.get('Properties'), f"Resources/{name}")
+    for name, output in (template.get('Outputs') or {}).items():
+        if not isinstance(output, dict) or 'Value' not in output:
+            errors.append(f"Outputs/{name}: missing 'Value'")
+        else:
+            walk(output['Value'], f"Outputs/{name}")
+    return errors
+
+
+class TemplatePackager:
+    """
+    Validates templates locally and decides how to send them to CloudFormation.
+    """
+
+    def __init__(self, session, bucket=None):
+        self.session = session
+        self.region = session.region_name or 'us-east-1'
+        # Packaged templates go to $AWS_PLAYGROUND_TEMPLATE_BUCKET, or a per-account bucket created on first use
+        self._bucket = bucket or os.environ.get('AWS_PLAYGROUND_TEMPLATE_BUCKET')
+        self._bucket_ready = False
+        self._s3 = None
+        self._lock = threading.Lock()
+        self.cache_path = os.path.join(get_cache_dir('templates'), 'validation.json')
+
+    # --- Validation ---
+
+    @staticmethod
+    def validator_name():
+        """
+        'cfn-lint <version>' or 'basic'. Part of the cache key, so a new cfn-lint
+        version lints again. (Reading the version doesn't import cfn-lint, which is slow.)
+        """
+        try:
+            return f"cfn-lint {importlib.metadata.version('cfn-lint')}"
+        except importlib.metadata.PackageNotFoundError:
+            return 'basic'
+
+    def _run_validator(self, body):
+        """
+        Returns (errors, warnings).
+        """
+        try:
+            from cfnlint.api import lint, ManualArgs  # Imported only when something must be linted
+        except ImportError:
+            return [], []  # basic_checks() already ran
+
+        errors, warnings = [], []
+        # W3002 flags local nested-template paths, which package() uploads for us
+        for match in lint(body, config=ManualArgs(regions=[self.region], ignore_checks=['W3002'])):
+            line = f"{match.rule.id} line {match.linenumber}: {match.message}"
+            (errors if match.rule.severity == 'error' else warnings).append(line)
+        return errors, warnings
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_cache(self, key, result):
+        with _cache_lock:
+            cache = self._read_cache()
+            cache[key] = result
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.cache_path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f)
+            os.replace(temp_path, self.cache_path)
+
+    def validate(self, body):
+        """
+        Returns the list of errors (empty = valid). Warnings are printed only.
+        """
+        try:
+            template = load_template(body)
+        except yaml.YAMLError as e:
+            return [f"Not valid YAML/JSON: {e}"]
+        if len(body.encode('utf-8')) > TEMPLATE_URL_LIMIT:
+            return [f"Template is larger than {TEMPLATE_URL_LIMIT} bytes, the CloudFormation maximum."]
+
+        digest = template_hash(body)
+        # A quick look first: cfn-lint's messages are less clear about these
+        errors = basic_checks(template)
+        if errors:
+            return errors
+
+        # An unchanged template costs one hash and one small file read
+        key = f"{digest}|{self.validator_name()}|{self.region}"
+        cached = self._read_cache().get(key)
+        if cached is not None:
+            return cached['errors']
+
+        errors, warnings = self._run_validator(body)
+        for warning in warnings:
+            print(f"Warning: {warning}")
+        self._write_cache(key, {'errors': errors, 'warnings': warnings})
+        return errors
+
+    # --- Packaging ---
+
+    def _bucket_name(self):
+        with self._lock:
+            if self._bucket is None:
+                account = self.session.client('sts').get_caller_identity()['Account']
+                self._bucket = f"aws-playground-templates-{account}-{self.region}"
+            if self._s3 is None:
+                self._s3 = self.session.client('s3', region_name=self.region)
+            if not self._bucket_ready:
+                s3 = self._s3
+                try:
+                    s3.head_bucket(Bucket=self._bucket)
+                except ClientError as e:
+                    if e.response['Error']['Code'] not in ('404', 'NoSuchBucket'):
+                        raise
+                    print(f"Creating template bucket {self._bucket}...")
+                    if self.region == 'us-east-1':
+                        s3.create_bucket(Bucket=self._bucket)
+                    else:
+                        s3.create_bucket(Bucket=self._bucket,
+                                         CreateBucketConfiguration={'LocationConstraint': self.region})
+                    s3.put_public_access_block(Bucket=self._bucket, PublicAccessBlockConfiguration={
+                        'BlockPublicAcls': True, 'IgnorePublicAcls': True,
+                        'BlockPublicPolicy': True, 'RestrictPublicBuckets': True})
+                self._bucket_ready = True
+            return self._bucket
+
+    def upload(self, body):
+        """
+        Puts the template in S3 under its hash (unless it is already there).
+        Returns its TemplateURL.
+        """
+        bucket = self._bucket_name()
+        key = f"{TEMPLATE_PREFIX}{template_hash(body)}.template"
+        s3 = self._s3
+        try:
+            s3.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+            print(f"Uploading template to s3://{bucket}/{key}")
+            s3.put_object(Bucket=bucket, Key=key, Body=body.encode('utf-8'))
+        return f"https://{bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+    def _package_nested(self, template_path, body):
+        """
+        Uploads nested stack templates given as local paths and points the
+        parent template at them. Returns the (maybe rewritten) body and any
+        validation errors found in the nested templates.
+        """
+        template = load_template(body)
+        nested = [(name, resource) for name, resource in (template.get('Resources') or {}).items()
+                  if resource.get('Type') == 'AWS::CloudFormation::Stack'
+                  and _is_local((resource.get('Properties') or {}).get('TemplateURL'))]
+        if not nested:
+            return body, []
+
+        errors = []
+        folder = os.path.dirname(os.path.abspath(template_path))
+        for name, resource in nested:
+            child_path = os.path.join(folder, resource['Properties']['TemplateURL'])
+            with open(child_path) as f:
+                child_body = f.read()
+            child_errors = self.validate(child_body)
+            if child_errors:
+                errors += [f"{name} ({child_path}): {e}" for e in child_errors]
+                continue
+            child_body, child_errors = self._package_nested(child_path, child_body)
+            errors += child_errors
+            if not child_errors:
+                resource['Properties']['TemplateURL'] = self.upload(child_body)
+        # Written back as JSON (CloudFormation reads both; the short YAML tags are now long form)
+        return json.dumps(template, indent=1, default=str), errors
+
+    def package(self, template_path, body):
+        """
+        Returns the create_stack / update_stack arguments for this template:
+        {'TemplateBody': body} when it is small enough, otherwise {'TemplateURL': url}.
+        Raises ValueError if a nested template is invalid.
+        """
+        body, errors = self._package_nested(template_path, body)
+        if errors:
+            raise ValueError("; ".join(errors))
+        if len(body.encode('utf-8')) <= TEMPLATE_BODY_LIMIT:
+            return {'TemplateBody': body}
+        return {'TemplateURL': self.upload(body)}
@@ -0,0 +1,321 @@
+"""
+API Tracer
+Answers the question: "Where did the time in my command go?"
+
+It plugs into boto3's event system (hooks that boto3 calls around every request):
+- before-call  -> an API call starts
+- before-send  -> one HTTP attempt is sent (retries send again)
+- needs-retry  -> AWS answered; we note throttling errors
+- after-call   -> the API call finished (success or AWS error)
+It also times how long it takes to build each client (loading service models is slow).
+
+At the end it can print a summary table and write the calls as
+OpenTelemetry-style spans (OTLP JSON) to a local file.
+"""
+import json
+import os
+import threading
+import time
+
+# Latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf')]
+
+# Error codes AWS uses when we are calling too fast
+THROTTLE_CODES = {
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+    'TooManyRequestsException', 'ProvisionedThroughputExceededException', 'TransactionInProgressException',
+    'RequestLimitExceeded', 'BandwidthLimitExceeded', 'LimitExceededException', 'RequestThrottled',
+    'SlowDown', 'PriorRequestNotComplete', 'EC2ThrottledException',
+}
+
+
+class OperationStats:
+    """
+    Running totals for one 'service.Operation' (e.g. 'cloudformation.DescribeStacks').
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latencies_ms = []
+        self.histogram = [0] * len(LATENCY_BUCKETS_MS)
+
+    def add(self, latency_ms):
+        self.calls += 1
+        self.latencies_ms.append(latency_ms)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.histogram[i] += 1
+                break
+
+    def percentile(self, pct):
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class ApiTracer:
+    """
+    Collects timing for every AWS call made through one session.
+
+    Usage:
+        tracer = ApiTracer('cli audit')
+        tracer.attach(session)      # BEFORE any client is created
+        ... run the command ...
+        tracer.finish()
+        tracer.print_summary()
+        tracer.export_spans('trace.json')
+    """
+
+    def __init__(self, name='aws_playground'):
+        self.name = name
+        self.stats = {}            # 'service.Operation' -> OperationStats
+        self.spans = []            # Finished spans (dicts) for the export
+        self.client_creation = []  # (service name, milliseconds)
+        self.trace_id = os.urandom(16).hex()
+        self.root_span_id = os.urandom(8).hex()
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.end = None
+        self.end_ns = None
+        self._lock = threading.Lock()  # Several threads may call AWS at the same time
+
+    # --- Wiring ---
+
+    def attach(self, session):
+        """
+        Registers our hooks on the session. Clients copy the session's hooks when
+        they are created, so this must run before the first session.client(...).
+        """
+        events = session.events
+        events.register('before-call', self._before_call)
+        events.register('before-send', self._before_send)
+        events.register('needs-retry', self._needs_retry)
+        events.register('after-call', self._after_call)
+        events.register('after-call-error', self._after_call_error)
+
+        # Time client/resource creation by wrapping the session's own methods
+        session.client = self._timed(session.client, 'client')
+        session.resource = self._timed(session.resource, 'resource')
+        return self
+
+    def _timed(self, factory, kind):
+        def wrapper(service_name, *args, **kwargs):
+            start_ns = time.time_ns()
+            start = time.perf_counter()
+            result = factory(service_name, *args, **kwargs)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.client_creation.append((service_name, elapsed_ms))
+                self.spans.append(self._span(f"create_{kind} {service_name}", start_ns, time.time_ns(),
+                                             {'aws.service': service_name}))
+            return result
+        return wrapper
+
+    # --- Hooks (boto3 calls these; they must return None so they never change the request) ---
+
+    def _before_call(self, event_name, context=None, **kwargs):
+        if context is not None:
+            _, service, operation = event_name.split('.', 2)
+            context['trace'] = {
+                'op': f"{service}.{operation}",
+                'start': time.perf_counter(),
+                'start_ns': time.time_ns(),
+                'attempts': 0,
+                'bytes_sent': 0,
+                'throttles': 0,
+            }
+        return None
+
+    def _before_send(self, request=None, **kwargs):
+        trace = (getattr(request, 'context', None) or {}).get('trace')
+        if trace is not None:
+            trace['attempts'] += 1
+            trace['bytes_sent'] += _request_size(request)
+        return None
+
+    def _needs_retry(self, response=None, request_dict=None, **kwargs):
+        trace = ((request_dict or {}).get('context') or {}).get('trace')
+        if trace is not None and response is not None:
+            error_code = response[1].get('Error', {}).get('Code')
+            if error_code in THROTTLE_CODES:
+                trace['throttles'] += 1
+        return None
+
+    def _after_call(self, http_response=None, parsed=None, context=None, **kwargs):
+        trace = (context or {}).get('trace')
+        if trace is None:
+            return None
+        # Only read the header: reading the body would consume S3 download streams
+        received = int(http_response.headers.get('content-length', 0) or 0) if http_response is not None else 0
+        metadata = (parsed or {}).get('ResponseMetadata', {})
+        status = http_response.status_code if http_response is not None else 0
+        self._record(trace, status, received, metadata.get('RequestId'),
+                     (parsed or {}).get('Error', {}).get('Code'))
+        return None
+
+    def _after_call_error(self, exception=None, context=None, **kwargs):
+        trace = (context or {}).get('trace')
+        if trace is not None:
+            self._record(trace, 0, 0, None, type(exception).__name__)
+        return None
+
+    def _record(self, trace, status, bytes_received, request_id, error_code):
+        end_ns = time.time_ns()
+        latency_ms = (time.perf_counter() - trace['start']) * 1000
+        retries = max(trace['attempts'] - 1, 0)
+        with self._lock:
+            stats = self.stats.setdefault(trace['op'], OperationStats())
+            stats.add(latency_ms)
+            stats.retries += retries
+            stats.throttles += trace['throttles']
+            stats.bytes_sent += trace['bytes_sent']
+            stats.bytes_received += bytes_received
+            if error_code or status >= 300:
+                stats.errors += 1
+            service, operation = trace['op'].split('.', 1)
+            attributes = {
+                'rpc.system': 'aws-api',
+                'rpc.service': service,
+                'rpc.method': operation,
+                'http.status_code': status,
+                'aws.retries': retries,
+                'aws.throttles': trace['throttles'],
+            }
+            if request_id:
+                attributes['aws.request_id'] = request_id
+            if error_code:
+                attributes['aws.error_code'] = error_code
+            self.spans.append(self._span(trace['op'], trace['start_ns'], end_ns, attributes,
+                                         error=bool(error_code or status >= 300)))
+
+    # --- Reporting ---
+
+    def finish(self):
+        """
+        Marks the end of the command (call once, after the work is done).
+        """
+        self.end = time.perf_counter()
+        self.end_ns = time.time_ns()
+
+    def _span(self, name, start_ns, end_ns, attributes, error=False):
+        return {
+            'name': name,
+            'spanId': os.urandom(8).hex(),
+            'start_ns': start_ns,
+            'end_ns': end_ns,
+            'attributes': attributes,
+            'error': error,
+        }
+
+    def print_summary(self):
+        """
+        Prints one row per AWS operation plus a 'where did the time go' breakdown.
+        """
+        total_ms = ((self.end or time.perf_counter()) - self.start) * 1000
+        creation_ms = sum(ms for _, ms in self.client_creation)
+        api_ms = sum(sum(s.latencies_ms) for s in self.stats.values())
+
+        print("\n--- Trace Summary ---")
+        header = f"{'Operation':<45} {'Calls':>5} {'Err':>4} {'Retry':>5} {'Thrtl':>5} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'Sent':>9} {'Recv':>9}"
+        print(header)
+        print("-" * len(header))
+        for op, s in sorted(self.stats.items(), key=lambda item: -sum(item[1].latencies_ms)):
+            print(f"{op:<45} {s.calls:>5} {s.errors:>4} {s.retries:>5} {s.throttles:>5} "
+                  f"{s.percentile(50):>8.1f} {s.percentile(95):>8.1f} {max(s.latencies_ms):>8.1f} "
+                  f"{_human_bytes(s.bytes_sent):>9} {_human_bytes(s.bytes_received):>9}")
+        print("-" * len(header))
+
+        print("\nLatency histogram (calls per bucket):")
+        labels = [f"<={b}ms" if b != float('inf') else f">{LATENCY_BUCKETS_MS[-2]}ms" for b in LATENCY_BUCKETS_MS]
+        for op, s in sorted(self.stats.items()):
+            buckets = ", ".join(f"{label}: {count}" for label, count in zip(labels, s.histogram) if count)
+            print(f"  {op:<45} {buckets}")
+
+        print("\nWhere the time went:")
+        print(f"  Client creation : {creation_ms:>9.1f} ms ({len(self.client_creation)} clients)")
+        print(f"  AWS API calls   : {api_ms:>9.1f} ms (network + AWS + retries)")
+        print(f"  Our own code    : {max(total_ms - creation_ms - api_ms, 0):>9.1f} ms")
+        print(f"  Total           : {total_ms:>9.1f} ms")
+        if api_ms > total_ms:
+            print("  (API time is larger than total because some calls ran in parallel)")
+
+    def export_spans(self, path):
+        """
+        Writes all spans in the OpenTelemetry OTLP/JSON format, which tools like
+        Jaeger or the OpenTelemetry Collector (file receiver) can import.
+        """
+        end_ns = self.end_ns or time.time_ns()
+        root = self._span(self.name, self.start_ns, end_ns, {'aws.api_calls': sum(s.calls for s in self.stats.values())})
+        root['spanId'] = self.root_span_id
+
+        otlp_spans = [self._to_otlp(root, parent=None)]
+        otlp_spans += [self._to_otlp(span, parent=self.root_span_id) for span in self.spans]
+
+        document = {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', 'aws_playground')]},
+                'scopeSpans': [{
+                    'scope': {'name': 'aws_lib.tracing'},
+                    'spans': otlp_spans,
+                }],
+            }],
+        }
+        with open(path, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"Trace written to {path} ({len(otlp_spans)} spans)")
+
+    def _to_otlp(self, span, parent):
+        otlp = {
+            'traceId': self.trace_id,
+            'spanId': span['spanId'],
+            'name': span['name'],
+            'kind': 3 if parent else 1,  # 3 = CLIENT (an outgoing call), 1 = INTERNAL
+            'startTimeUnixNano': str(span['start_ns']),
+            'endTimeUnixNano': str(span['end_ns']),
+            'attributes': [_otlp_attribute(k, v) for k, v in span['attributes'].items()],
+            'status': {'code': 2 if span['error'] else 1},  # 2 = ERROR, 1 = OK
+        }
+        if parent:
+            otlp['parentSpanId'] = parent
+        return otlp
+
+
+def _request_size(request):
+    # Prefer the headers: uploads can be streams we must not read here
+    headers = request.headers
+    length = headers.get('Content-Length') or headers.get('X-Amz-Decoded-Content-Length')
+    if length:
+        return int(length)
+    body = request.body
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    if body is not None and hasattr(body, 'seek') and hasattr(body, 'tell'):
+        position = body.tell()
+        body.seek(0, os.SEEK_END)
+        size = body.tell() - position
+        body.seek(position)
+        return size
+    return 0
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def _human_bytes(n):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
@@ -0,0 +1,234 @@
+"""
+Website Publisher
+Uploads the 'website/' folder to the S3 website bucket, ready to be served fast:
+
+1. Fingerprinting: assets that never change once published (CSS, JS, images,
+   fonts) get their content hash in the name ('style.css' -> 'style.3f2a9c1d.css'),
+   and the HTML/CSS that point at them are rewritten to the new names.
+   A changed file gets a new name, so browsers can keep old ones forever.
+2. Cache-Control per file type:
+   - HTML: 'no-cache' (browsers check for a new version on every visit)
+   - Fingerprinted assets: cached for a year, 'immutable'
+   - Anything else (favicon.ico, robots.txt...): cached for an hour
+3. Compression ahead of time: text files (HTML, CSS, JS, SVG, JSON...) are
+   stored gzip-compressed with 'Content-Encoding: gzip', so every visitor
+   downloads the small version. The compressed bytes are kept in
+   ~/.aws_playground/website/ and reused while the file doesn't change.
+4. Only files whose content differs from what is in the bucket are uploaded
+   (compared with the S3 ETag), in parallel.
+
+About brotli: S3 can't choose an encoding per visitor, and browsers only accept
+brotli over HTTPS (the S3 website endpoint is plain HTTP). So gzip is the
+default; pass encoding='br' (needs 'pip install brotli') only when the bucket is
+served over HTTPS, e.g. behind CloudFront.
+
+Usage:
+    WebsitePublisher(session, 'my-bucket').publish('website')
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:  # Optional: only needed for encoding='br'
+    brotli = None
+
+from aws_lib.core import get_cache_dir
+
+# Files compressed before upload
+TEXT_EXTENSIONS = {'.html', '.htm', '.css', '.js', '.mjs', '.json', '.svg', '.txt', '.xml', '.map', '.webmanifest'}
+
+# Files renamed with their content hash (referenced from HTML/CSS, never fetched by a fixed URL)
+FINGERPRINT_EXTENSIONS = {'.css', '.js', '.mjs', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.svg',
+                          '.woff', '.woff2', '.ttf', '.otf', '.eot'}
+
+# Files whose references to other files we rewrite
+REWRITE_EXTENSIONS = {'.html', '.htm', '.css'}
+
+CACHE_HTML = 'no-cache'
+CACHE_IMMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_DEFAULT = 'public, max-age=3600'
+
+UPLOAD_THREADS = 8
+
+
+def _ext(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    # mtime=0: the same input always gives the same bytes (and the same ETag)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class SiteFile:
+    """
+    One file as it will be stored in the bucket.
+    """
+
+    def __init__(self, path, key, body, cache_control, content_encoding=None):
+        self.path = path                  # Local path
+        self.key = key                    # S3 key (maybe fingerprinted)
+        self.body = body                  # Bytes to upload (maybe compressed)
+        self.cache_control = cache_control
+        self.content_encoding = content_encoding
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'application/json'):
+            self.content_type += '; charset=utf-8'
+
+    @property
+    def md5(self):
+        return hashlib.md5(self.body).hexdigest()
+
+
+class WebsitePublisher:
+    """
+    Usage:
+        publisher = WebsitePublisher(session, 'egirgis-lab')
+        publisher.publish('website')
+    """
+
+    def __init__(self, session, bucket_name, encoding='gzip'):
+        if encoding == 'br' and brotli is None:
+            raise ValueError("encoding='br' needs the 'brotli' package (pip install brotli).")
+        self.session = session
+        self.bucket_name = bucket_name
+        self.encoding = encoding
+        self.s3 = session.client('s3')
+        self.cache_dir = get_cache_dir('website', 'compressed')
+        self.cache_hits = 0
+
+    # --- Building ---
+
+    def _compressed(self, data):
+        """
+        The compressed bytes, from the local cache when this exact content was compressed before.
+        """
+        path = os.path.join(self.cache_dir, f"{hashlib.sha256(data).hexdigest()}.{self.encoding}")
+        try:
+            with open(path, 'rb') as f:
+                self.cache_hits += 1
+                return f.read()
+        except FileNotFoundError:
+            pass
+        packed = _compress(data, self.encoding)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(packed)
+        os.replace(temp_path, path)
+        return packed
+
+    @staticmethod
+    def _rewrite(text, relative_dir, renames):
+        """
+        Points references to assets ('style.css', './img/logo.png', '../app.js',
+        '/app.js') at their fingerprinted names.
+        """
+        base = relative_dir or '.'
+        for original, renamed in renames.items():
+            references = [
+                (os.path.relpath(original, base).replace(os.sep, '/'), os.path.relpath(renamed, base).replace(os.sep, '/')),
+                ('/' + original, '/' + renamed),  # From the site root
+            ]
+            for reference, target in references:
+                # Only whole references: inside quotes, url(...), or after '='
+                pattern = r'(?<=["\'(=\s])(\./)?' + re.escape(reference) + r'(?=["\')\s?#])'
+                text = re.sub(pattern, lambda m: (m.group(1) or '') + target, text)
+        return text
+
+    def build(self, site_dir):
+        """
+        Returns the list of SiteFiles for everything in site_dir.
+        """
+        paths = []
+        for root, _, names in os.walk(site_dir):
+            for name in sorted(names):
+                if not name.startswith('.'):
+                    paths.append(os.path.relpath(os.path.join(root, name), site_dir).replace(os.sep, '/'))
+
+        contents = {}
+        for relative in paths:
+            with open(os.path.join(site_dir, relative), 'rb') as f:
+                contents[relative] = f.read()
+
+        # Images, fonts and JS first, then CSS (which may point at them), then HTML (which points at everything)
+        def stage(relative):
+            ext = _ext(relative)
+            if ext in REWRITE_EXTENSIONS:
+                return 1 if ext == '.css' else 2
+            return 0
+
+        renames = {}
+        files = []
+        for relative in sorted(paths, key=lambda p: (stage(p), p)):
+            data = contents[relative]
+            ext = _ext(relative)
+            if ext in REWRITE_EXTENSIONS and renames:
+                text = data.decode('utf-8-sig')
+                data = self._rewrite(text, os.path.dirname(relative), renames).encode('utf-8')
+            elif data.startswith(b'\xef\xbb\xbf') and ext in TEXT_EXTENSIONS:
+                data = data[3:]  # Drop the byte order mark some editors add
+
+            key = relative
+            if ext in FINGERPRINT_EXTENSIONS:
+                digest = hashlib.sha256(data).hexdigest()[:8]
+                key = f"{relative[:-len(ext)]}.{digest}{ext}"
+                renames[relative] = key
+                cache_control = CACHE_IMMUTABLE
+            elif ext in ('.html', '.htm'):
+                cache_control = CACHE_HTML
+            else:
+                cache_control = CACHE_DEFAULT
+
+            encoding = None
+            if ext in TEXT_EXTENSIONS:
+                packed = self._compressed(data)
+                if len(packed) < len(data):  # Tiny files can get bigger: keep those as they are
+                    data, encoding = packed, self.encoding
+            files.append(SiteFile(relative, key, data, cache_control, encoding))
+        return files
+
+    # --- Uploading ---
+
+    def _remote_etags(self):
+        etags = {}
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name):
+            for obj in page.get('Contents', []):
+                etags[obj['Key']] = obj['ETag'].strip('"')
+        return etags
+
+    def _upload(self, site_file):
+        extra = {'ContentType': site_file.content_type, 'CacheControl': site_file.cache_control}
+        if site_file.content_encoding:
+            extra['ContentEncoding'] = site_file.content_encoding
+        self.s3.put_object(Bucket=self.bucket_name, Key=site_file.key, Body=site_file.body, **extra)
+
+    def publish(self, site_dir='website', force=False):
+        """
+        Builds the site and uploads what changed. Returns the list of uploaded keys.
+        """
+        files = self.build(site_dir)
+        remote = {} if force else self._remote_etags()
+        changed = [f for f in files if remote.get(f.key) != f.md5]
+
+        # Assets before HTML, so a page never points at a file that isn't there yet
+        assets = [f for f in changed if f.cache_control != CACHE_HTML]
+        pages = [f for f in changed if f.cache_control == CACHE_HTML]
+        with ThreadPoolExecutor(max_workers=UPLOAD_THREADS) as pool:
+            for batch in (assets, pages):
+                for site_file, _ in zip(batch, pool.map(self._upload, batch)):
+                    encoding = f", {site_file.content_encoding}" if site_file.content_encoding else ""
+                    print(f"Uploaded {site_file.key} ({len(site_file.body)} bytes{encoding}, {site_file.cache_control})")
+
+        raw = sum(os.path.getsize(os.path.join(site_dir, f.path)) for f in files)
+        stored = sum(len(f.body) for f in files)
+        print(f"Website: {len(changed)} of {len(files)} files uploaded ({len(files) - len(changed)} unchanged), "
+              f"{raw:,} -> {stored:,} bytes after compression ({self.cache_hits} reused from the local cache).")
+        return [f.key for f in changed]
@@ -0,0 +1,3 @@
+# Offline benchmarks for the playground.
+# Run them from the project root, e.g.:
+#   python -m benchmarks.bench_pipeline --rows 100000
@@ -0,0 +1,277 @@
+"""
+aws_lib Manager Benchmarks
+Measures how each manager class behaves as the account gets bigger
+(more stacks, more S3 objects, more instances, more IAM users...).
+
+Everything runs offline:
+- 'moto' fakes the AWS services in memory.
+- botocore's 'Stubber' fakes Bedrock (which moto does not cover).
+- '--latency' adds an artificial delay to every API call, so the numbers
+  look more like a real network (a fake AWS answers in microseconds).
+
+For every operation and scale we record wall time, API call count
+(per service/operation) and peak memory.
+
+Usage:
+    python -m benchmarks.bench_managers --scales 10 100 1000 --latency 0.02
+    python -m benchmarks.bench_managers --only iam stacks --output bench_results/managers.json
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import redirect_stdout
+
+import boto3
+import yaml
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+from aws_lib.stacks import StackManager
+from aws_lib.audit import CostAuditor
+from aws_lib.pipeline import PipelineManager
+from aws_lib.easy_iam import EasyIAMManager
+from aws_lib.ai import DataAgent
+from benchmarks.harness import measure, print_table, save_results, compare_results
+
+TINY_TEMPLATE = json.dumps({
+    "Resources": {"Handle": {"Type": "AWS::CloudFormation::WaitConditionHandle"}},
+    "Outputs": {"WebsiteURL": {"Value": "http://example.com"}},
+})
+
+
+class ApiRecorder:
+    """
+    Hooks into every boto3 client made from the session.
+    - Counts each API call by 'service.Operation'.
+    - Sleeps 'latency' seconds per call to simulate the network.
+    The recorder is switched off while we create the test data.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.enabled = False
+        self.calls = Counter()
+
+    def attach(self, session):
+        # 'before-call' fires once per API call, before the request is sent (or stubbed)
+        session.events.register('before-call', self._on_call)
+
+    def _on_call(self, event_name, **kwargs):
+        if not self.enabled:
+            return None
+        # event_name looks like 'before-call.s3.PutObject'
+        _, service, operation = event_name.split('.', 2)
+        self.calls[f"{service}.{operation}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return None  # Returning anything else would replace the real response
+
+    def start(self):
+        self.calls.clear()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+
+def _make_session():
+    return boto3.Session(aws_access_key_id='testing', aws_secret_access_key='testing',
+                         aws_session_token='testing', region_name='us-east-1')
+
+
+def _run(name, scale, recorder, func):
+    """
+    Measures one call of func() with output hidden, and attaches the API call counts.
+    """
+    recorder.start()
+    with measure(name, scale=scale) as stage:
+        with redirect_stdout(io.StringIO()):
+            func()
+    recorder.stop()
+    stage.rows = scale
+    stage.extra['api_calls'] = sum(recorder.calls.values())
+    stage.extra['api_breakdown'] = dict(recorder.calls)
+    return stage
+
+
+# --- One setup + measurement function per manager ---
+
+def bench_stacks(session, recorder, scale):
+    results = []
+    cfn = session.client('cloudformation')
+    names = [f"bench-stack-{i:05d}" for i in range(scale)]
+    for name in names:
+        cfn.create_stack(StackName=name, TemplateBody=TINY_TEMPLATE)
+
+    manager = StackManager(session)
+
+    def lookups():
+        # What a multi-stack command does: describe everything once, then check
+        # the status and read an output of each stack
+        manager.load_stacks()
+        for name in names:
+            manager.stack_exists(name)
+            manager.get_output(name, 'WebsiteURL')
+
+    results.append(_run('StackManager.lookups', scale, recorder, lookups))
+    return results
+
+
+def bench_empty_bucket(session, recorder, scale):
+    s3 = session.client('s3')
+    s3.create_bucket(Bucket='bench-bucket')
+    for i in range(scale):
+        s3.put_object(Bucket='bench-bucket', Key=f"data/part-{i:07d}.json", Body=b'{}')
+
+    manager = StackManager(session)
+    return [_run('StackManager.empty_bucket', scale, recorder, lambda: manager.empty_bucket('bench-bucket'))]
+
+
+def bench_audit(session, recorder, scale):
+    ec2 = session.client('ec2')
+    image_id = ec2.describe_images(Owners=['amazon'])['Images'][0]['ImageId']
+    remaining = scale
+    while remaining > 0:
+        batch = min(remaining, 500)
+        ec2.run_instances(ImageId=image_id, MinCount=batch, MaxCount=batch, InstanceType='t3.micro')
+        remaining -= batch
+    for _ in range(max(scale // 10, 1)):
+        ec2.create_volume(AvailabilityZone='us-east-1a', Size=8)
+
+    auditor = CostAuditor(session)
+    # moto does not implement Bedrock, so we stub an empty answer
+    stub = Stubber(auditor.bedrock)
+    stub.add_response('list_provisioned_model_throughputs', {'provisionedModelSummaries': []})
+    stub.activate()
+    return [_run('CostAuditor.audit_resources', scale, recorder, auditor.audit_resources)]
+
+
+def bench_pipeline(session, recorder, scale):
+    manager = PipelineManager(session)
+    with redirect_stdout(io.StringIO()):
+        manager.deploy_infra('bench-datalake')
+        # Create the role once up-front so we don't benchmark the 10s propagation sleep
+        manager.iam.create_role(RoleName='GlueServiceRole-Bench', AssumeRolePolicyDocument='{}')
+
+    jobs = [f"bench-job-{i:05d}" for i in range(scale)]
+
+    def create_and_start():
+        for job in jobs:
+            manager.create_glue_job(job, 'GlueServiceRole-Bench', 'bench-datalake/scripts/process_job.py')
+            manager.start_glue_job(job)
+
+    return [_run('PipelineManager.create+start_job', scale, recorder, create_and_start)]
+
+
+def bench_iam(session, recorder, scale, workdir):
+    iam = session.client('iam')
+    session.client('ses').verify_email_identity(EmailAddress='sean.girgis@gmail.com')
+    spec = {
+        # moto reports the SES sandbox rate (1 email/s); don't let it dominate the timing
+        'config': {'default_password': 'ChangeMe123!', 'max_send_rate': 1000},
+        'groups': [{'name': 'Developers', 'permissions': ['S3FullAccess']}],
+        'users': [{'name': f"user{i:05d}", 'email': f"user{i:05d}@example.com", 'group': 'Developers'}
+                  for i in range(scale)],
+    }
+    spec_path = os.path.join(workdir, 'team.yaml')
+    with open(spec_path, 'w') as f:
+        yaml.safe_dump(spec, f)
+    for user in spec['users']:
+        iam.create_user(UserName=user['name'])
+
+    manager = EasyIAMManager(session, spec_path)
+    results = [_run('EasyIAMManager.generate_cloudformation', scale, recorder,
+                    lambda: manager.generate_cloudformation(os.path.join(workdir, 'generated.yaml')))]
+    results.append(_run('EasyIAMManager.onboard_users', scale, recorder, manager.onboard_users))
+    return results
+
+
+def bench_agent(session, recorder, scale):
+    glue = session.client('glue')
+    glue.create_database(DatabaseInput={'Name': 'edu_etl_db'})
+    for i in range(scale):
+        glue.create_table(DatabaseName='edu_etl_db', TableInput={
+            'Name': f"table_{i:05d}",
+            'StorageDescriptor': {'Columns': [{'Name': 'category', 'Type': 'string'},
+                                              {'Name': 'total_revenue', 'Type': 'double'}]},
+        })
+
+    agent = DataAgent(session)
+    results = [_run('DataAgent.get_table_schema', scale, recorder, lambda: agent.get_table_schema('edu_etl_db'))]
+
+    # Bedrock is stubbed: the 'model' always answers with the same SQL
+    answer = json.dumps({'content': [{'text': 'SELECT category FROM edu_etl_db.table_00000'}]}).encode()
+    stub = Stubber(agent.bedrock)
+    stub.add_response('invoke_model', {'body': StreamingBody(io.BytesIO(answer), len(answer)),
+                                       'contentType': 'application/json'})
+    stub.activate()
+
+    def ask():
+        schema = agent.get_table_schema('edu_etl_db')
+        sql = agent.generate_sql('Total revenue by category?', schema)
+        agent.print_results(agent.run_query(sql, 's3://bench-datalake/athena-results/'))
+
+    results.append(_run('DataAgent.ask', scale, recorder, ask))
+    return results
+
+
+BENCHMARKS = {
+    'stacks': bench_stacks,
+    's3': bench_empty_bucket,
+    'audit': bench_audit,
+    'pipeline': bench_pipeline,
+    'iam': bench_iam,
+    'agent': bench_agent,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the aws_lib managers")
+    parser.add_argument('--scales', type=int, nargs='+', default=[10, 100], help='Number of stacks/objects/users/... to test')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of fake network delay added to every API call')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='Run only these benchmarks')
+    parser.add_argument('--output', default=None, help='Write machine-readable results to this JSON file')
+    parser.add_argument('--compare', default=None, help='Baseline JSON file to compare against')
+    args = parser.parse_args()
+
+    try:
+        from moto import mock_aws
+    except ImportError:
+        print("Error: this benchmark needs 'moto'. Install it with: pip install 'moto[all]'")
+        sys.exit(1)
+
+    results = []
+    for name in args.only or BENCHMARKS:
+        for scale in args.scales:
+            print(f"--- {name} @ {scale} ---")
+            # Every run gets a brand-new fake AWS account
+            with mock_aws(), tempfile.TemporaryDirectory() as workdir:
+                session = _make_session()
+                recorder = ApiRecorder(latency=args.latency)
+                recorder.attach(session)
+                if name == 'iam':
+                    results += bench_iam(session, recorder, scale, workdir)
+                else:
+                    results += BENCHMARKS[name](session, recorder, scale)
+
+    print()
+    print_table(results, ['stage', 'scale', 'seconds', 'api_calls', 'peak_mb'])
+
+    settings = {'scales': args.scales, 'latency': args.latency, 'only': args.only}
+    if args.output:
+        save_results(args.output, 'managers', results, settings)
+    if args.compare:
+        # Wall time is noisy; API call counts are exact, so compare both
+        regressions = compare_results(args.compare, results, metric='seconds')
+        regressions += compare_results(args.compare, results, metric='api_calls', threshold=0.0)
+        if regressions > 0:
+            sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+End-to-End Pipeline Benchmark
+Runs the whole data lake flow on your laptop, with no AWS account needed:
+
+    generate -> ingest (S3) -> transform (Glue job) -> catalog (Glue) -> query (Athena)
+
+The real services are replaced by local stand-ins:
+- S3 and the Glue Catalog -> 'moto' (in-process by default, or a moto server via --endpoint-url)
+- The Glue Spark job and Athena -> DuckDB (runs the same SQL logic as process_job.py)
+
+Every stage reports rows/sec, bytes/sec and peak memory.
+
+Usage:
+    python -m benchmarks.bench_pipeline --rows 1000000 --categories 50 --skew 1.1
+    python -m benchmarks.bench_pipeline --output bench_results/pipeline.json --compare old.json
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+import boto3
+
+from aws_lib.datagen import generate_orders, to_json_bytes
+from aws_lib.pipeline import PipelineManager
+from benchmarks.harness import measure, print_table, save_results, compare_results
+
+BUCKET = 'bench-datalake'
+RAW_KEY = 'raw/orders.json'
+PROCESSED_KEY = 'processed/orders_parquet/part-0000.parquet'
+DB_NAME = 'bench_etl_db'
+TABLE_NAME = 'clean_orders_parquet'
+
+# Same business logic as cloud_intelligence_pipeline/glue_jobs/process_job.py
+TRANSFORM_SQL = """
+    SELECT category,
+           SUM(price * quantity) AS total_revenue,
+           AVG(price)            AS avg_price,
+           MAX(quantity)         AS max_quantity
+    FROM read_json_auto('{path}')
+    GROUP BY category
+"""
+
+# A typical question the AI agent would send to Athena
+QUERY_SQL = "SELECT category, total_revenue FROM {table} ORDER BY total_revenue DESC LIMIT 10"
+
+
+def _require(module_name, hint):
+    try:
+        return __import__(module_name)
+    except ImportError:
+        print(f"Error: this benchmark needs '{module_name}'. Install it with: {hint}")
+        sys.exit(1)
+
+
+def _make_session():
+    # Fake credentials: moto accepts anything, and we never want to hit a real account here.
+    return boto3.Session(aws_access_key_id='testing', aws_secret_access_key='testing',
+                         aws_session_token='testing', region_name='us-east-1')
+
+
+def run_pipeline(session, args, workdir, endpoint_url=None):
+    """
+    Runs every stage once and returns the list of StageResults.
+    """
+    duckdb = _require('duckdb', 'pip install duckdb')
+    results = []
+    s3 = session.client('s3', endpoint_url=endpoint_url)
+    glue = session.client('glue', endpoint_url=endpoint_url)
+
+    # Quietly create the bucket + folders with the real manager code
+    manager = PipelineManager(session)
+    manager.s3 = s3
+    with redirect_stdout(io.StringIO()):
+        manager.deploy_infra(BUCKET)
+
+    # 1. Generate (NumPy)
+    with measure('generate', rows_in=args.rows) as stage:
+        columns = generate_orders(rows=args.rows, categories=args.categories, skew=args.skew, seed=args.seed)
+        body = to_json_bytes(columns)
+        stage.rows = args.rows
+        stage.bytes = len(body)
+    results.append(stage)
+
+    # 2. Ingest: raw JSON -> S3
+    with measure('ingest', rows_in=args.rows) as stage:
+        s3.put_object(Bucket=BUCKET, Key=RAW_KEY, Body=body, ContentType='application/json')
+        stage.rows = args.rows
+        stage.bytes = len(body)
+    results.append(stage)
+    del body, columns
+
+    # 3. Transform: download raw, aggregate (DuckDB instead of Spark), write Parquet back to S3
+    raw_path = os.path.join(workdir, 'orders.json')
+    parquet_path = os.path.join(workdir, 'orders.parquet')
+    with measure('transform', rows_in=args.rows) as stage:
+        raw = s3.get_object(Bucket=BUCKET, Key=RAW_KEY)['Body'].read()
+        with open(raw_path, 'wb') as f:
+            f.write(raw)
+        con = duckdb.connect()
+        con.execute(f"COPY ({TRANSFORM_SQL.format(path=raw_path)}) TO '{parquet_path}' (FORMAT PARQUET)")
+        with open(parquet_path, 'rb') as f:
+            s3.put_object(Bucket=BUCKET, Key=PROCESSED_KEY, Body=f.read())
+        stage.rows = args.rows
+        stage.bytes = len(raw)
+    results.append(stage)
+    del raw
+
+    # 4. Catalog: what the Glue Crawler would do (read the Parquet schema, register the table)
+    with measure('catalog', rows_in=args.rows) as stage:
+        schema = con.execute(f"DESCRIBE SELECT * FROM read_parquet('{parquet_path}')").fetchall()
+        columns = [{'Name': name, 'Type': _athena_type(dtype)} for name, dtype, *_ in schema]
+        try:
+            glue.create_database(DatabaseInput={'Name': DB_NAME})
+        except glue.exceptions.AlreadyExistsException:
+            pass
+        glue.create_table(DatabaseName=DB_NAME, TableInput={
+            'Name': TABLE_NAME,
+            'StorageDescriptor': {
+                'Columns': columns,
+                'Location': f"s3://{BUCKET}/processed/orders_parquet/",
+                'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+                'OutputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
+                'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe'},
+            },
+            'TableType': 'EXTERNAL_TABLE',
+        })
+        stage.rows = con.execute(f"SELECT COUNT(*) FROM read_parquet('{parquet_path}')").fetchone()[0]
+        stage.bytes = os.path.getsize(parquet_path)
+    results.append(stage)
+
+    # 5. Query: Athena stand-in. Read the table location from the catalog, like Athena does.
+    with measure('query', rows_in=args.rows) as stage:
+        table = glue.get_table(DatabaseName=DB_NAME, Name=TABLE_NAME)['Table']
+        prefix = table['StorageDescriptor']['Location'].split(f"s3://{BUCKET}/", 1)[1]
+        local_files = []
+        for obj in s3.list_objects_v2(Bucket=BUCKET, Prefix=prefix).get('Contents', []):
+            if obj['Key'].endswith('/'):
+                continue
+            local = os.path.join(workdir, os.path.basename(obj['Key']))
+            s3.download_file(BUCKET, obj['Key'], local)
+            local_files.append(local)
+            stage.bytes += obj['Size']
+        con.execute(f"CREATE OR REPLACE VIEW {TABLE_NAME} AS SELECT * FROM read_parquet({local_files!r})")
+        rows = con.execute(QUERY_SQL.format(table=TABLE_NAME)).fetchall()
+        stage.rows = con.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0]
+        stage.extra['result_rows'] = len(rows)
+    results.append(stage)
+
+    con.close()
+    return results
+
+
+def _athena_type(duckdb_type):
+    # Translate DuckDB column types into the Hive/Athena names the Glue Catalog uses
+    mapping = {'VARCHAR': 'string', 'BIGINT': 'bigint', 'INTEGER': 'int', 'DOUBLE': 'double',
+               'HUGEINT': 'bigint', 'DATE': 'date', 'BOOLEAN': 'boolean'}
+    return mapping.get(duckdb_type.upper(), 'string')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark (offline)")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='Row counts to test')
+    parser.add_argument('--categories', type=int, default=8, help='Number of product categories')
+    parser.add_argument('--skew', type=float, default=1.2, help='Category popularity skew (0 = uniform)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--endpoint-url', default=None,
+                        help='Use a running moto server (e.g. http://127.0.0.1:5000) instead of in-process mocks')
+    parser.add_argument('--output', default=None, help='Write machine-readable results to this JSON file')
+    parser.add_argument('--compare', default=None, help='Baseline JSON file to compare against')
+    args = parser.parse_args()
+
+    all_results = []
+    row_counts = args.rows
+    for rows in row_counts:
+        args.rows = rows
+        print(f"--- Running pipeline with {rows} rows ---")
+        with tempfile.TemporaryDirectory() as workdir:
+            if args.endpoint_url:
+                all_results += run_pipeline(_make_session(), args, workdir, endpoint_url=args.endpoint_url)
+            else:
+                moto = _require('moto', 'pip install moto')
+                with moto.mock_aws():
+                    all_results += run_pipeline(_make_session(), args, workdir)
+
+    print()
+    print_table(all_results, ['stage', 'rows_in', 'seconds', 'rows_per_sec', 'bytes_per_sec', 'peak_mb'])
+
+    settings = {'rows': row_counts, 'categories': args.categories, 'skew': args.skew, 'seed': args.seed,
+                'backend': args.endpoint_url or 'moto-inprocess'}
+    if args.output:
+        save_results(args.output, 'pipeline', all_results, settings)
+    if args.compare:
+        if compare_results(args.compare, all_results) > 0:
+            sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
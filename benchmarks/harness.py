@@ -0,0 +1,142 @@
+"""
+Benchmark Helpers
+Small tools shared by every benchmark script:
+- measure(): times a block of code and records its peak memory.
+- save_results() / compare_results(): write numbers to JSON and diff two runs.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+class StageResult:
+    """
+    The numbers for one measured step (a 'stage').
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels   # Extra info such as scale=1000
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.peak_mb = 0.0
+        self.extra = {}        # Anything else a benchmark wants to record (API calls, etc.)
+
+    def to_dict(self):
+        result = {
+            'stage': self.name,
+            **self.labels,
+            'seconds': round(self.seconds, 6),
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'rows_per_sec': round(self.rows / self.seconds, 2) if self.seconds else 0.0,
+            'bytes_per_sec': round(self.bytes / self.seconds, 2) if self.seconds else 0.0,
+            'peak_mb': round(self.peak_mb, 3),
+        }
+        result.update(self.extra)
+        return result
+
+
+@contextmanager
+def measure(name, **labels):
+    """
+    Usage:
+        with measure('ingest') as stage:
+            ... do work ...
+            stage.rows = 1000
+            stage.bytes = 52000
+
+    Peak memory comes from 'tracemalloc', so it counts Python allocations only
+    (memory used inside native engines like DuckDB is not included).
+    """
+    stage = StageResult(name, **labels)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield stage
+    finally:
+        stage.seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stage.peak_mb = peak / (1024 * 1024)
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def save_results(path, suite, results, settings=None):
+    """
+    Writes the results to a JSON file so two commits can be compared later.
+    """
+    document = {
+        'suite': suite,
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': platform.python_version(),
+        'settings': settings or {},
+        'results': [r.to_dict() for r in results],
+    }
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(f"Results saved to {path}")
+
+
+def print_table(results, columns):
+    """
+    Prints the results as a simple aligned table.
+    """
+    rows = [r.to_dict() for r in results]
+    widths = {c: max(len(c), *(len(str(row.get(c, ''))) for row in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    print("  ".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, '')).ljust(widths[c]) for c in columns))
+
+
+# Fields that hold measured numbers (everything else in a result row is a label, like 'scale')
+MEASUREMENTS = {'seconds', 'rows', 'bytes', 'rows_per_sec', 'bytes_per_sec', 'peak_mb', 'api_calls', 'result_rows'}
+
+
+def _result_key(row):
+    # A stage is identified by its name plus its labels
+    return tuple(sorted((k, str(v)) for k, v in row.items() if k not in MEASUREMENTS and not isinstance(v, dict)))
+
+
+def compare_results(baseline_path, results, metric='seconds', threshold=0.10):
+    """
+    Compares this run against an older results file.
+    Prints every stage whose 'metric' got worse by more than 'threshold' (10% by default).
+    Returns the number of regressions found.
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = {_result_key(row): row for row in json.load(f)['results']}
+
+    regressions = 0
+    print(f"\n--- Comparison vs {baseline_path} ({metric}) ---")
+    for r in results:
+        row = r.to_dict()
+        old = baseline.get(_result_key(row))
+        if not old or not old.get(metric):
+            continue
+        change = (row[metric] - old[metric]) / old[metric]
+        flag = "REGRESSION" if change > threshold else "ok"
+        if change > threshold:
+            regressions += 1
+        labels = " ".join(f"{k}={v}" for k, v in r.labels.items())
+        print(f"{flag:<10} {r.name:<28} {labels:<20} {old[metric]:>12} -> {row[metric]:<12} ({change:+.1%})")
+    return regressions
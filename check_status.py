@@ -1,30 +1,12 @@
-
-import boto3
-session = boto3.Session(profile_name='study')
-glue = session.client('glue')
-
-print("--- Job Status ---")
-try:
-    runs = glue.get_job_runs(JobName='etl-process-orders', MaxResults=1)
-    status = runs['JobRuns'][0]['JobRunState']
-    print(f"Job Status: {status}")
-    if status == 'FAILED':
-        print(f"Error: {runs['JobRuns'][0].get('ErrorMessage', 'Unknown Error')}")
-except Exception as e:
-    print(f"Error getting job: {e}")
-
-except Exception as e:
-    print(f"Error getting crawler: {e}")
-
-print("\n--- S3 Status (Processed) ---")
-try:
-    s3 = session.client('s3')
-    objects = s3.list_objects_v2(Bucket='egirgis-datalake-v1', Prefix='processed/orders_parquet/')
-    if 'Contents' in objects:
-        print(f"FOUND {len(objects['Contents'])} files/folders in processed/")
-        for obj in objects['Contents']:
-            print(f"   - {obj['Key']} ({obj['Size']} bytes)")
-    else:
-        print("S3 Processed folder is EMPTY. Job likely failed or didn't write.")
-except Exception as e:
-    print(f"Error checking S3: {e}")
+"""
+Superseded by: python cli.py pipeline status [--watch 30]
+(aws_lib/dashboard.py shows every dataset in datasets.yaml: job runs, crawlers,
+table partitions and processed files, fetched in parallel, with all S3 pages
+listed). This file only forwards to it: pass --profile study, or set AWS_PROFILE.
+"""
+import sys
+
+import cli
+
+if __name__ == "__main__":
+    sys.exit(cli.run(['pipeline', 'status'] + sys.argv[1:]))
@@ -1,13 +1,15 @@
+import time      # Used to measure startup (--profile-startup)
+_START = time.perf_counter()
+
 import argparse  # Library to help read commands typed in terminal
+import importlib # Library to load modules only when a command needs them
 import sys       # Library to interact with the system (like exiting)
-from aws_lib.core import SessionManager
-from aws_lib.stacks import StackManager
-from aws_lib.audit import CostAuditor
-from aws_lib.audit import CostAuditor
-from aws_lib.easy_iam import EasyIAMManager
-from aws_lib.easy_iam import EasyIAMManager
-from aws_lib.pipeline import PipelineManager
-from aws_lib.ai import DataAgent
+from contextlib import contextmanager
+
+# NOTE: We do NOT import boto3 or the aws_lib managers here.
+# Loading boto3 (and its service models) takes a few hundred milliseconds,
+# so each handler imports only what it needs, when it runs.
+# This keeps 'python cli.py --help' fast.
 
 # --- CONSTANTS ---
 # These are names we use everywhere. Storing them here prevents typos later.
@@ -18,6 +20,50 @@ STACK_EASY_IAM = 'easy-iam-stack'  # Name for the Generated stack
 STACK_SES = 'ses-stack'            # Name for our Email Service
 BUCKET_NAME = 'egirgis-lab'        # The specific name valid for your bucket
 
+# Which modules each command needs. Loaded lazily (see load_command_modules).
+COMMAND_MODULES = {
+    'infrastructure': ['aws_lib.stacks', 'aws_lib.easy_iam'],
+    'audit': ['aws_lib.audit', 'aws_lib.inventory'],
+    'manager': ['aws_lib.easy_iam', 'aws_lib.stacks'],
+    'pipeline': ['aws_lib.pipeline'],
+    'agent': ['aws_lib.ai', 'aws_lib.summaries'],
+    'daemon': ['aws_lib.daemon'],
+    'cleanup': ['aws_lib.teardown'],
+}
+
+
+class StartupProfiler:
+    """
+    Records how long each startup step takes (imports, login, the command itself).
+    Only prints anything when the user passes --profile-startup.
+    """
+
+    def __init__(self):
+        self.steps = [('load cli.py', time.perf_counter() - _START)]
+
+    @contextmanager
+    def step(self, label):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((label, time.perf_counter() - start))
+
+    def report(self):
+        print("\n--- Startup Profile ---")
+        for label, seconds in self.steps:
+            print(f"{label:<45} {seconds * 1000:>9.1f} ms")
+        print(f"{'TOTAL (since cli.py started)':<45} {(time.perf_counter() - _START) * 1000:>9.1f} ms")
+
+
+def load_command_modules(command, profiler):
+    """
+    Imports the modules a command needs (and times each one).
+    """
+    for module_name in COMMAND_MODULES.get(command, []):
+        with profiler.step(f"import {module_name}"):
+            importlib.import_module(module_name)
+
 def handle_infrastructure(args, session):
     """
     This function handles all 'construction' work:
@@ -26,12 +72,19 @@ def handle_infrastructure(args, session):
     - Uploading the website files
     - Destroying everything
     """
+    from aws_lib.stacks import StackManager
+    from aws_lib.easy_iam import EasyIAMManager
+
     # 1. Initialize the Builder (StackManager)
     # We give it the 'session' (security badge) so it can talk to AWS.
     manager = StackManager(session)
     
     target = args.stack
 
+    # Touching every stack: describe them all with one call instead of one per lookup
+    if not target and args.action in ('deploy', 'destroy', 'drift'):
+        manager.load_stacks()
+
     if args.action == 'deploy':
         print(f"--- Deploying Infrastructure ---")
         
@@ -55,9 +108,11 @@ def handle_infrastructure(args, session):
                         parameters={'BucketName': BUCKET_NAME})
         
         # Step C: Upload Content
-        # Now that the bucket exists, we put the 'index.html' file inside it.
+        # Now that the bucket exists, we put the 'website/' files inside it
+        # (compressed, with cache headers; see aws_lib/website.py).
         if not target or target == 'website':
-            manager.upload_file(BUCKET_NAME, 'website/index.html', 'index.html', 'text/html')
+            from aws_lib.website import WebsitePublisher
+            WebsitePublisher(session, BUCKET_NAME).publish('website')
         
         # Final Step: Tell the user where to look
         # We ask AWS: "What is the WebsiteURL for this stack?"
@@ -79,31 +134,89 @@ def handle_infrastructure(args, session):
         if not target or target == 'network':
             manager.destroy(STACK_NETWORK)
         if not target or target == 'easy-iam':
+            # User shard stacks (if the spec uses 'shards') go before the groups stack
+            state = EasyIAMManager.load_state(EasyIAMManager.state_path_for('infrastructure/iam_generated.yaml'))
+            for shard in sorted((state or {}).get('stacks', {})):
+                if shard != STACK_EASY_IAM:
+                    manager.destroy(shard)
             manager.destroy(STACK_EASY_IAM)
         if not target or target == 'iam':
             manager.destroy(STACK_IAM)
         if not target or target == 'ses':
             manager.destroy(STACK_SES)
 
+    elif args.action == 'drift':
+        # Were any of our stacks changed by hand (in the console) since the last deploy?
+        print(f"--- Checking Infrastructure for Drift ---")
+        stacks = {'ses': [STACK_SES], 'iam': [STACK_IAM], 'network': [STACK_NETWORK],
+                  'website': [STACK_WEBSITE], 'easy-iam': [STACK_EASY_IAM]}
+        # Plus the user shard stacks, if the Easy IAM spec uses 'shards'
+        state = EasyIAMManager.load_state(EasyIAMManager.state_path_for('infrastructure/iam_generated.yaml'))
+        stacks['easy-iam'] += sorted(s for s in (state or {}).get('stacks', {}) if s != STACK_EASY_IAM)
+        names = stacks[target] if target else [n for group in stacks.values() for n in group]
+
+        results = manager.detect_drift(names)
+        drifted = [name for name, status in results.items() if status == 'DRIFTED']
+        print(f"\n{len(drifted)} of {len(results)} stacks drifted" + (f": {', '.join(drifted)}" if drifted else "."))
+        return 1 if drifted else 0
+
     elif args.action == 'upload':
         # Just update the file, don't rebuild the infrastructure
         print(f"--- Uploading Content ---")
-        manager.upload_file(BUCKET_NAME, 'website/index.html', 'index.html', 'text/html')
+        from aws_lib.website import WebsitePublisher
+        WebsitePublisher(session, BUCKET_NAME).publish('website')
         print("Done.")
 
 def handle_audit(args, session):
     """
     This function handles checking up on the account.
     """
+    from aws_lib.audit import CostAuditor
+
     # Initialize the Auditor (CostAuditor)
     auditor = CostAuditor(session)
     
-    if args.target == 'resources':
-        # Check for running servers or unattached volumes
+    if args.target == 'resources' and args.live:
+        # Check for running servers or unattached volumes (one call per service)
         auditor.audit_resources()
+    elif args.target in ('resources', 'inventory', 'idle'):
+        from aws_lib.inventory import Inventory, all_regions
+
+        # Same checks, read from the local inventory index (refreshed incrementally first)
+        regions = all_regions(session) if args.regions == ['all'] else args.regions
+        inventory = Inventory(session, regions=regions)
+        try:
+            source = inventory.refresh(source=args.source, full=args.full)
+            if args.target == 'inventory':
+                print(f"\n--- Inventory ({source}): {inventory.db_path} ---")
+                for region, resource_type, count in inventory.summary():
+                    print(f"{region or '-':<16} {resource_type:<40} {count:>6}")
+            elif args.target == 'idle':
+                from aws_lib.idle import IdleDetector
+                from aws_lib.inventory import INSTANCE, DB_INSTANCE, NAT_GATEWAY
+
+                # Only what the resource audit would flag: running / available things
+                candidates = [r for r in inventory.query(type=INSTANCE, state='running')
+                              + inventory.query(type=DB_INSTANCE, state='available')
+                              + inventory.query(type=NAT_GATEWAY, state='available')
+                              if r['region'] in inventory.regions]
+                detector = IdleDetector(session, days=args.days, prices=auditor.prices)
+                detector.print_report(detector.find_idle(candidates), len(candidates))
+            else:
+                auditor.audit_inventory(inventory)
+        finally:
+            inventory.close()
     elif args.target == 'cost':
         # Check how much money we spent this month
         auditor.get_monthly_cost()
+    elif args.target == 'pricing':
+        # Download / update the local price catalog used for the $/month estimates
+        regions = args.regions or [session.region_name or 'us-east-1']
+        if regions == ['all']:
+            from aws_lib.inventory import all_regions
+            regions = all_regions(session)
+        auditor.prices.refresh(regions)
+        print(f"Price catalog: {auditor.prices.db_path}")
 
 def handle_manager(args, session):
     """
@@ -112,34 +225,126 @@ def handle_manager(args, session):
     2. Generates CloudFormation
     3. Deploys Stack
     4. Onboards Users (Passwords + Email)
+
+    'plan' only shows what would change. 'apply' skips the CloudFormation
+    update when no group/user changed, and only onboards new users.
     """
+    from aws_lib.easy_iam import EasyIAMManager
+    from aws_lib.stacks import StackManager
+
     manager = EasyIAMManager(session, args.spec_file)
     stack_manager = StackManager(session)
 
-    if args.action == 'apply':
-        # 1. Generate
-        generated_file = 'infrastructure/iam_generated.yaml'
-        manager.generate_cloudformation(generated_file)
-        
-        # 2. Deploy
-        print(f"--- Deploying Generated IAM Stack ---")
-        stack_manager.deploy(STACK_EASY_IAM, generated_file)
-        
-        # 3. Onboard
-        manager.onboard_users()
+    generated_file = 'infrastructure/iam_generated.yaml'
+    state_file = EasyIAMManager.state_path_for(generated_file)
+    mail_report = 'infrastructure/iam_generated.mail-report.csv'
 
-def main():
+    # 0. Compare the spec with what we applied last time
+    previous_state = EasyIAMManager.load_state(state_file)
+    plan = manager.plan(previous_state, STACK_EASY_IAM, reshard=args.force)
+    plan.print_report(STACK_EASY_IAM)
+
+    if args.action == 'apply':
+        if plan.moved_users and not args.force:
+            print(f"Not applying: {len(plan.moved_users)} users would be deleted and re-created in another stack. "
+                  f"Use --force if that is what you want.")
+            return 1
+        if args.force:
+            plan.changed_stacks = list(manager.spec_state(STACK_EASY_IAM)['stacks'])
+        elif not plan.changed_stacks and not stack_manager.stack_exists(STACK_EASY_IAM):
+            print(f"Stack {STACK_EASY_IAM} is missing. Deploying it again.")
+            plan.changed_stacks = [STACK_EASY_IAM]
+
+        if plan.changed_stacks or plan.removed_stacks:
+            # 1. Generate
+            paths = manager.generate_cloudformation(generated_file, STACK_EASY_IAM)
+
+            # 2. Deploy (only the stacks that changed, in parallel where possible)
+            print(f"--- Deploying Generated IAM Stacks ({len(plan.changed_stacks)} of {len(paths)}) ---")
+            if not manager.deploy_stacks(stack_manager, paths, plan):
+                print("Not onboarding; fix the stacks and apply again.")
+                return 1
+        else:
+            print("Skipping CloudFormation: no group/user changes since the last apply.")
+
+        # 3. Onboard (only the new and re-created users, unless this is the first apply or --force)
+        retry = (previous_state or {}).get('unfinished', [])
+        if previous_state is None or args.force:
+            unfinished = manager.onboard_users(report_path=mail_report, retry=retry)
+        else:
+            unfinished = manager.onboard_users(plan.added_users + list(plan.moved_users), report_path=mail_report,
+                                               retry=retry)
+
+        # 4. Remember what we applied (users that didn't get a password or email are tried again next time)
+        manager.save_state(state_file, STACK_EASY_IAM, unfinished)
+        print(f"State saved to {state_file}")
+        if unfinished:
+            print(f"{len(unfinished)} user(s) not onboarded yet ({', '.join(unfinished)}). Run apply again to retry.")
+            return 1
+
+def handle_cleanup(args, session):
     """
-    Main Entry Point.
-    This runs when you type 'python cli.py'
+    Deletes whole labs: VPCs (picked by id or tag) with everything inside them,
+    plus S3 buckets by name prefix. Shows the plan, asks once, then deletes
+    independent resources in parallel.
+    """
+    from aws_lib.teardown import TeardownPlan, TeardownEngine
+
+    tags = []
+    for tag in args.tag:
+        key, sep, value = tag.partition('=')
+        if not sep:
+            print(f"Error: --tag must look like Key=Value (got '{tag}')")
+            return 1
+        tags.append((key, value))
+    if not (args.vpc_id or tags or args.bucket_prefix):
+        print("Nothing to clean up: pass --vpc-id, --tag and/or --bucket-prefix.")
+        return 1
+
+    # 1. Discover
+    plan = TeardownPlan(session, region=args.region)
+    vpc_ids = plan.find_vpcs(args.vpc_id, tags)
+    for vpc_id in vpc_ids:
+        plan.add_vpc(vpc_id)
+    for prefix in args.bucket_prefix:
+        plan.add_buckets(prefix)
+    if not plan.nodes:
+        print("OK: Nothing matches. Nothing to delete.")
+        return 0
+    plan.print_plan()
+
+    # 2. Confirm (once, for everything)
+    if args.dry_run:
+        print("\nDry run: nothing was deleted.")
+        return 0
+    if not args.yes:
+        try:
+            answer = input(f"\nDELETE these {len(plan.nodes)} resources? This cannot be undone. (y/n): ").lower()
+        except EOFError:
+            answer = ''  # No keyboard (e.g. run by the daemon): treat as "no"
+        if answer != 'y':
+            print("Cancelled.")
+            return 1
+
+    # 3. Delete
+    ok = TeardownEngine(plan, max_parallel=args.parallel).run()
+    return 0 if ok else 1
+
+def build_parser():
+    """
+    Describes every command and option the CLI understands.
     """
     # 1. Setup the Argument Parser
     # We use a 'parent' parser to define arguments that are common to all commands (like --profile)
     # This check allows you to type '--profile' EITHER before OR after the command.
     parent_parser = argparse.ArgumentParser(add_help=False)
     parent_parser.add_argument('--profile', help='AWS Profile to use', default=None)
+    parent_parser.add_argument('--trace', action='store_true', help='Print a summary of every AWS API call at the end')
+    parent_parser.add_argument('--trace-file', default=None, help='Also write the calls as OpenTelemetry spans (JSON) to this file')
+    parent_parser.add_argument('--profile-startup', action='store_true', help='Report how long imports and AWS login took')
+    parent_parser.add_argument('--no-daemon', action='store_true', help='Run in this process even if the CLI daemon is running')
 
-    parser = argparse.ArgumentParser(description="AWS Playground CLI")
+    parser = argparse.ArgumentParser(prog='cli.py', description="AWS Playground CLI")
     subparsers = parser.add_subparsers(dest='command', help='Command to run')
 
     # -- Command: infrastructure --
@@ -147,7 +352,8 @@ def main():
     infra_parser = subparsers.add_parser('infrastructure', 
                                          help='Manage CloudFormation Stacks',
                                          parents=[parent_parser])
-    infra_parser.add_argument('action', choices=['deploy', 'destroy', 'upload'], help='Action to perform')
+    infra_parser.add_argument('action', choices=['deploy', 'destroy', 'upload', 'drift'],
+                              help="Action to perform ('drift' checks whether the stacks were changed by hand)")
     infra_parser.add_argument('--stack', choices=['network', 'website', 'iam', 'ses', 'easy-iam'], help='Target specific stack')
 
     # -- Command: audit --
@@ -155,112 +361,338 @@ def main():
     audit_parser = subparsers.add_parser('audit', 
                                          help='Audit costs and resources',
                                          parents=[parent_parser])
-    audit_parser.add_argument('target', choices=['resources', 'cost'], help='What to audit')
+    audit_parser.add_argument('target', choices=['resources', 'cost', 'inventory', 'idle', 'pricing'],
+                              help="What to audit ('inventory' refreshes and summarizes the local resource index, "
+                                   "'idle' lists running resources that CloudWatch shows as unused, "
+                                   "'pricing' downloads the price catalog used for $/month estimates)")
+    audit_parser.add_argument('--days', type=int, default=14, help='idle: how many days of metrics to look at')
+    audit_parser.add_argument('--live', action='store_true', help='resources: call each service directly instead of using the inventory index')
+    audit_parser.add_argument('--regions', nargs='+', default=None, help="Regions to cover ('all' for every enabled region; default: the profile's region)")
+    audit_parser.add_argument('--source', choices=['auto', 'config', 'resource-explorer', 'describe'], default='auto',
+                              help='Where the inventory comes from (default: AWS Config, then Resource Explorer, then describe calls)')
+    audit_parser.add_argument('--full', action='store_true', help='Rebuild the inventory instead of refreshing what changed')
 
     # -- Command: manager (NEW) --
     # Allows: python cli.py manager apply my_team.simple.yaml
     manager_parser = subparsers.add_parser('manager',
                                            help='Easy Mode Identity Manager',
                                            parents=[parent_parser])
-    manager_parser.add_argument('action', choices=['apply'], help='Action to perform')
+    manager_parser.add_argument('action', choices=['plan', 'apply'], help='Action to perform')
     manager_parser.add_argument('spec_file', help='Path to your Simple Spec YAML file')
+    manager_parser.add_argument('--force', action='store_true', help='apply: redeploy and re-check every user, and re-place users by the shard settings (re-creates moved users)')
 
     # -- Command: pipeline (NEW) --
     # Allows: python cli.py pipeline deploy --profile study
     pipeline_parser = subparsers.add_parser('pipeline',
                                             help='Manage Cloud Data Pipeline',
                                             parents=[parent_parser])
-    pipeline_parser.add_argument('action', choices=['deploy', 'upload-ingest', 'upload-job', 'create-job', 'start-job', 'create-crawler', 'start-crawler'], help='Action to perform')
+    pipeline_parser.add_argument('action', choices=['run', 'status', 'datasets-deploy', 'datasets-run', 'datasets-status', 'deploy', 'upload-ingest', 'upload-job', 'create-job', 'start-job', 'create-crawler', 'start-crawler'], help='Action to perform')
+    pipeline_parser.add_argument('--dag', default='cloud_intelligence_pipeline/pipeline.yaml', help='run: the pipeline YAML file')
+    pipeline_parser.add_argument('--force', action='store_true', help='run: run every step, even unchanged ones')
+    pipeline_parser.add_argument('--dry-run', action='store_true', help='run: only show which steps would run')
+    pipeline_parser.add_argument('--parallel', type=int, default=4, help='run: steps running at the same time')
+    pipeline_parser.add_argument('--registry', default='cloud_intelligence_pipeline/datasets.yaml',
+                                 help='datasets-*: the dataset registry YAML file')
+    pipeline_parser.add_argument('--dataset', nargs='+', default=None, help='datasets-*: only these datasets (default: all)')
+    pipeline_parser.add_argument('--watch', type=int, default=None, metavar='SECONDS',
+                                 help='status: redraw the dashboard every SECONDS until Ctrl+C')
+    pipeline_parser.add_argument('--full-every', type=int, default=20,
+                                 help='status --watch: refreshes between full S3 listings (in between only new keys are listed)')
+    pipeline_parser.add_argument('--max-runs', type=int, default=10,
+                                 help='datasets-run: job runs at the same time (Glue allows 50 per account by default)')
+    pipeline_parser.add_argument('--rows', type=int, default=10000, help='upload-ingest: number of orders to generate')
+    pipeline_parser.add_argument('--categories', type=int, default=8, help='upload-ingest: number of product categories')
+    pipeline_parser.add_argument('--extra-py', nargs='+', default=[],
+                                 help='upload-job/create-job: modules or package folders the job script imports (zipped for --extra-py-files)')
+    pipeline_parser.add_argument('--skew', type=float, default=1.2, help='upload-ingest: category popularity skew (0 = uniform)')
 
     # -- Command: agent (NEW) --
     # Allows: python cli.py agent ask "How much revenue?" --profile study
     agent_parser = subparsers.add_parser('agent',
                                             help='Ask the AI Data Analyst',
                                             parents=[parent_parser])
-    agent_parser.add_argument('action', choices=['ask'], help='Action to perform')
-    agent_parser.add_argument('question', help='The question you want to ask the data')
+    agent_parser.add_argument('action', choices=['ask', 'summaries', 'refresh-summaries'], help='Action to perform')
+    agent_parser.add_argument('question', nargs='?', help='ask: the question you want to ask the data')
+    agent_parser.add_argument('--max-scan-mb', type=float, default=None,
+                              help='Refuse (or trim) queries estimated to scan more than this (default: 1024)')
+    agent_parser.add_argument('--output', choices=['table', 'csv', 'json', 'parquet'], default='table',
+                              help='ask: how to return the answer (default: an aligned table)')
+    agent_parser.add_argument('--output-file', default=None,
+                              help='ask: write the csv/json/parquet answer to this file (default: stdout)')
+    agent_parser.add_argument('--min-hits', type=int, default=3,
+                              help='summaries: build a summary table for question shapes asked this often')
+    agent_parser.add_argument('--force', action='store_true', help='refresh-summaries: rebuild even if the data is unchanged')
+    agent_parser.add_argument('--append-only', action='store_true',
+                              help='refresh-summaries: the source only gets new rows in new time buckets (recompute only those)')
+
+    # -- Command: cleanup --
+    # Allows: python cli.py cleanup --tag Name=Playground-VPC --dry-run
+    cleanup_parser = subparsers.add_parser('cleanup',
+                                           help='Delete labs (VPCs and everything in them, old buckets)',
+                                           parents=[parent_parser])
+    cleanup_parser.add_argument('--vpc-id', nargs='+', default=[], help='VPC ids to delete')
+    cleanup_parser.add_argument('--tag', nargs='+', default=[], help='Delete the VPCs that have these tags (Key=Value)')
+    cleanup_parser.add_argument('--bucket-prefix', nargs='+', default=[], help='Also delete (and empty) the S3 buckets whose names start with this')
+    cleanup_parser.add_argument('--region', default=None, help="Region of the VPCs (default: the profile's region)")
+    cleanup_parser.add_argument('--dry-run', action='store_true', help='Only show what would be deleted')
+    cleanup_parser.add_argument('--yes', action='store_true', help="Don't ask for confirmation")
+    cleanup_parser.add_argument('--parallel', type=int, default=10, help='How many deletions to run at the same time')
+
+    # -- Command: daemon --
+    # Allows: python cli.py daemon start
+    daemon_parser = subparsers.add_parser('daemon',
+                                          help='Optional background process that keeps AWS sessions warm',
+                                          parents=[parent_parser])
+    daemon_parser.add_argument('action', choices=['start', 'stop', 'status', 'serve'], help='Action to perform')
+
+    return parser
+
+
+def run(argv=None, session_factory=None):
+    """
+    Parses the arguments and runs one command. Returns the exit code.
+
+    Args:
+        argv: The words after 'cli.py' (defaults to what was typed in the terminal).
+        session_factory: Optional function(profile_name) -> session. The daemon
+                         passes one that hands out its warm, pooled sessions.
+    """
+    parser = build_parser()
 
     # 2. Read the arguments user typed
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # If user didn't type a command, show help and exit
     if not args.command:
         parser.print_help()
-        sys.exit(1)
-
-    # 3. Log in to AWS (Authentication)
-    # We call our SessionManager to get the 'session' (Security Badge)
-    session = SessionManager.get_session(args.profile)
-    print(f"Using Profile: {session.profile_name}")
-
-    # 4. Route to the right function
-    if args.command == 'infrastructure':
-        handle_infrastructure(args, session)
-    elif args.command == 'audit':
-        handle_audit(args, session)
-    elif args.command == 'manager':
-        handle_manager(args, session)
-    elif args.command == 'pipeline':
-        handle_pipeline(args, session)
-    elif args.command == 'agent':
-        handle_agent(args, session)
+        return 1
+
+    profiler = StartupProfiler()
+
+    # 3. Load only the code this command needs
+    load_command_modules(args.command, profiler)
+
+    # 4. Log in to AWS (Authentication) - but only when the command first talks to AWS.
+    # The 'LazySession' looks like a normal session; it logs in on first use.
+    tracer = None
+
+    def create_session():
+        nonlocal tracer
+        with profiler.step('import boto3'):
+            importlib.import_module('boto3')
+        with profiler.step('create session (credentials)'):
+            from aws_lib.core import SessionManager
+            session = (session_factory or SessionManager.get_session)(args.profile)
+        print(f"Using Profile: {session.profile_name}")
+
+        # Optional: record every AWS call (must be attached before any client is created)
+        if args.trace or args.trace_file:
+            from aws_lib.tracing import ApiTracer
+            tracer = ApiTracer(f"cli {args.command}").attach(session)
+        return session
+
+    from aws_lib.core import LazySession
+    session = LazySession(create_session)
+
+    # 5. Route to the right function
+    exit_code = 0
+    try:
+        with profiler.step(f"run '{args.command}' command"):
+            if args.command == 'infrastructure':
+                exit_code = handle_infrastructure(args, session)
+            elif args.command == 'audit':
+                handle_audit(args, session)
+            elif args.command == 'manager':
+                exit_code = handle_manager(args, session)
+            elif args.command == 'pipeline':
+                exit_code = handle_pipeline(args, session)
+            elif args.command == 'agent':
+                exit_code = handle_agent(args, session)
+            elif args.command == 'daemon':
+                handle_daemon(args)
+            elif args.command == 'cleanup':
+                exit_code = handle_cleanup(args, session)
+    finally:
+        if tracer:
+            tracer.finish()
+            tracer.print_summary()
+            if args.trace_file:
+                tracer.export_spans(args.trace_file)
+        if args.profile_startup:
+            profiler.report()
+    return exit_code or 0
+
+
+def main():
+    """
+    Main Entry Point.
+    This runs when you type 'python cli.py'
+    """
+    argv = sys.argv[1:]
+
+    # If the background daemon is running, let it run the command with its
+    # warm sessions. (It is skipped for help, the daemon command itself, and
+    # the timing flags, which must measure THIS process, and --watch, which redraws this terminal.)
+    local_only = {'daemon', '-h', '--help', '--no-daemon', '--trace', '--trace-file', '--profile-startup', '--watch'}
+    # Commands that ask a question need this terminal's keyboard (the daemon has none)
+    asks = 'cleanup' in argv and '--yes' not in argv and '--dry-run' not in argv
+    if argv and not asks and not local_only.intersection(argv):
+        from aws_lib.daemon import forward_to_daemon
+        exit_code = forward_to_daemon(argv)
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    # No daemon: run the command right here
+    sys.exit(run(argv))
+
+
+def handle_daemon(args):
+    """
+    Starts, stops or inspects the optional background daemon.
+    """
+    from aws_lib import daemon
+
+    if args.action == 'start':
+        daemon.start()
+    elif args.action == 'stop':
+        daemon.stop()
+    elif args.action == 'status':
+        daemon.status()
+    elif args.action == 'serve':
+        daemon.CliDaemon().serve()
 
 def handle_agent(args, session):
     """
     Handles AI interactions.
     """
-    agent = DataAgent(session)
+    from aws_lib.ai import DataAgent
+    from aws_lib.summaries import SummaryManager
+
+    max_scan = int(args.max_scan_mb * 1024 ** 2) if args.max_scan_mb else None
+    agent = DataAgent(session, max_scan_bytes=max_scan)
     DB_NAME = 'edu_etl_db'
     # Athena needs a bucket to store query results
     RESULTS_LOCATION = 's3://egirgis-datalake-v1/athena-results/'
-    
+    # Summary tables (CTAS results) live next to the processed data
+    SUMMARIES_LOCATION = 's3://egirgis-datalake-v1/processed/summaries/'
+    summaries = SummaryManager(session, DB_NAME, RESULTS_LOCATION, SUMMARIES_LOCATION)
+
     if args.action == 'ask':
+        if not args.question:
+            print("Usage: python cli.py agent ask \"your question\"")
+            return 1
+
         # 1. Get Context
         schema = agent.get_table_schema(DB_NAME)
         if not schema:
             print("Could not fetch schema. Did the crawler run?")
             return
 
-        # 2. Get SQL from AI
-        sql = agent.generate_sql(args.question, schema)
+        # 2. Get SQL from AI (summary tables are read from their Glue tags only:
+        #    refreshing them is the job of 'refresh-summaries', after each ETL run)
+        sql = agent.generate_sql(args.question, schema, summaries.describe_for_prompt())
         if not sql: return
         
         # 3. Run SQL
-        results = agent.run_query(sql, RESULTS_LOCATION)
+        results = agent.run_query(sql, RESULTS_LOCATION, DB_NAME)
         
         # 4. Show Answer
-        agent.print_results(results)
+        try:
+            agent.print_results(results, args.output, args.output_file)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+
+        # 5. Remember the question's shape (frequent shapes get a summary table)
+        if results:
+            summaries.record(sql)
+
+    elif args.action == 'summaries':
+        summaries.materialize(min_hits=args.min_hits)
+
+    elif args.action == 'refresh-summaries':
+        refreshed = summaries.refresh(force=args.force, append_only=args.append_only)
+        if summaries.failed:
+            print(f"❌ Failed: {', '.join(summaries.failed)}")
+            return 1
+        print(f"Refreshed: {', '.join(refreshed)}" if refreshed else "All summary tables are up to date.")
 
 def handle_pipeline(args, session):
     """
     Handles Data Pipeline tasks.
     """
+    from aws_lib.pipeline import PipelineManager
+
     manager = PipelineManager(session)
     # Define a dedicated bucket for the datalake
     # We use a distinct name to avoid conflicts with the website bucket
     DATALAKE_BUCKET = 'egirgis-datalake-v1' 
-
-    if args.action == 'deploy':
-        manager.deploy_infra(DATALAKE_BUCKET)
+    JOB_NAME = 'etl-process-orders'
+    GLUE_SCRIPT = 'cloud_intelligence_pipeline/glue_jobs/process_job.py'
+
+    if args.action == 'run':
+        # The whole pipeline from a YAML DAG (see aws_lib/orchestrator.py)
+        import yaml
+        from aws_lib.orchestrator import PipelineDag, PipelineRunner
+        try:
+            dag = PipelineDag(args.dag)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            print(f"Error in {args.dag}: {e}")
+            return 1
+        runner = PipelineRunner(manager, dag, max_parallel=args.parallel, force=args.force)
+        if args.dry_run:
+            runner.plan()
+            return 0
+        return 0 if runner.run() else 1
+
+    elif args.action == 'status' or args.action.startswith('datasets-'):
+        # Every dataset in the registry (see cloud_intelligence_pipeline/datasets.yaml)
+        import yaml
+        from aws_lib.pipeline import load_datasets
+        try:
+            datasets = load_datasets(args.registry, args.dataset)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            print(f"Error in {args.registry}: {e}")
+            return 1
+
+        if args.action == 'status':
+            # Jobs, crawlers, partitions and processed files of every dataset (see aws_lib/dashboard.py)
+            from aws_lib.dashboard import PipelineDashboard
+            dashboard = PipelineDashboard(manager, datasets, full_every=args.full_every)
+            if args.watch:
+                dashboard.watch(args.watch)
+            else:
+                dashboard.show()
+            return 0
+        if args.action == 'datasets-deploy':
+            return 1 if manager.deploy_datasets(datasets) else 0
+        if args.action == 'datasets-run':
+            results = manager.run_datasets(datasets, max_runs=args.max_runs)
+            print()
+            manager.print_table([{'dataset': name, 'job': r['job'], 'crawl': r['crawl'] or '-'}
+                                 for name, r in results.items()])
+            return 0 if all(r['job'] == 'SUCCEEDED' and r['crawl'] == 'SUCCEEDED' for r in results.values()) else 1
+        manager.print_table(manager.dataset_status(datasets))
+
+    elif args.action == 'deploy':
+        if not manager.deploy_infra(DATALAKE_BUCKET):
+            return 1
     
     elif args.action == 'upload-ingest':
-        # Uploads the ingestion script (mock)
-        print("Uploading ingestion script...") 
-        # Future: calls manager.upload_script(...)
+        # Generates synthetic orders and puts them where the Glue job reads them
+        manager.upload_orders(DATALAKE_BUCKET, rows=args.rows, categories=args.categories, skew=args.skew)
 
     elif args.action == 'upload-job':
-        script_path = 'cloud_intelligence_pipeline/glue_jobs/process_job.py'
-        manager.upload_script(DATALAKE_BUCKET, script_path, 'scripts/process_job.py')
+        # Versioned upload ('process_job.<hash>.py'); an existing job is switched to it
+        manager.publish_job(DATALAKE_BUCKET, GLUE_SCRIPT, args.extra_py, job_name=JOB_NAME)
 
     elif args.action == 'create-job':
-        # Create the Glue Job
-        JOB_NAME = 'etl-process-orders'
+        # Create the Glue Job (on the current versioned script, uploaded if it changed)
         ROLE_NAME = 'GlueServiceRole-Playground'
-        SCRIPT_S3 = f"{DATALAKE_BUCKET}/scripts/process_job.py"
-        manager.create_glue_job(JOB_NAME, ROLE_NAME, SCRIPT_S3)
+        script_uri, bundle_uri = manager.publish_job(DATALAKE_BUCKET, GLUE_SCRIPT, args.extra_py)
+        manager.create_glue_job(JOB_NAME, ROLE_NAME, script_uri, extra_py_files=bundle_uri)
 
     elif args.action == 'start-job':
-        JOB_NAME = 'etl-process-orders'
         manager.start_glue_job(JOB_NAME)
 
     elif args.action == 'create-crawler':
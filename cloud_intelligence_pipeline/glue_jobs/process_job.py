@@ -6,6 +6,7 @@ import sys
 from pyspark.context import SparkContext
 from awsglue.context import GlueContext
 from awsglue.job import Job
+from awsglue.utils import getResolvedOptions
 from pyspark.sql.functions import col, sum, avg, max
 
 # Initialize Glue Context
@@ -17,8 +18,13 @@ job.init("ProcessOrders", {})
 
 # CONFIG
 BUCKET_NAME = "egirgis-datalake-v1"
-INPUT_PATH = f"s3://{BUCKET_NAME}/raw/orders.json"
-OUTPUT_PATH = f"s3://{BUCKET_NAME}/processed/orders_parquet"
+
+# Optional job arguments, set per dataset from datasets.yaml (see PipelineManager.deploy_datasets)
+OPTIONAL_ARGS = ['source_path', 'output_path', 'partition_by']
+args = getResolvedOptions(sys.argv, [name for name in OPTIONAL_ARGS if f"--{name}" in sys.argv])
+INPUT_PATH = args.get('source_path', f"s3://{BUCKET_NAME}/raw/orders.json")
+OUTPUT_PATH = args.get('output_path', f"s3://{BUCKET_NAME}/processed/orders_parquet")
+PARTITION_BY = [c for c in args.get('partition_by', '').split(',') if c]
 
 print(f"Reading from {INPUT_PATH}...")
 df = spark.read.option("multiLine", True).json(INPUT_PATH)
@@ -37,6 +43,9 @@ results = df.groupBy("category").agg(
 
 # Write to S3 (Parquet) - Overwrite mode
 print(f"Writing to {OUTPUT_PATH}...")
-results.write.mode("overwrite").parquet(OUTPUT_PATH)
+writer = results.write.mode("overwrite")
+if PARTITION_BY:
+    writer = writer.partitionBy(*PARTITION_BY)
+writer.parquet(OUTPUT_PATH)
 
 job.commit()
@@ -1,3 +1,6 @@
+# Superseded by: python cli.py cleanup --tag Name=Playground-VPC --bucket-prefix egirg-study-playground-
+# (aws_lib/teardown.py also removes instances, NAT gateways, endpoints, ENIs and security groups,
+#  deletes in parallel and asks only once). Kept for reference.
 import boto3
 import sys
 import os